@@ -0,0 +1,51 @@
+"""比較 CoffeeLexicon 從 YAML 與從 .lexc artifact 冷載入的時間。
+
+用法（專案根目錄）：
+    python bench/bench_lexicon_load.py [--repeat 50]
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+from normalizer.coffee_lexicon import CoffeeLexicon, compile_lexicon  # noqa: E402
+
+
+def _time_loads(yaml_path: Path, repeat: int, use_artifact: bool) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        lex = CoffeeLexicon(yaml_path, use_artifact=use_artifact)
+        best = min(best, time.perf_counter() - t0)
+        assert lex.loaded_from == ("artifact" if use_artifact else "yaml")
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lexicon", type=Path, default=PROJECT_ROOT / "data" / "normalize" / "coffee_lexicon.yaml")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    # 在暫存目錄操作，不動到 repo 裡的 artifact
+    with tempfile.TemporaryDirectory() as tmp:
+        yaml_path = Path(tmp) / args.lexicon.name
+        yaml_path.write_bytes(args.lexicon.read_bytes())
+        compile_lexicon(yaml_path)
+
+        t_yaml = _time_loads(yaml_path, args.repeat, use_artifact=False)
+        t_art = _time_loads(yaml_path, args.repeat, use_artifact=True)
+
+    print(f"yaml     : {t_yaml * 1000:8.3f} ms (best of {args.repeat})")
+    print(f"artifact : {t_art * 1000:8.3f} ms (best of {args.repeat})")
+    print(f"speedup  : {t_yaml / t_art:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
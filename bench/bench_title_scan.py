@@ -0,0 +1,93 @@
+"""比較 --use-existing 前置篩選時讀標題的兩種做法：整頁讀進來解碼 vs. bytes 掃描。
+
+用法（專案根目錄）：
+    python bench/bench_title_scan.py [--pages 5000] [--page-kb 300]
+    python bench/bench_title_scan.py --html-dir data/raw_html
+"""
+from __future__ import annotations
+
+import argparse
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+from html_io import read_title  # noqa: E402
+
+# 舊版 extract_title_from_html 的做法，留在這裡當對照組
+TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+OG_TITLE_RE = re.compile(
+    r'<meta[^>]+property=["\']og:title["\'][^>]+content=["\'](.*?)["\']',
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def read_title_full(html_path: Path) -> str | None:
+    text = html_path.read_text(encoding="utf-8", errors="ignore")
+    m = TITLE_RE.search(text)
+    if m:
+        return m.group(1).strip()
+    m = OG_TITLE_RE.search(text)
+    if m:
+        return m.group(1).strip()
+    return None
+
+
+def build_corpus(out_dir: Path, pages: int, page_kb: int) -> list[Path]:
+    """產生類似 Shopline 商品頁的假 HTML：標題在 <head>，後面是一大段 script / 內文"""
+    filler = ("<script>window.__DATA__ = {\"咖啡\": \"衣索比亞 水洗 耶加雪菲\"};</script>\n" * 64).encode("utf-8")
+    body = filler * max(1, page_kb * 1024 // len(filler))
+    paths = []
+    for i in range(pages):
+        head = (
+            '<!DOCTYPE html><html><head><meta charset="utf-8">'
+            f'<meta property="og:title" content="商品 {i} | Bargain">'
+            f"<title>衣索比亞 耶加雪菲 {i} | Bargain</title></head><body>"
+        ).encode("utf-8")
+        path = out_dir / f"page-{i:06d}.html"
+        path.write_bytes(head + body + b"</body></html>")
+        paths.append(path)
+    return paths
+
+
+def _time(fn, paths: list[Path]) -> tuple[float, list[str | None]]:
+    t0 = time.perf_counter()
+    titles = [fn(p) for p in paths]
+    return time.perf_counter() - t0, titles
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--html-dir", type=Path, default=None, help="改用既有的 HTML 目錄")
+    parser.add_argument("--pages", type=int, default=5000)
+    parser.add_argument("--page-kb", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.html_dir:
+            paths = sorted(args.html_dir.glob("*.html"))
+        else:
+            paths = build_corpus(Path(tmp), args.pages, args.page_kb)
+        total_mb = sum(p.stat().st_size for p in paths) / 1024 / 1024
+
+        # 兩邊都先跑一次：整頁讀取會把每個檔案完整讀進 page cache，
+        # read_title 只讀開頭，單獨暖它不夠；比較的是 CPU（解碼 + regex）而不是磁碟
+        _time(read_title_full, paths)
+        _time(read_title, paths)
+        t_full, full = _time(read_title_full, paths)
+        t_fast, fast = _time(read_title, paths)
+
+    mismatched = sum(a != b for a, b in zip(full, fast))
+    print(f"corpus     : {len(paths)} pages, {total_mb:.1f} MB")
+    print(f"full decode: {t_full:8.3f} s")
+    print(f"bytes scan : {t_fast:8.3f} s")
+    print(f"speedup    : {t_full / t_fast:8.1f}x")
+    print(f"mismatched : {mismatched}")
+
+
+if __name__ == "__main__":
+    main()
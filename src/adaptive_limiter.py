@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+from urllib.parse import urlparse
+
+import requests
+
+
+logger = logging.getLogger(__name__)
+
+# 這些狀態碼代表「太快了」，要立刻降速（fetch_page 也會重試）；其他 5xx 一樣降速但不重試
+THROTTLE_STATUSES = frozenset({429, 503})
+# 只有這些例外算是 host 端的問題（逾時、連線失敗、傳到一半斷線）；
+# 其他例外（例如寫檔失敗、解碼錯誤）是本地的問題，不應該讓 host 降速
+NETWORK_ERRORS = (
+    requests.Timeout,
+    requests.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    TimeoutError,
+    ConnectionError,
+)
+# 併發上限的預設最大值；下載 thread 數的預設值跟它一樣，加速才有機會真的用到上限
+DEFAULT_MAX_LIMIT = 16
+
+
+@dataclass
+class HostState:
+    limit: float
+    in_flight: int = 0
+    ewma_latency: float | None = None
+    min_latency: float | None = None
+    # 最近幾次成功請求的延遲，min_latency 取這段期間的最小值
+    recent_latencies: deque = field(default_factory=deque)
+    blocked_until: float = 0.0
+    last_decrease: float = 0.0
+    cond: threading.Condition = field(default_factory=threading.Condition)
+
+
+@dataclass
+class Slot:
+    """一次請求的結果，呼叫端在 with 區塊內填好 status / retry_after。"""
+    host: str
+    status: int | None = None
+    retry_after: float | None = None
+    timed_out: bool = False
+
+
+class AdaptiveLimiter:
+    """每個 host 各自一份的 AIMD 併發控制。
+
+    - 回應快、沒有錯誤：併發上限每個來回加 1（每次成功 +1/limit）
+    - 延遲明顯變慢（EWMA 超過最近 latency_window 次最低延遲的 latency_tolerance 倍）：小幅減少
+    - 429 / 5xx / timeout / 連線失敗：上限乘上 backoff，並依 Retry-After 暫停該 host
+
+    實際併發也受呼叫端的下載 thread 數限制，thread 比 max_limit 少時上限到不了 max_limit。
+    """
+
+    def __init__(
+        self,
+        initial: float = 2,
+        min_limit: float = 1,
+        max_limit: float = DEFAULT_MAX_LIMIT,
+        backoff: float = 0.5,
+        latency_tolerance: float = 2.0,
+        alpha: float = 0.2,
+        latency_window: int = 100,
+    ):
+        self.initial = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.alpha = alpha
+        self.latency_window = latency_window
+        self._hosts: dict[str, HostState] = {}
+        self._lock = threading.Lock()
+
+    def state(self, host: str) -> HostState:
+        with self._lock:
+            st = self._hosts.get(host)
+            if st is None:
+                st = self._hosts[host] = HostState(
+                    limit=float(self.initial), recent_latencies=deque(maxlen=self.latency_window)
+                )
+            return st
+
+    def limit(self, host: str) -> float:
+        return self.state(host).limit
+
+    def acquire(self, host: str) -> None:
+        st = self.state(host)
+        with st.cond:
+            while True:
+                wait = st.blocked_until - time.monotonic()
+                if wait > 0:
+                    st.cond.wait(wait)
+                    continue
+                if st.in_flight < max(1, int(st.limit)):
+                    st.in_flight += 1
+                    return
+                st.cond.wait()
+
+    def release(self, host: str) -> None:
+        st = self.state(host)
+        with st.cond:
+            st.in_flight -= 1
+            st.cond.notify_all()
+
+    def record(self, host: str, latency: float, status: int | None = None,
+               timed_out: bool = False, retry_after: float | None = None) -> None:
+        """依照一次請求的結果調整該 host 的併發上限。"""
+        st = self.state(host)
+        now = time.monotonic()
+        with st.cond:
+            old = st.limit
+            if timed_out or status in THROTTLE_STATUSES or (status is not None and status >= 500):
+                # 同一波壅塞只降一次，避免連續的 429 把上限直接打到底
+                if now - st.last_decrease >= (st.ewma_latency or 0.0):
+                    st.limit = max(self.min_limit, st.limit * self.backoff)
+                    st.last_decrease = now
+                if retry_after:
+                    st.blocked_until = max(st.blocked_until, now + retry_after)
+                reason = "timeout" if timed_out else f"HTTP {status}"
+                logger.info("limiter %s: %s -> limit %.2f -> %.2f (retry_after=%s)",
+                            host, reason, old, st.limit, retry_after)
+                st.cond.notify_all()
+                return
+
+            if status is not None and status >= 400:
+                # 其他錯誤不加速也不減速
+                logger.debug("limiter %s: HTTP %s, limit stays %.2f", host, status, st.limit)
+                return
+
+            st.ewma_latency = latency if st.ewma_latency is None else (
+                self.alpha * latency + (1 - self.alpha) * st.ewma_latency
+            )
+            # 只看最近的樣本：路由或伺服器變慢之後，很久以前的一次快速回應不該一直當基準
+            st.recent_latencies.append(latency)
+            st.min_latency = min(st.recent_latencies)
+
+            if st.ewma_latency > st.min_latency * self.latency_tolerance:
+                st.limit = max(self.min_limit, st.limit - 1 / st.limit)
+                decision = "slow"
+            else:
+                st.limit = min(self.max_limit, st.limit + 1 / st.limit)
+                decision = "healthy"
+
+            log = logger.info if int(old) != int(st.limit) else logger.debug
+            log("limiter %s: %s (ewma %.3fs, min %.3fs) -> limit %.2f -> %.2f",
+                host, decision, st.ewma_latency, st.min_latency, old, st.limit)
+            st.cond.notify_all()
+
+    @contextmanager
+    def slot(self, url: str) -> Iterator[Slot]:
+        """取得一個併發名額，離開時依 Slot 的內容回報結果。
+
+        with 區塊內丟出 NETWORK_ERRORS（逾時、連線失敗等）會當成 timeout 類的失敗而降速；
+        其他例外是本地的問題，只歸還名額、不記錄這次結果，例外照常往外丟。
+        """
+        host = urlparse(url).netloc
+        self.acquire(host)
+        slot = Slot(host=host)
+        start = time.monotonic()
+        local_error = False
+        try:
+            yield slot
+        except NETWORK_ERRORS:
+            slot.timed_out = True
+            raise
+        except BaseException:
+            local_error = True
+            raise
+        finally:
+            # 先記錄再歸還名額，下一個拿到名額的請求就會看到調整後的上限
+            if not local_error:
+                self.record(host, time.monotonic() - start, slot.status,
+                            timed_out=slot.timed_out, retry_after=slot.retry_after)
+            self.release(host)
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+NUMERIC_FIELDS = ("price", "price_original", "weight_g")
+SEGMENT_FIELDS = ("norm_country", "norm_process", "norm_roast", "norm_variety")
+# 分析用不到 title 以外的 *_raw 欄位，讀檔時直接略過
+LOAD_FIELDS = ("external_id", "title", "bean_type", "in_stock", *NUMERIC_FIELDS, *SEGMENT_FIELDS)
+# 一格可能有多個品種（"藝伎, SL28"）或多個產國（綜合豆），與 product_index.TERM_FIELDS
+# 一樣以逗號拆開後去掉空白
+MULTI_VALUE_FIELDS = {"norm_country": ",", "norm_variety": ","}
+DEFAULT_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+def load_products(csv_paths: Iterable[Path]) -> pd.DataFrame:
+    """把一次或多次爬取的輸出 CSV 讀成一張欄式表。
+
+    類別欄位用 category dtype（每種值只存一次），數值欄位用 float；
+    多了一個 run 欄位記錄每列來自第幾個檔案（依傳入順序，越後面越新）。
+    Args:
+        csv_paths (Iterable[Path]): run_bargain_once 的輸出 CSV
+
+    Returns:
+        pd.DataFrame: 所有列
+    """
+    dtypes = {name: "float64" for name in NUMERIC_FIELDS}
+    dtypes.update({name: "category" for name in ("bean_type", *SEGMENT_FIELDS)})
+
+    frames = []
+    for run, path in enumerate(csv_paths):
+        df = pd.read_csv(
+            path,
+            usecols=lambda c: c in LOAD_FIELDS,
+            dtype=dtypes,
+            true_values=["True"],
+            false_values=["False"],
+        )
+        df["run"] = np.int32(run)
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=[*LOAD_FIELDS, "run"])
+
+    # 各檔的 category 值不同，union 之後才能維持 category dtype
+    for name in ("bean_type", *SEGMENT_FIELDS):
+        if all(name in f for f in frames):
+            cats = pd.api.types.union_categoricals([f[name] for f in frames])
+            for f in frames:
+                f[name] = pd.Categorical(f[name], categories=cats.categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def add_price_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """加上 price_per_100g 與 discount_pct（0~1，相對 price_original 打了幾折），整欄一次算。
+
+    回傳新的 DataFrame，不會改到傳進來的 df。
+    """
+    price = df["price"].to_numpy(dtype="float64")
+    weight = df["weight_g"].to_numpy(dtype="float64")
+    original = df["price_original"].to_numpy(dtype="float64")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_100g = np.where(weight > 0, price / weight * 100, np.nan)
+        discount = np.where(original > 0, 1 - price / original, np.nan)
+
+    return df.assign(
+        price_per_100g=per_100g,
+        # 原價比售價還低的資料當成沒有折扣
+        discount_pct=np.clip(discount, 0, None),
+        in_stock=df["in_stock"].eq(True),
+    )
+
+
+def explode_segment(df: pd.DataFrame, field: str) -> pd.DataFrame:
+    """多值欄位（例如 norm_variety="藝伎, 帕卡瑪拉"、norm_country="巴西,哥倫比亞"）拆成一值一列，單值欄位原樣回傳"""
+    sep = MULTI_VALUE_FIELDS.get(field)
+    if sep is None:
+        return df
+    # 只對不重複的值做 split，再用 category codes 對回每一列
+    col = df[field].astype("category")
+    parts = pd.Series(col.cat.categories, dtype="object").str.split(sep)
+    mapping = parts.explode().str.strip()
+    codes = col.cat.codes.to_numpy()
+    keep = codes >= 0
+    rows = df[keep]
+    code_rows = pd.Series(np.arange(len(rows)), index=codes[keep])
+    # 每個 category code 對到它拆出的每一個值
+    joined = code_rows.to_frame("row").join(mapping.rename(field), how="inner")
+    out = rows.iloc[joined["row"].to_numpy()].copy()
+    out[field] = pd.Categorical(joined[field].to_numpy())
+    return out
+
+
+def category_percentiles(
+    df: pd.DataFrame,
+    field: str,
+    value: str = "price_per_100g",
+    quantiles: Sequence[float] = DEFAULT_QUANTILES,
+) -> pd.DataFrame:
+    """每個類別的筆數、平均與百分位數（依中位數由低到高排序）。
+
+    df 的每一列都算一筆：同一個商品在多次爬取裡出現幾次就算幾次。
+    要看「目前的商品」的分布，先用 latest_offers 去重（build_report 就是這樣做）。
+    """
+    data = explode_segment(df[[field, value]].dropna(), field)
+    grouped = data.groupby(field, observed=True)[value]
+    table = grouped.quantile(list(quantiles)).unstack()
+    table.columns = [f"p{round(q * 100)}" for q in quantiles]
+    table.insert(0, "mean", grouped.mean())
+    table.insert(0, "count", grouped.size())
+    return table.sort_values("p50" if "p50" in table else table.columns[-1])
+
+
+def latest_offers(df: pd.DataFrame) -> pd.DataFrame:
+    """同一個商品在多次爬取裡出現時，只留最後一次（run 最大）的那一列"""
+    if "external_id" not in df:
+        return df
+    order = np.argsort(df["run"].to_numpy(), kind="stable")
+    latest = df.iloc[order].drop_duplicates("external_id", keep="last")
+    return latest.sort_index()
+
+
+def cheapest_in_stock(df: pd.DataFrame, field: str, top: int = 3) -> pd.DataFrame:
+    """每個類別裡，目前有庫存、每 100g 最便宜的前 top 個商品"""
+    offers = latest_offers(df)
+    offers = offers[offers["in_stock"] & offers["price_per_100g"].notna()]
+    offers = explode_segment(offers, field)
+    offers = offers.sort_values([field, "price_per_100g"], kind="stable")
+    cols = [c for c in (field, "external_id", "title", "price", "weight_g", "price_per_100g", "discount_pct") if c in offers]
+    return offers.groupby(field, observed=True).head(top)[cols].reset_index(drop=True)
+
+
+def build_report(
+    df: pd.DataFrame,
+    fields: Sequence[str] = SEGMENT_FIELDS,
+    quantiles: Sequence[float] = DEFAULT_QUANTILES,
+    top: int = 3,
+) -> dict[str, pd.DataFrame]:
+    """產生所有報表，key 為報表名稱（也是輸出檔名）。
+
+    價格分布只用每個商品最新一次爬取的那一列（latest_offers），
+    爬了很多次的商品不會因為出現次數多而在百分位數裡佔比較重。
+    """
+    df = latest_offers(add_price_metrics(df))
+    report = {}
+    if "bean_type" in df:
+        report["discount_by_bean_type"] = category_percentiles(df, "bean_type", "discount_pct", quantiles)
+    for field in (f for f in fields if f in df):
+        name = field.removeprefix("norm_")
+        report[f"price_per_100g_by_{name}"] = category_percentiles(df, field, "price_per_100g", quantiles)
+        report[f"cheapest_by_{name}"] = cheapest_in_stock(df, field, top)
+    return report
+
+
+def write_report(report: dict[str, pd.DataFrame], out_dir: Path) -> dict[str, Path]:
+    """每張報表寫成一個 CSV"""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = {}
+    for name, table in report.items():
+        path = out_dir / f"{name}.csv"
+        table.to_csv(path, index=not name.startswith("cheapest_"), float_format="%.4g")
+        paths[name] = path
+    return paths
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="從爬取輸出算每 100g 價格、折扣與各類別的價格分布")
+    parser.add_argument("csv", type=Path, nargs="+", help="run_bargain_once 輸出的 CSV（多次爬取時依時間先後排列）")
+    parser.add_argument("--out-dir", type=Path, default=None, help="報表輸出目錄（預設 data/analytics）")
+    parser.add_argument("--top", type=int, default=3, help="每個類別列出幾個最便宜的有庫存商品（預設 3）")
+    parser.add_argument(
+        "--by",
+        nargs="+",
+        default=list(SEGMENT_FIELDS),
+        choices=SEGMENT_FIELDS,
+        help="要分組的欄位（預設全部）",
+    )
+    return parser
+
+
+def main() -> None:
+    args = build_arg_parser().parse_args()
+    project_root = Path(__file__).resolve().parents[1]
+    out_dir = args.out_dir or (project_root / "data" / "analytics")
+
+    t0 = time.perf_counter()
+    df = load_products(args.csv)
+    t_load = time.perf_counter() - t0
+    report = build_report(df, args.by, top=args.top)
+    t_report = time.perf_counter() - t0 - t_load
+
+    for name, path in write_report(report, out_dir).items():
+        print(f"📊 {name}: {path}")
+    print(f"⏱️  {len(df)} 筆，讀檔 {t_load:.2f} s，計算 {t_report:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""常駐模式：依設定檔定時重爬各個 sitemap，期間保留已載入的狀態。
+
+跟 cron 每次起一個 run_bargain_once 比起來，省掉的是每次的 interpreter 啟動、
+pandas / bs4 import、lexicon 載入與重新建立 TCP/TLS 連線：
+
+- lexicon 由 load_lexicon 快取在 process 內，coffee_lexicon.yaml 的 mtime 變了才重新載入
+- 下載用同一個 thread pool，每個 thread 的 requests.Session（連線池）跨次保留
+- parse 在同一個 process 內進行，bs4 / lexicon memo 一直是熱的；
+  設了 parse_workers 時改用常駐的 worker process，各自的 lexicon 也一樣保留
+
+設定檔範例（YAML，相對路徑以專案根目錄為準）：
+
+    lexicon: data/normalize/coffee_lexicon.yaml
+    fetch_workers: 16          # 下載 thread 數，也是每個 host 併發數的硬上限
+    parse_workers: 0           # 選填，>0 時用常駐的 worker process parse
+    parse_timeout: 10          # 選填，每頁 parse 的 CPU 秒數上限（0 不限制）
+    quarantine_dir: data/quarantine
+    status_file: data/daemon_status.json
+    status_port: 8765          # 選填，開一個只聽 127.0.0.1 的 HTTP 狀態頁
+    sites:
+      - name: bargain
+        sitemap_url: https://www.bargain-cafe.com/sitemap.xml
+        interval_minutes: 60
+        output: products.csv
+        format: csv                       # 選填，csv 或 jsonl（jsonl 會另外產生 .idx 索引）
+        state: data/bargain_state.db      # 選填，增量爬取
+        variations_output: variations.csv # 選填
+
+用法：
+    python crawl_daemon.py daemon.yaml [--once]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import yaml
+
+from adaptive_limiter import DEFAULT_MAX_LIMIT
+from crawl_state import CrawlState
+from fetch_manifest import iter_product_pages
+from normalizer.coffee_lexicon import load_lexicon
+from parse_guard import DEFAULT_PARSE_TIMEOUT, Quarantine, start_parse_pool
+from run_bargain_once import OUTPUT_WRITERS, SKIP_KEYWORDS_DEFAULT, run_pipeline
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_INTERVAL_MINUTES = 60
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SiteConfig:
+    name: str
+    sitemap_url: str
+    output: Path
+    interval_s: float = DEFAULT_INTERVAL_MINUTES * 60
+    state: Path | None = None
+    stale_sample: int = 0
+    variations_output: Path | None = None
+    output_format: str = "csv"
+    skip_keywords: tuple[str, ...] = SKIP_KEYWORDS_DEFAULT
+
+
+@dataclass
+class DaemonConfig:
+    sites: list[SiteConfig]
+    lexicon: Path = PROJECT_ROOT / "data" / "normalize" / "coffee_lexicon.yaml"
+    fetch_workers: int = DEFAULT_MAX_LIMIT
+    parse_workers: int = 0
+    parse_timeout: float | None = DEFAULT_PARSE_TIMEOUT
+    quarantine_dir: Path = PROJECT_ROOT / "data" / "quarantine"
+    fuzzy_threshold: float | None = None
+    status_file: Path = PROJECT_ROOT / "data" / "daemon_status.json"
+    status_port: int | None = None
+    sites_by_name: dict[str, SiteConfig] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.sites_by_name = {site.name: site for site in self.sites}
+
+
+def _path(value, root: Path) -> Path | None:
+    if value is None:
+        return None
+    p = Path(value)
+    return p if p.is_absolute() else root / p
+
+
+def load_config(config_path: Path, root: Path = PROJECT_ROOT) -> DaemonConfig:
+    """讀取常駐模式的設定檔，格式不對時丟 ValueError。
+
+    Args:
+        config_path (Path): YAML 設定檔
+        root (Path): 相對路徑的基準目錄（預設專案根目錄）
+
+    Returns:
+        DaemonConfig: 設定
+    """
+    with open(config_path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+
+    sites = []
+    for i, item in enumerate(data.get("sites") or []):
+        if not isinstance(item, dict) or not item.get("sitemap_url"):
+            raise ValueError(f"sites[{i}] 缺少 sitemap_url")
+        name = str(item.get("name") or f"site{i}")
+        skip = item.get("skip_keywords")
+        output_format = item.get("format", "csv")
+        if output_format not in OUTPUT_WRITERS:
+            raise ValueError(f"sites[{i}] 的 format 只能是 {sorted(OUTPUT_WRITERS)}")
+        sites.append(SiteConfig(
+            name=name,
+            sitemap_url=item["sitemap_url"],
+            output=_path(item.get("output") or f"products.{name}.{output_format}", root),
+            interval_s=float(item.get("interval_minutes", DEFAULT_INTERVAL_MINUTES)) * 60,
+            state=_path(item.get("state"), root),
+            stale_sample=int(item.get("stale_sample", 0)),
+            variations_output=_path(item.get("variations_output"), root),
+            output_format=output_format,
+            skip_keywords=SKIP_KEYWORDS_DEFAULT if skip is None else tuple(skip),
+        ))
+    if not sites:
+        raise ValueError("設定檔沒有任何 sites")
+    names = [site.name for site in sites]
+    if len(set(names)) != len(names):
+        raise ValueError(f"sites 的 name 重複：{names}")
+
+    config = DaemonConfig(sites=sites)
+    for key in ("lexicon", "status_file", "quarantine_dir"):
+        if data.get(key):
+            setattr(config, key, _path(data[key], root))
+    if data.get("fetch_workers"):
+        config.fetch_workers = int(data["fetch_workers"])
+    if data.get("parse_workers"):
+        config.parse_workers = int(data["parse_workers"])
+    if data.get("parse_timeout") is not None:
+        config.parse_timeout = float(data["parse_timeout"]) or None
+    if data.get("fuzzy_threshold") is not None:
+        config.fuzzy_threshold = float(data["fuzzy_threshold"])
+    if data.get("status_port"):
+        config.status_port = int(data["status_port"])
+    return config
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class CrawlDaemon:
+    """依各 site 的 interval 輪流爬取，並把每次執行的時間與筆數寫進狀態檔。"""
+
+    def __init__(self, config: DaemonConfig):
+        self.config = config
+        # parse worker 先 fork 出來，之後才有下載 thread 與狀態 server 的 thread
+        self.parse_pool = start_parse_pool(config.parse_workers) if config.parse_workers > 0 else None
+        # 跨次共用的下載 thread：thread 不結束，它的 Session 連線就一直留著
+        self.pool = ThreadPoolExecutor(max_workers=max(1, config.fetch_workers))
+        self.quarantine = Quarantine(config.quarantine_dir)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._lexicon = None
+        self._server: ThreadingHTTPServer | None = None
+        self.next_run = {site.name: 0.0 for site in config.sites}
+        self.status = {
+            "pid": os.getpid(),
+            "started_at": _now_iso(),
+            "sites": {site.name: {"runs": 0} for site in config.sites},
+        }
+
+    def _count_pages(self, paths: Iterable[Path], stats: dict) -> Iterator[Path]:
+        for path in paths:
+            stats["pages"] += 1
+            yield path
+
+    def _warm_lexicon(self) -> bool:
+        """確認 lexicon 是最新的（YAML 改過會重新載入），回傳這次是否有重新載入"""
+        lex = load_lexicon(self.config.lexicon, fuzzy_threshold=self.config.fuzzy_threshold)
+        reloaded = self._lexicon is not None and lex is not self._lexicon
+        self._lexicon = lex
+        if reloaded:
+            print(f"🔁 偵測到 {self.config.lexicon.name} 有更新，已重新載入 lexicon")
+        return reloaded
+
+    def run_site(self, site: SiteConfig) -> dict:
+        """爬一次 site，回傳這次的統計（也會記進 status）"""
+        stats = {"started_at": _now_iso(), "pages": 0, "products": 0, "error": None}
+        quarantined_before = self.quarantine.count
+        state = None
+        t0 = time.perf_counter()
+        try:
+            stats["lexicon_reloaded"] = self._warm_lexicon()
+            stats["lexicon_s"] = round(time.perf_counter() - t0, 3)
+            state = CrawlState(site.state) if site.state else None
+            html_paths = iter_product_pages(
+                sitemap_url=site.sitemap_url,
+                brand_name=site.name,
+                workers=self.config.fetch_workers,
+                state=state,
+                stale_sample=site.stale_sample,
+                pool=self.pool,
+            )
+            stats["products"] = run_pipeline(
+                self._count_pages(html_paths, stats),
+                site.output,
+                site.skip_keywords,
+                self.config.lexicon,
+                self.config.fuzzy_threshold,
+                variations_output=site.variations_output,
+                output_format=site.output_format,
+                parse_timeout=self.config.parse_timeout,
+                quarantine=self.quarantine,
+                parse_workers=self.config.parse_workers,
+                parse_pool=self.parse_pool,
+            )
+        except Exception as e:
+            logger.exception("crawl %s failed", site.name)
+            stats["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            if state:
+                state.close()
+        stats["quarantined"] = self.quarantine.count - quarantined_before
+        stats["duration_s"] = round(time.perf_counter() - t0, 3)
+        stats["finished_at"] = _now_iso()
+
+        with self._lock:
+            entry = self.status["sites"][site.name]
+            entry["runs"] += 1
+            entry["last_run"] = stats
+            if stats["error"] is None:
+                entry["last_success"] = stats["finished_at"]
+        print(f"🕒 {site.name}: {stats['products']} 筆 / {stats['pages']} 頁，{stats['duration_s']} s")
+        return stats
+
+    def status_json(self) -> str:
+        with self._lock:
+            return json.dumps(self.status, ensure_ascii=False, indent=2)
+
+    def write_status(self) -> None:
+        """整份狀態先寫暫存檔再取代，讀的一方不會讀到寫一半的 JSON"""
+        path = self.config.status_file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(self.status_json(), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def serve_status(self, port: int) -> ThreadingHTTPServer:
+        """在背景 thread 開一個只聽 127.0.0.1 的 HTTP 伺服器，GET 任何路徑都回傳狀態 JSON"""
+        daemon = self
+
+        class StatusHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = daemon.status_json().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), StatusHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"📡 狀態頁：http://127.0.0.1:{self._server.server_port}/")
+        return self._server
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run_forever(self, once: bool = False) -> None:
+        """輪流跑到期的 site，直到 stop()（或 once=True 時每個 site 各跑一次）"""
+        if self.config.status_port:
+            self.serve_status(self.config.status_port)
+        pending_once = set(self.next_run)
+        try:
+            while not self._stop.is_set():
+                name = min(self.next_run, key=self.next_run.get)
+                wait = self.next_run[name] - time.time()
+                if wait > 0:
+                    with self._lock:
+                        self.status["next_run"] = {"site": name, "in_s": round(wait, 1)}
+                    self.write_status()
+                    if self._stop.wait(wait):
+                        break
+                site = self.config.sites_by_name[name]
+                self.run_site(site)
+                self.next_run[name] = time.time() + site.interval_s
+                self.write_status()
+                pending_once.discard(name)
+                if once and not pending_once:
+                    break
+        finally:
+            if self._server:
+                self._server.shutdown()
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            if self.parse_pool:
+                self.parse_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="常駐模式：依設定檔定時重爬 sitemap")
+    parser.add_argument("config", type=Path, help="YAML 設定檔")
+    parser.add_argument("--once", action="store_true", help="每個 site 各跑一次就結束（測試設定用）")
+    parser.add_argument("--log-level", default="WARNING", help="logging 等級（預設 WARNING）")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(message)s")
+
+    daemon = CrawlDaemon(load_config(args.config))
+    # SIGTERM / Ctrl-C：跑完手上這一次就結束，不留下寫一半的輸出
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: daemon.stop())
+    daemon.run_forever(once=args.once)
+    print(f"👋 已停止，最後狀態寫在 {daemon.config.status_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url        TEXT PRIMARY KEY,
+    lastmod    TEXT,
+    fetched_at REAL NOT NULL,
+    path       TEXT
+);
+"""
+
+
+def _parse_lastmod(value: str | None) -> datetime | None:
+    """sitemap 的 lastmod（W3C datetime），解析失敗回傳 None"""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def lastmod_advanced(new: str | None, old: str | None) -> bool:
+    """sitemap 的 lastmod 是否比上次看到的新；無法比較時視為有變動"""
+    if new is None:
+        return False
+    if old is None:
+        return True
+    new_dt, old_dt = _parse_lastmod(new), _parse_lastmod(old)
+    if new_dt is None or old_dt is None:
+        return new != old
+    return new_dt > old_dt
+
+
+@dataclass
+class RefetchPlan:
+    to_fetch: list[tuple[str, str | None]] = field(default_factory=list)
+    reuse: list[tuple[str, Path]] = field(default_factory=list)
+    new: int = 0
+    changed: int = 0
+    stale: int = 0
+
+    @property
+    def avoided(self) -> int:
+        return len(self.reuse)
+
+    def summary(self) -> str:
+        return (
+            f"新商品 {self.new}、lastmod 更新 {self.changed}、抽查 {self.stale}，"
+            f"共下載 {len(self.to_fetch)} 頁，省下 {self.avoided} 次下載"
+        )
+
+
+class CrawlState:
+    """記錄每個網址上次看到的 lastmod 與下載時間（SQLite），用來決定這次要重抓哪些頁面。"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path)
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "CrawlState":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def plan(self, entries: Iterable[tuple[str, str | None]], stale_sample: int = 0) -> RefetchPlan:
+        """決定哪些網址要重抓。
+
+        - 沒看過的網址、lastmod 比上次新的、上次存的 HTML 不見的：一定重抓
+        - 其他沒變的：挑 stale_sample 個最久沒抓的抽查，剩下直接沿用已存的 HTML
+
+        Args:
+            entries: sitemap 的 (url, lastmod)
+            stale_sample (int): 每次額外抽查幾個沒變動的舊頁面
+
+        Returns:
+            RefetchPlan: 要下載的 (url, lastmod) 與可沿用的 (url, 路徑)
+        """
+        plan = RefetchPlan()
+        unchanged: list[tuple[float, str, str | None, Path]] = []
+        for url, lastmod in entries:
+            row = self._conn.execute(
+                "SELECT lastmod, fetched_at, path FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                plan.new += 1
+                plan.to_fetch.append((url, lastmod))
+                continue
+            old_lastmod, fetched_at, path = row
+            if lastmod_advanced(lastmod, old_lastmod):
+                plan.changed += 1
+                plan.to_fetch.append((url, lastmod))
+            elif not path or not Path(path).exists():
+                plan.new += 1
+                plan.to_fetch.append((url, lastmod))
+            else:
+                unchanged.append((fetched_at, url, lastmod, Path(path)))
+
+        # 最久沒抓的先抽查，下次換下一批，形成輪替
+        unchanged.sort(key=lambda x: x[0])
+        for fetched_at, url, lastmod, path in unchanged[:max(0, stale_sample)]:
+            plan.stale += 1
+            plan.to_fetch.append((url, lastmod))
+        plan.reuse = [(url, path) for _, url, _, path in unchanged[max(0, stale_sample):]]
+        return plan
+
+    def mark_fetched(self, url: str, lastmod: str | None, path: Path, fetched_at: float | None = None) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO pages (url, lastmod, fetched_at, path) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET lastmod = COALESCE(excluded.lastmod, pages.lastmod), "
+                "fetched_at = excluded.fetched_at, path = excluded.path",
+                (url, lastmod, fetched_at or time.time(), str(path)),
+            )
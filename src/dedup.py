@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import unicodedata
+import zlib
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from writers import write_jsonl
+
+
+# 標題裡跟「是哪支豆子」無關的部分：規格、促銷標籤、通用字
+_SIZE_RE = re.compile(r"(一磅|半磅|\d+(\.\d+)?\s*(g|克|公克|kg|公斤|lb|磅))", re.IGNORECASE)
+_TAG_RE = re.compile(r"【[^】]*】|\[[^\]]*\]")
+_NOISE_WORDS = ("100%阿拉比卡", "精品咖啡", "咖啡豆", "咖啡")
+_FIELDS = ("norm_country", "norm_process", "norm_roast", "norm_variety")
+
+
+
+def clean_title(title: str | None) -> str:
+    """把標題轉成比對用的形式：去掉規格 / 標籤 / 通用字與空白"""
+    t = unicodedata.normalize("NFKC", title or "").lower()
+    t = _TAG_RE.sub(" ", t)
+    t = _SIZE_RE.sub(" ", t)
+    for word in _NOISE_WORDS:
+        t = t.replace(word, " ")
+    return re.sub(r"\s+", "", t)
+
+
+def shingles(row: dict, k: int = 3) -> set[str]:
+    """標題的字元 k-gram，加上正規化欄位當作額外的 token"""
+    t = clean_title(row.get("title"))
+    out = {t[i:i + k] for i in range(max(1, len(t) - k + 1))} if t else set()
+    for field in _FIELDS:
+        value = row.get(field)
+        if value:
+            out.add(f"{field}={value}")
+    return out
+
+
+class MinHashLSH:
+    """MinHash 簽章 + banding LSH。
+
+    每筆資料只會跟落在同一個 bucket 的資料比對，整體約為 O(n)，
+    不需要兩兩比較所有商品。
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 32, threshold: float = 0.7, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm 必須能被 bands 整除")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        rng = np.random.default_rng(seed)
+        # 奇數乘數 + 位移，mod 2^32 下是一組互不相同的雜湊排列
+        self._a = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64).astype(np.uint32) | np.uint32(1)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64).astype(np.uint32)
+
+    def signature(self, items: set[str]) -> np.ndarray:
+        return self.signatures([items])[0]
+
+    def signatures(self, item_sets: list[set[str]], batch_rows: int = 4096) -> np.ndarray:
+        """一次算多筆的簽章（分批向量化），回傳 shape (n, num_perm) 的 uint32"""
+        out = np.empty((len(item_sets), self.num_perm), dtype=np.uint32)
+        for start in range(0, len(item_sets), batch_rows):
+            batch = [items or {""} for items in item_sets[start:start + batch_rows]]
+            lengths = np.fromiter((len(items) for items in batch), dtype=np.int64, count=len(batch))
+            hv = np.fromiter(
+                (zlib.crc32(s.encode("utf-8")) for items in batch for s in items),
+                dtype=np.uint32,
+                count=int(lengths.sum()),
+            )
+            # (a * h + b) mod 2^32，直接用 uint32 溢位
+            perm = np.outer(hv, self._a)
+            perm += self._b
+            offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            out[start:start + len(batch)] = np.minimum.reduceat(perm, offsets, axis=0)
+        return out
+
+    def cluster(self, signatures: np.ndarray) -> list[int]:
+        """依簽章分群，回傳每筆資料所屬群的代表列號（群內最小的列號）。
+
+        同一個 bucket 裡的每一對都用估計的 Jaccard 驗證，通過的用 union-find 合併，
+        所以 A~B、B~C 但 A 不像 C 時三筆仍然同一群。
+        """
+        n = len(signatures)
+        parent = list(range(n))
+
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        band_dtype = np.dtype((np.void, 4 * self.rows))
+        for band in range(self.bands):
+            lo, hi = band * self.rows, (band + 1) * self.rows
+            keys = np.ascontiguousarray(signatures[:, lo:hi]).view(band_dtype).ravel()
+            _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+            inverse = inverse.ravel()
+            # 依 bucket 排好，只看有兩筆以上的 bucket
+            order = np.argsort(inverse, kind="stable")
+            ends = np.cumsum(counts)
+            for bucket in np.flatnonzero(counts > 1):
+                members = order[ends[bucket] - counts[bucket]:ends[bucket]]
+                for pos, a in enumerate(members[:-1]):
+                    others = members[pos + 1:]
+                    # 候選對再用估計的 Jaccard 驗證，排除只碰巧撞到一個 band 的
+                    sim = (signatures[others] == signatures[a]).mean(axis=1)
+                    for b in others[sim >= self.threshold]:
+                        ra, rb = find(int(a)), find(int(b))
+                        if ra != rb:
+                            parent[max(ra, rb)] = min(ra, rb)
+
+        return [find(i) for i in range(n)]
+
+
+def _stable_key(row: dict) -> str:
+    # 有 external_id 就用它；沒有的話退回比對用的標題
+    return row.get("external_id") or f"title:{clean_title(row.get('title'))}"
+
+
+def assign_clusters(rows: Iterable[dict], lsh: MinHashLSH | None = None) -> list[str]:
+    """對一批商品計算 cluster id。
+
+    cluster id 是群內最小 external_id 的雜湊（12 個 hex 字元），跟列的順序無關；
+    同一群商品在下一次執行時只要成員沒變，id 就一樣，可以拿來跨次 group by。
+    """
+    lsh = lsh or MinHashLSH()
+    sets, keys = [], []
+    for row in rows:
+        sets.append(shingles(row))
+        keys.append(_stable_key(row))
+    if not sets:
+        return []
+    roots = lsh.cluster(lsh.signatures(sets))
+    smallest: dict[int, str] = {}
+    for root, key in zip(roots, keys):
+        if root not in smallest or key < smallest[root]:
+            smallest[root] = key
+    ids = {root: hashlib.blake2b(key.encode("utf-8"), digest_size=6).hexdigest() for root, key in smallest.items()}
+    return [ids[root] for root in roots]
+
+
+def _iter_jsonl(path: Path) -> Iterable[dict]:
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def add_cluster_ids_jsonl(input_path: Path, output_path: Path | None = None, lsh: MinHashLSH | None = None) -> int:
+    """在 JSONL 的每一筆加上 cluster_id。
+
+    與 CSV 版一樣讀兩次；第二次經由 write_jsonl 寫出，sidecar 索引會一起重建。
+
+    Returns:
+        int: cluster 數量
+    """
+    lsh = lsh or MinHashLSH()
+    input_path = Path(input_path)
+    output_path = Path(output_path) if output_path else input_path
+
+    clusters = assign_clusters(_iter_jsonl(input_path), lsh)
+
+    def rows():
+        for row, cid in zip(_iter_jsonl(input_path), clusters):
+            row["cluster_id"] = cid
+            yield row
+
+    write_jsonl(rows(), output_path)
+    return len(set(clusters))
+
+
+def add_cluster_ids(input_path: Path, output_path: Path | None = None, lsh: MinHashLSH | None = None) -> int:
+    """依副檔名（.jsonl 或 CSV）加上 cluster_id，回傳 cluster 數量"""
+    if Path(input_path).suffix == ".jsonl":
+        return add_cluster_ids_jsonl(input_path, output_path, lsh)
+    return add_cluster_ids_csv(input_path, output_path, lsh)
+
+
+def add_cluster_ids_csv(input_path: Path, output_path: Path | None = None, lsh: MinHashLSH | None = None) -> int:
+    """在 CSV 加上 cluster_id 欄位。
+
+    讀兩次檔案：第一次只算分群（每列只保留 shingle 集合與簽章），第二次逐列寫出。
+
+    Returns:
+        int: cluster 數量
+    """
+    lsh = lsh or MinHashLSH()
+    input_path = Path(input_path)
+    output_path = Path(output_path) if output_path else input_path
+
+    with input_path.open(encoding="utf-8", newline="") as f:
+        clusters = assign_clusters(csv.DictReader(f), lsh)
+
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    with input_path.open(encoding="utf-8", newline="") as src, \
+            tmp_path.open("w", encoding="utf-8", newline="") as dst:
+        reader = csv.DictReader(src)
+        fieldnames = [c for c in (reader.fieldnames or []) if c != "cluster_id"] + ["cluster_id"]
+        writer = csv.DictWriter(dst, fieldnames=fieldnames, lineterminator="\n")
+        writer.writeheader()
+        for row, cid in zip(reader, clusters):
+            row["cluster_id"] = cid
+            writer.writerow(row)
+    os.replace(tmp_path, output_path)
+    return len(set(clusters))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="用 MinHash/LSH 幫商品 CSV / JSONL 標上近似重複的 cluster_id")
+    parser.add_argument("input", type=Path, help="run_bargain_once 輸出的 CSV 或 .jsonl")
+    parser.add_argument("--output", type=Path, default=None, help="輸出路徑（預設覆寫 input）")
+    parser.add_argument("--threshold", type=float, default=0.7, help="估計 Jaccard 相似度門檻（預設 0.7）")
+    args = parser.parse_args()
+
+    n = add_cluster_ids(args.input, args.output, MinHashLSH(threshold=args.threshold))
+    print(f"🧬 {n} clusters -> {args.output or args.input}")
+
+
+if __name__ == "__main__":
+    main()
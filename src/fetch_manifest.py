@@ -1,5 +1,18 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from adaptive_limiter import DEFAULT_MAX_LIMIT
+from crawl_state import CrawlState
 from fetch_page import fetch_page
-from fetch_sitemap import fetch_sitemap_text, parse_sitemap_xml, filter_product_urls
+from fetch_sitemap import (
+    PRODUCT_RE,
+    fetch_sitemap_text,
+    filter_product_urls,
+    iter_sitemap_entries_from_url,
+    parse_sitemap_xml,
+)
 
 def fetch_all_pages(sitemap_url: str, brand_name: str = None, save_html:bool=False):
     """
@@ -27,4 +40,114 @@ def fetch_all_pages(sitemap_url: str, brand_name: str = None, save_html:bool=Fal
         except Exception as e:
             print(f"❌ Failed: {url} ({e})")
     
-    return path_list
\ No newline at end of file
+    return path_list
+
+
+def iter_fetch_urls(
+    urls: Iterable[str],
+    workers: int = DEFAULT_MAX_LIMIT,
+    pool: ThreadPoolExecutor | None = None,
+) -> Iterator[tuple[str, Path | None, Exception | None]]:
+    """
+    併發下載一串商品頁，依輸入順序回傳 (url, 存檔路徑, 例外)；失敗時路徑為 None。
+
+    下載用 workers 個 thread，實際同時打出去的請求數由 fetch_page 的
+    adaptive limiter 依 host 決定；最多只會預先排 workers 頁。
+    呼叫端停止取值時，還沒開始的下載會被取消。
+    Args:
+        urls (Iterable[str]): 商品頁網址
+        workers (int, optional): 下載 thread 數（也是預先排隊的頁數上限）
+        pool (ThreadPoolExecutor, optional): 共用的下載 thread pool（常駐模式用，
+            thread 與其 Session 連線在多次爬取之間保留）；不給就每次建一個、用完關掉
+    """
+    workers = max(1, workers)
+    own_pool = pool is None
+    if own_pool:
+        pool = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+
+    def _collect():
+        url, future = pending.popleft()
+        try:
+            path = future.result()
+        except Exception as e:
+            print(f"❌ Failed: {url} ({e})")
+            return url, None, e
+        print(f"✅ Saved: {path}")
+        return url, path, None
+
+    try:
+        for url in urls:
+            pending.append((url, pool.submit(fetch_page, url, True)))
+            if len(pending) >= workers:
+                yield _collect()
+        while pending:
+            yield _collect()
+    finally:
+        if own_pool:
+            pool.shutdown(wait=True, cancel_futures=True)
+        else:
+            # 共用的 pool 不關，只取消還沒開始的下載並等正在跑的結束
+            for _, future in pending:
+                future.cancel()
+            for _, future in pending:
+                if not future.cancelled():
+                    future.exception()
+
+
+def iter_product_urls_from_sitemap(sitemap_url: str) -> Iterator[str]:
+    """邊下載 sitemap 邊逐一產生商品頁網址"""
+    for url, _ in iter_product_entries_from_sitemap(sitemap_url):
+        yield url
+
+
+def iter_product_entries_from_sitemap(sitemap_url: str) -> Iterator[tuple[str, str | None]]:
+    """邊下載 sitemap 邊逐一產生商品頁的 (網址, lastmod)"""
+    for url, lastmod in iter_sitemap_entries_from_url(sitemap_url):
+        if PRODUCT_RE.search(url):
+            yield url, lastmod
+
+
+def iter_product_pages(
+    sitemap_url: str,
+    brand_name: str = None,
+    workers: int = DEFAULT_MAX_LIMIT,
+    state: CrawlState | None = None,
+    stale_sample: int = 0,
+    pool: ThreadPoolExecutor | None = None,
+) -> Iterator[Path]:
+    """
+    fetch_all_pages 的串流版本：sitemap → 篩商品 → 下載，每下載好一頁就 yield 一個路徑。
+    呼叫端停止取值（例如 --limit 到了）時，後面的商品頁就不會被下載。
+    輸出順序與 sitemap 相同，併發方式見 iter_fetch_urls。
+
+    有給 state 時改成增量模式：只下載新商品、lastmod 有更新的與 stale_sample 個抽查頁，
+    其餘沿用上次存下的 HTML（先 yield 下載的，再 yield 沿用的）。
+    Args:
+        sitemap_url (str): 該網站的 sitemap.xml 位置
+        brand_name (str, optional): 品牌名稱（可選，用於日誌）
+        workers (int, optional): 下載 thread 數
+        state (CrawlState, optional): 上次爬取的 lastmod / 下載時間紀錄
+        stale_sample (int, optional): 每次額外重抓幾個沒變動的舊頁面
+        pool (ThreadPoolExecutor, optional): 共用的下載 thread pool，見 iter_fetch_urls
+    """
+    if state is None:
+        product_urls = iter_product_urls_from_sitemap(sitemap_url)
+
+        print(f"🔍 Streaming product pages from {brand_name or sitemap_url}")
+
+        for _, path, _ in iter_fetch_urls(product_urls, workers, pool):
+            if path is not None:
+                yield path
+        return
+
+    plan = state.plan(iter_product_entries_from_sitemap(sitemap_url), stale_sample=stale_sample)
+    print(f"🧮 {brand_name or sitemap_url}: {plan.summary()}")
+
+    lastmods = dict(plan.to_fetch)
+    for url, path, _ in iter_fetch_urls((url for url, _ in plan.to_fetch), workers, pool):
+        if path is not None:
+            state.mark_fetched(url, lastmods[url], path)
+            yield path
+    for _, path in plan.reuse:
+        yield path
@@ -1,31 +1,100 @@
 from pathlib import Path
+import os
+import threading
+import time
+
 import requests
 
+from adaptive_limiter import AdaptiveLimiter, THROTTLE_STATUSES
+from html_io import decode_html, header_charset
+
+try:  # urllib3 只有在裝了 brotli 時才會解 br
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)",
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
+REQUEST_TIMEOUT = 30
+MAX_RETRIES = 3
+# 下載時每次寫入的大小，也是單一下載在記憶體裡的上限
+CHUNK_SIZE = 64 * 1024
+
+# 所有 fetch_page 共用一個 limiter，依 host 分開調整併發數
+LIMITER = AdaptiveLimiter()
+
+_local = threading.local()
+
 
-def fetch_page(url: str, save_html:bool=False) -> Path:
+def get_session() -> requests.Session:
+    """每個 thread 一個 Session，重複使用 TCP/TLS 連線"""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+        session.headers.update(HEADERS)
+    return session
+
+
+def _retry_after_seconds(resp: requests.Response) -> float | None:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def fetch_page(url: str, save_html:bool=False, limiter: AdaptiveLimiter | None = None) -> Path:
     """Fetch a page from the given URL and save it to the given directory.
 
+    Requests go through an adaptive per-host limiter; 429/503 responses and
+    timeouts make it back off and are retried up to MAX_RETRIES times.
+    The body is requested compressed and, when saving, streamed to disk in
+    CHUNK_SIZE pieces as raw bytes (decoding happens at parse time). The
+    limiter slot is held until the body is fully read and the response closed.
+
     Args:
         url (str): The URL of the page to fetch.
-        save_dir (str, optional): The directory to save the page to. Defaults to "../data/raw_html".
+        save_html (bool, optional): Save the page under data/raw_html instead of returning its text.
+        limiter (AdaptiveLimiter, optional): Limiter to use. Defaults to the shared LIMITER.
 
     Returns:
         Path: The path to the saved page.
     """
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)"
-    }
+    limiter = limiter or LIMITER
 
     # send a GET request to the URL
-    resp = requests.get(url, headers=headers)
-
-    # check if the request was successful
-    resp.raise_for_status()
+    for attempt in range(MAX_RETRIES + 1):
+        throttled = False
+        try:
+            # body 下載完、連線關掉才釋放名額：latency 包含傳輸時間，併發數也才真的被限制住
+            with limiter.slot(url) as slot:
+                with get_session().get(url, timeout=REQUEST_TIMEOUT, stream=True) as resp:
+                    slot.status = resp.status_code
+                    slot.retry_after = _retry_after_seconds(resp)
+                    throttled = resp.status_code in THROTTLE_STATUSES and attempt < MAX_RETRIES
+                    if resp.ok:
+                        if not save_html:
+                            return decode_html(resp.content, header_charset(resp.headers.get("Content-Type")))
+                        return _save_body(url, resp)
+        except requests.Timeout:
+            if attempt == MAX_RETRIES:
+                raise
+            continue
+        if not throttled:
+            # check if the request was successful
+            resp.raise_for_status()
+        # limiter 已經降速（有 Retry-After 時也會擋住該 host），稍等再重試
+        time.sleep(min(2 ** attempt, 30))
 
-    if not save_html:
-        return resp.text
 
+def _save_body(url: str, resp: requests.Response) -> Path:
+    """Stream the response body to data/raw_html/{slug}.html with an atomic rename."""
     # create the output directory if it doesn't exist
     script_dir = Path(__file__).resolve().parent
     project_root = script_dir.parent
@@ -38,7 +107,15 @@ def fetch_page(url: str, save_html:bool=False) -> Path:
     # create the file path
     file_path = output_dir / f"{slug}.html"
 
-    # save the page to the file
-    file_path.write_text(resp.text, encoding="utf-8")
+    # save the page to the file: stream raw bytes into a temp file, then rename
+    tmp_path = file_path.with_name(f".{file_path.name}.{os.getpid()}.{threading.get_ident()}.part")
+    try:
+        with tmp_path.open("wb") as f:
+            for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
 
     return file_path
@@ -1,10 +1,17 @@
 from __future__ import annotations
 
-import requests
-from bs4 import BeautifulSoup
+import io
 import re
+import xml.etree.ElementTree as ET
+from typing import BinaryIO, Iterable, Iterator
+
+import requests
 
 
+PRODUCT_RE = re.compile(r"/products/")
+# 這些元素底下的 <loc> 是一筆網址（一般 sitemap 的 <url>、sitemap index 的 <sitemap>）
+ENTRY_TAGS = frozenset({"url", "sitemap"})
+
 
 def fetch_sitemap_text(sitemap_url: str) -> str:
     """下載 sitemap.xml，回傳原始 sitemap 文字
@@ -20,6 +27,21 @@ def fetch_sitemap_text(sitemap_url: str) -> str:
 
     return resp.text
 
+def iter_sitemap_entries_from_url(sitemap_url: str) -> Iterator[tuple[str, str | None]]:
+    """邊下載邊解析 sitemap，逐一產生 (URL, lastmod)；整份 sitemap 不會放進記憶體。
+
+    Args:
+        sitemap_url (str): sitemap 網址
+
+    Yields:
+        tuple[str, str | None]: (URL, lastmod 原始字串)
+    """
+    with requests.get(sitemap_url, stream=True) as resp:
+        resp.raise_for_status()
+        # 讓 raw stream 也會解 gzip / deflate 的 Content-Encoding
+        resp.raw.decode_content = True
+        yield from iter_sitemap_entries(resp.raw)
+
 def parse_sitemap_xml(xml_text:str)->list[str]:
     """解析 sitemap XML，回傳所有 URL（含非商品頁）。
 
@@ -29,11 +51,60 @@ def parse_sitemap_xml(xml_text:str)->list[str]:
     Returns:
         list[str]: 所有 URL 的清單，並且去重複
     """
+    return sorted({url for url, _ in iter_sitemap_entries(xml_text)})
 
-    soup = BeautifulSoup(xml_text, 'xml')
-    urls = [loc_tag.text.strip() for loc_tag in soup.find_all("loc")]
+def iter_sitemap_urls(source: str | bytes | BinaryIO)->Iterator[str]:
+    """逐一產生 sitemap 裡的 URL（依文件順序），不先排序整份清單。
 
-    return sorted(set[str](urls))
+    Args:
+        source (str | bytes | BinaryIO): xml 文字，或可讀的 binary stream
+
+    Yields:
+        str: URL
+    """
+    for url, _ in iter_sitemap_entries(source):
+        yield url
+
+def _local_name(tag: str) -> str:
+    # "{http://www.sitemaps.org/schemas/sitemap/0.9}loc" -> "loc"
+    return tag.rsplit("}", 1)[-1]
+
+def iter_sitemap_entries(source: str | bytes | BinaryIO)->Iterator[tuple[str, str | None]]:
+    """逐一產生 sitemap 裡的 (URL, lastmod)，沒有 <lastmod> 時為 None（依文件順序）。
+
+    用 ElementTree.iterparse 增量解析，每處理完一個 <url> 就把它從樹上清掉，
+    記憶體用量與 sitemap 大小無關。為了維持這一點也不記住看過的網址：sitemap 協定
+    本來就不允許重複的 <loc>，真的重複時會產生兩次（WorkQueue.enqueue 會忽略重複的）。
+
+    Args:
+        source (str | bytes | BinaryIO): xml 文字，或可讀的 binary stream（例如 HTTP response）
+
+    Yields:
+        tuple[str, str | None]: (URL, lastmod 原始字串)
+    """
+    if isinstance(source, str):
+        source = io.BytesIO(source.encode("utf-8"))
+    elif isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    root = None
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if root is None:
+            root = elem
+            continue
+        if event != "end" or _local_name(elem.tag) not in ENTRY_TAGS:
+            continue
+        url = lastmod = None
+        for child in elem:
+            name = _local_name(child.tag)
+            if name == "loc":
+                url = (child.text or "").strip()
+            elif name == "lastmod":
+                lastmod = (child.text or "").strip() or None
+        # 處理過的 <url> 不留在樹上
+        root.clear()
+        if url:
+            yield url, lastmod
 
 def filter_product_urls(urls:list[str])->list[str]:
     """從網址清單中保留商品的網址
@@ -44,7 +115,12 @@ def filter_product_urls(urls:list[str])->list[str]:
     Returns:
         list[str]: 含有 products 的網址清單
     """
-    PRODUCT_re = re.compile(r"/products/")
-    product_urls = [url for url in urls if PRODUCT_re.search(url)]
+    product_urls = list(iter_product_urls(urls))
+
+    return product_urls
 
-    return product_urls
\ No newline at end of file
+def iter_product_urls(urls:Iterable[str])->Iterator[str]:
+    """filter_product_urls 的 generator 版本，給串流 pipeline 用"""
+    for url in urls:
+        if PRODUCT_RE.search(url):
+            yield url
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import mmap
+import re
+from pathlib import Path
+
+
+DEFAULT_CHARSET = "utf-8"
+# <meta charset> 一定在文件開頭附近，只看前面這段就好
+SNIFF_BYTES = 4096
+
+_META_CHARSET_RE = re.compile(
+    rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_.:-]+)""",
+    re.IGNORECASE,
+)
+# <title> 幾乎都在 <head> 裡，先只讀檔案開頭這段
+TITLE_HEAD_BYTES = 64 * 1024
+
+TITLE_BYTES_RE = re.compile(rb"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+OG_TITLE_BYTES_RE = re.compile(
+    rb"""<meta[^>]+property=["']og:title["'][^>]+content=["'](.*?)["']""",
+    re.IGNORECASE | re.DOTALL,
+)
+
+_HEADER_CHARSET_RE = re.compile(r"charset\s*=\s*[\"']?([A-Za-z0-9_.:-]+)", re.IGNORECASE)
+
+
+def header_charset(content_type: str | None) -> str | None:
+    """從 Content-Type header 取出 charset，沒有就回傳 None"""
+    if not content_type:
+        return None
+    m = _HEADER_CHARSET_RE.search(content_type)
+    return m.group(1).lower() if m else None
+
+
+def sniff_charset(head: bytes) -> str | None:
+    """從 HTML 開頭的 <meta charset> / http-equiv 取出宣告的編碼"""
+    m = _META_CHARSET_RE.search(head[:SNIFF_BYTES])
+    if not m:
+        return None
+    return m.group(1).decode("ascii", errors="ignore").lower() or None
+
+
+def decode_html(data: bytes, declared: str | None = None) -> str:
+    """依宣告的編碼解碼一次（header > <meta> > utf-8），不做整份內容的編碼偵測。
+
+    Args:
+        data (bytes): 原始 HTML bytes
+        declared (str | None): 外部宣告的 charset（例如 HTTP header）
+
+    Returns:
+        str: 解碼後的 HTML
+    """
+    charset = declared or sniff_charset(data) or DEFAULT_CHARSET
+    try:
+        return data.decode(charset, errors="replace")
+    except LookupError:
+        # 宣告了 Python 不認得的編碼
+        return data.decode(DEFAULT_CHARSET, errors="replace")
+
+
+def read_html(html_path: Path) -> str:
+    """讀取存好的商品頁 bytes，並在 parse 時才解碼"""
+    return decode_html(Path(html_path).read_bytes())
+
+
+def read_title(html_path: Path) -> str | None:
+    """不讀整份檔案、不解碼整頁，直接在 bytes 上找 <title>，找不到再找 og:title。
+
+    先只看開頭 TITLE_HEAD_BYTES；在開頭找到的 <title> 一定就是整份檔案的第一個 <title>。
+    開頭沒有時才 mmap 整個檔案搜尋。只有比對到的那一段會被解碼。
+
+    Args:
+        html_path (Path): 存好的 HTML
+
+    Returns:
+        str | None: 標題
+    """
+    with open(html_path, "rb") as f:
+        head = f.read(TITLE_HEAD_BYTES)
+        charset = sniff_charset(head) or DEFAULT_CHARSET
+
+        m = TITLE_BYTES_RE.search(head)
+        if m is None and len(head) == TITLE_HEAD_BYTES:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                m = TITLE_BYTES_RE.search(mm) or OG_TITLE_BYTES_RE.search(mm)
+                span = m.group(1) if m else None
+        elif m is None:
+            m = OG_TITLE_BYTES_RE.search(head)
+            span = m.group(1) if m else None
+        else:
+            span = m.group(1)
+
+    if span is None:
+        return None
+    try:
+        return span.decode(charset, errors="ignore").strip()
+    except LookupError:
+        return span.decode(DEFAULT_CHARSET, errors="ignore").strip()
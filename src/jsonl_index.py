@@ -0,0 +1,176 @@
+"""JSONL 輸出的 sidecar 索引：external_id -> (byte offset, 長度)，以及用 mmap 隨機讀取的 reader。
+
+索引檔（products.jsonl.idx）格式，全部 little-endian：
+
+    header : magic b"PJI1" | capacity u64 | count u64 | data_size u64
+    slots  : capacity 個 (hash u64, offset u64, length u32)，length 為 0 表示空位
+
+slots 是 open addressing 的 hash table（capacity 為 2 的次方、至少 2 倍筆數，線性探測），
+查一筆平均只看一兩個 slot，再到 JSONL 裡讀那一行；不需要載入或解析其他資料。
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Iterable, Mapping
+
+
+INDEX_SUFFIX = ".idx"
+MAGIC = b"PJI1"
+_HEADER = struct.Struct("<4sQQQ")
+_SLOT = struct.Struct("<QQI")
+
+
+def index_path_for(jsonl_path: Path) -> Path:
+    """JSONL 對應的索引檔位置（同目錄、多一個 .idx）"""
+    jsonl_path = Path(jsonl_path)
+    return jsonl_path.with_name(jsonl_path.name + INDEX_SUFFIX)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def write_index(offsets: Mapping[str, tuple[int, int]], index_path: Path, data_size: int) -> None:
+    """把 {external_id: (offset, length)} 寫成索引檔（先寫暫存檔再取代）。
+
+    Args:
+        offsets (Mapping[str, tuple[int, int]]): 每筆在 JSONL 裡的位置（不含換行）
+        index_path (Path): 索引檔路徑
+        data_size (int): JSONL 的大小，reader 用來確認索引與資料是同一版
+    """
+    capacity = 1
+    while capacity < max(2, len(offsets) * 2):
+        capacity <<= 1
+    mask = capacity - 1
+
+    table = bytearray(_HEADER.size + capacity * _SLOT.size)
+    _HEADER.pack_into(table, 0, MAGIC, capacity, len(offsets), data_size)
+    for key, (offset, length) in offsets.items():
+        h = _hash(key)
+        slot = h & mask
+        while _SLOT.unpack_from(table, _HEADER.size + slot * _SLOT.size)[2]:
+            slot = (slot + 1) & mask
+        _SLOT.pack_into(table, _HEADER.size + slot * _SLOT.size, h, offset, length)
+
+    index_path = Path(index_path)
+    tmp_path = index_path.with_name(index_path.name + ".tmp")
+    tmp_path.write_bytes(table)
+    os.replace(tmp_path, index_path)
+
+
+class JsonlReader:
+    """用 sidecar 索引從 JSONL 取出單筆或多筆商品，兩個檔案都是 mmap，不會整份讀進記憶體。
+
+    Args:
+        jsonl_path (Path): write_jsonl 產生的 JSONL
+        index_path (Path, optional): 索引檔（預設 jsonl_path + ".idx"）
+    """
+
+    def __init__(self, jsonl_path: Path, index_path: Path | None = None):
+        self.path = Path(jsonl_path)
+        self.index_path = Path(index_path) if index_path else index_path_for(self.path)
+        self._data_file = self.path.open("rb")
+        self._index_file = self.index_path.open("rb")
+        try:
+            self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self.capacity, self.count, data_size = _HEADER.unpack_from(self._index, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{self.index_path} 不是 JSONL 索引檔")
+            actual_size = os.fstat(self._data_file.fileno()).st_size
+            if data_size != actual_size:
+                raise ValueError(f"{self.index_path} 與 {self.path} 不是同一次輸出（大小 {data_size} != {actual_size}）")
+            # 空檔案不能 mmap；沒有資料時也不會有任何查得到的 key
+            self._data = (
+                mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ) if actual_size else b""
+            )
+        except BaseException:
+            self.close()
+            raise
+        self._mask = self.capacity - 1
+
+    def _locate(self, external_id: str) -> tuple[int, int] | None:
+        h = _hash(external_id)
+        slot = h & self._mask
+        while True:
+            slot_hash, offset, length = _SLOT.unpack_from(self._index, _HEADER.size + slot * _SLOT.size)
+            if not length:
+                return None
+            if slot_hash == h:
+                return offset, length
+            slot = (slot + 1) & self._mask
+
+    def get_raw(self, external_id: str) -> bytes | None:
+        """回傳那一行 JSON 的原始 bytes（不解析），找不到時回傳 None"""
+        loc = self._locate(external_id)
+        if loc is None:
+            return None
+        offset, length = loc
+        return self._data[offset:offset + length]
+
+    def get(self, external_id: str) -> dict | None:
+        """回傳一筆商品，找不到時回傳 None"""
+        raw = self.get_raw(external_id)
+        if raw is None:
+            return None
+        record = json.loads(raw)
+        # 64-bit hash 撞到的機率極低，仍然確認一下是不是同一個 id
+        return record if record.get("external_id") == external_id else None
+
+    def get_many(self, external_ids: Iterable[str]) -> dict[str, dict]:
+        """一次取多筆，依檔案位置排序後再讀（對磁碟較友善）；找不到的 id 不會出現在結果裡"""
+        located = []
+        for external_id in dict.fromkeys(external_ids):
+            loc = self._locate(external_id)
+            if loc is not None:
+                located.append((loc, external_id))
+        out = {}
+        for (offset, length), external_id in sorted(located):
+            record = json.loads(self._data[offset:offset + length])
+            if record.get("external_id") == external_id:
+                out[external_id] = record
+        return out
+
+    def __contains__(self, external_id: str) -> bool:
+        return self.get(external_id) is not None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        for name in ("_data", "_index"):
+            obj = getattr(self, name, None)
+            if isinstance(obj, mmap.mmap):
+                obj.close()
+        self._data_file.close()
+        self._index_file.close()
+
+    def __enter__(self) -> "JsonlReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="用 sidecar 索引從 products.jsonl 取出指定商品")
+    parser.add_argument("jsonl", type=Path, help="run_bargain_once --format jsonl 的輸出")
+    parser.add_argument("external_id", nargs="+", help="要查的 external_id")
+    args = parser.parse_args()
+
+    with JsonlReader(args.jsonl) as reader:
+        found = reader.get_many(args.external_id)
+    for external_id in args.external_id:
+        if external_id in found:
+            print(json.dumps(found[external_id], ensure_ascii=False))
+        else:
+            print(f"⚠️ 找不到 {external_id}")
+
+
+if __name__ == "__main__":
+    main()
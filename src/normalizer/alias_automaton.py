@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Hashable, Iterable, Iterator
+
+
+def _is_word_char(ch: str) -> bool:
+    # 英數字才算「字」；中文字之間本來就沒有空白，不檢查邊界
+    return ch.isascii() and ch.isalnum()
+
+
+class AliasAutomaton:
+    """所有 alias 建成一個 Aho-Corasick 自動機，掃一次文字就找出所有出現的 alias。
+
+    掃描時間只跟文字長度（加上命中數）有關，跟 alias 的數量無關。
+    英數開頭 / 結尾的 alias 要落在字的邊界上，避免 "yb" 對到 "ybxx" 這種情況。
+
+    Args:
+        entries (Iterable[tuple[str, Hashable]]): (alias, payload)；alias 需已是 canonical 形式，
+            同一個 alias 可以對到多個 payload（例如同時是品種也是產國）
+    """
+
+    def __init__(self, entries: Iterable[tuple[str, Hashable]]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        # 每個節點結束的 alias：(長度, payload, 需要檢查開頭邊界, 需要檢查結尾邊界)
+        self._out: list[tuple] = [()]
+        self.size = 0
+        for alias, payload in entries:
+            if alias:
+                self._add(alias, payload)
+        self._build()
+
+    def _add(self, alias: str, payload: Hashable) -> None:
+        node = 0
+        for ch in alias:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        self._out[node] += ((len(alias), payload, _is_word_char(alias[0]), _is_word_char(alias[-1])),)
+        self.size += 1
+
+    def _build(self) -> None:
+        # BFS 設定 failure link，並把 failure 節點的輸出併進來
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def iter_matches(self, text: str) -> Iterator[tuple[int, int, Hashable]]:
+        """逐一產生 (start, end, payload)，依 end 排序，可能互相重疊"""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        n = len(text)
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, payload, check_start, check_end in out[node]:
+                start = i + 1 - length
+                if check_start and start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if check_end and i + 1 < n and _is_word_char(text[i + 1]):
+                    continue
+                yield start, i + 1, payload
+
+
+def leftmost_longest(matches: Iterable[tuple[int, int, Hashable]]) -> list[tuple[int, int, Hashable]]:
+    """從可能重疊的命中裡挑出不重疊的一組：先取最左邊的，同一起點取最長的。
+
+    例如 "中深焙" 會命中 "中深"、"中深焙"、"深焙"，只留下 "中深焙"。
+    """
+    picked = []
+    last_end = 0
+    for start, end, payload in sorted(matches, key=lambda m: (m[0], -m[1])):
+        if start >= last_end:
+            picked.append((start, end, payload))
+            last_end = end
+    return picked
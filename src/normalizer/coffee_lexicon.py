@@ -1,20 +1,81 @@
+from functools import lru_cache
 from pathlib import Path
+from typing import Iterable, Mapping
+import hashlib
+import os
+import pickle
 import re
+import struct
 import unicodedata
 import yaml
 
+from normalizer.alias_automaton import AliasAutomaton, leftmost_longest
+from normalizer.fuzzy_index import NgramIndex
 
-class CoffeeLexicon:
-    def __init__(self, yaml_path:Path):
-        # 把 Lexicon 的 YAML 打開
-        with yaml_path.open("r", encoding='utf-8') as f:
-            data = yaml.safe_load(f)
 
-        #初始化
-        self.process = self._prep_category(data.get("process", {}))
-        self.variety = self._prep_category(data.get("variety", {}))
-        self.roast = self._prep_category(data.get("roast", {}))
-        self.country = self._prep_category(data.get("country", {}))
+CATEGORIES = ("process", "variety", "roast", "country")
+DEFAULT_CACHE_SIZE = 4096
+
+# 預先編譯好的 lexicon（compile_lexicon 產生），一定放在 YAML 旁邊
+ARTIFACT_SUFFIX = ".lexc"
+ARTIFACT_VERSION = 2
+# artifact 檔頭：magic | 版本 u32 | YAML 內容的 sha256 | 後面 pickle 內容的 sha256
+ARTIFACT_MAGIC = b"LEXC"
+_ARTIFACT_HEADER = struct.Struct("<4sI32s32s")
+
+# 全文掃描時，同一段文字同時是多個類別的 alias（例如「哥倫比亞」）時歸給前面的類別
+SCAN_PRIORITY = ("country", "process", "roast", "variety")
+# 全文掃描不用單字 alias（例如烘焙度的「淺」），太容易在一般文字裡誤中
+SCAN_MIN_ALIAS_LEN = 2
+
+
+class CoffeeLexicon:
+    def __init__(
+        self,
+        yaml_path:Path,
+        cache_size:int|None=DEFAULT_CACHE_SIZE,
+        use_artifact:bool=True,
+        fuzzy_threshold:float|None=None,
+    ):
+        # 有從同一份 YAML 編出來的 artifact 就直接讀，否則退回讀 YAML
+        artifact = load_artifact(yaml_path) if use_artifact else None
+        if artifact is not None:
+            self.loaded_from = "artifact"
+            for name in CATEGORIES:
+                setattr(self, name, self._load_category(artifact["categories"][name]))
+            self._alias_index = artifact["alias_index"]
+        else:
+            # 把 Lexicon 的 YAML 打開
+            with yaml_path.open("r", encoding='utf-8') as f:
+                data = yaml.safe_load(f)
+
+            #初始化
+            self.loaded_from = "yaml"
+            self.process = self._prep_category(data.get("process", {}))
+            self.variety = self._prep_category(data.get("variety", {}))
+            self.roast = self._prep_category(data.get("roast", {}))
+            self.country = self._prep_category(data.get("country", {}))
+            self._alias_index = {name: build_alias_index(getattr(self, name)) for name in CATEGORIES}
+
+        # 模糊比對（選用）：alias 與 regex 都沒中時，用 n-gram 索引找最像的 alias
+        self.fuzzy_threshold = fuzzy_threshold
+        self._fuzzy = (
+            {name: NgramIndex(self._alias_index[name]) for name in CATEGORIES}
+            if fuzzy_threshold is not None
+            else {}
+        )
+
+        # 全文掃描用的 Aho-Corasick 自動機，第一次 scan_text 時才建
+        self._automaton = None
+
+        # 每個類別各自一份有上限的 memo：同一個 raw 字串只做一次 NFKC + 比對
+        self.cache_size = cache_size
+        self._cached = {
+            "process": lru_cache(maxsize=cache_size)(self._normalize_process),
+            "variety": lru_cache(maxsize=cache_size)(self._normalize_variety),
+            "roast": lru_cache(maxsize=cache_size)(self._normalize_roast),
+            "country": lru_cache(maxsize=cache_size)(self._normalize_country),
+        }
 
     # ===== helpers =====
     @staticmethod
@@ -94,8 +155,20 @@ class CoffeeLexicon:
             out[norm_key] = {"aliases": aliases, "regex": regex}
         return out
 
+    @staticmethod
+    def _load_category(cat:dict):
+        """從 artifact 還原類別：aliases 已經是 canonical 形式，只需要編譯 regex"""
+        return {
+            norm_key: {
+                "aliases": set(spec["aliases"]),
+                "regex": [re.compile(p, re.I) for p in spec["regex"]],
+            }
+            for norm_key, spec in cat.items()
+        }
+
     #會用到的字串預處理
-    def _canon(self, s:str) -> str:
+    @staticmethod
+    def _canon(s:str) -> str:
         if s is None : return ""
         s = unicodedata.normalize("NFKC", s)
         s = s.strip().lower()
@@ -103,37 +176,48 @@ class CoffeeLexicon:
         return s
 
     
-    def _match(self, text:str, category: dict, heuristics=None):
+    def _match(self, text:str, name: str, heuristics=None):
         """
         通用的比對，把yaml 下面層級的 aliases 換成上面的
 
         Args:
             text (str): _description_
+            name (str): 類別名稱（process / variety / roast / country）
             heuristics (_type_, optional): _description_. Defaults to None.
+
+        Returns:
+            tuple: (正規化 key 或 None, 命中的方式 alias / regex / heuristic / fuzzy 或 None)
         """
         t = self._canon(text)
+        category = getattr(self, name)
 
-        #1. 精準命中
-        for k, spec in category.items():
-            if t in spec["aliases"]:
-                return k
+        #1. 精準命中（alias -> key 的索引，一次查表）
+        hit = self._alias_index[name].get(t)
+        if hit is not None:
+            return hit, "alias"
 
         #2. 正則表示法比對
         for k, spec in category.items():
             for rgx in spec["regex"]:
                 if rgx.search(t):
-                    return k
+                    return k, "regex"
         
         #3. 最後補看看動
         if heuristics:
             got = heuristics(t)
             if got: 
-                return got
-        return None
+                return got, "heuristic"
 
+        #4. 模糊比對（有開才做）
+        if self._fuzzy:
+            got = self._fuzzy[name].lookup(t, self.fuzzy_threshold)
+            if got:
+                return got[0], "fuzzy"
+        return None, None
 
-    #--------- Public ---------------
-    def normalize_process(self, raw:str) -> str:
+
+    #--------- 實際比對（未快取），回傳 (結果, 命中方式) ---------------
+    def _normalize_process(self, raw:str) -> tuple:
         def heur(t: str):
             if "厭氧" in t or "anaerobic" in t:
                 return "厭氧（Anaerobic）"
@@ -146,29 +230,289 @@ class CoffeeLexicon:
             if "溼剝" in t or "濕剝" in t or "giling basah" in t:
                 return "溼剝法（Wet hulled）"
             return None
-        return self._match(raw, self.process, heuristics=heur)
+        return self._match(raw, "process", heuristics=heur)
 
-    
-    def normalize_variety(self, raw:str) -> list:
-        """
-        1) 先把 raw 用 _preprocess_variety_raw 拆成 tokens（含中文 token 與英文 token）
-        2) 每個 token 用 lexicon 的 variety 區做 _match
-        3) 去重、保序
-        """
+    def _normalize_variety(self, raw:str) -> tuple:
         tokens = self._preprocess_variety_raw(raw)
 
         out = []
         seen = set()
+        methods = []
         for tok in tokens:
-            canon = self._match(tok, self.variety)
+            canon, how = self._match(tok, "variety")
             if canon and canon not in seen:
                 seen.add(canon)
                 out.append(canon)
-        return out
+                methods.append(how)
+        # 任一個 token 是模糊比對出來的，整筆就標成 fuzzy
+        method = "fuzzy" if "fuzzy" in methods else (methods[0] if methods else None)
+        # 回傳 tuple，避免快取裡的結果被呼叫端改掉
+        return tuple(out), method
+
+    def _normalize_roast(self, raw:str) -> tuple:
+        return self._match(raw, "roast")
+
+    def _normalize_country(self, raw:str) -> tuple:
+        return self._match(raw, "country")
+
+
+    #--------- Public ---------------
+    def normalize_process(self, raw:str) -> str:
+        return self._cached["process"](raw)[0]
+
+    
+    def normalize_variety(self, raw:str) -> list:
+        """
+        1) 先把 raw 用 _preprocess_variety_raw 拆成 tokens（含中文 token 與英文 token）
+        2) 每個 token 用 lexicon 的 variety 區做 _match
+        3) 去重、保序
+        """
+        return list(self._cached["variety"](raw)[0])
 
 
     def normalize_roast(self, raw:str)->str:
-        return self._match(raw, self.roast)
+        return self._cached["roast"](raw)[0]
 
     def normalize_country(self, raw:str)->str:
-        return self._match(raw, self.country)
+        return self._cached["country"](raw)[0]
+
+    def match_method(self, category:str, raw:str) -> str|None:
+        """回傳 raw 是怎麼被正規化的：alias / regex / heuristic / fuzzy，沒對到則為 None。
+
+        結果與 normalize_* 共用快取，所以在 normalize 之後呼叫幾乎不花時間。
+        """
+        if category not in self._cached:
+            raise ValueError(f"Unknown category: {category}")
+        return self._cached[category](raw)[1]
+
+    def normalize_column(self, category:str, values:Iterable[str|None]) -> list:
+        """整欄正規化：先去重，每個不同的值只算一次，再對應回原本的順序。
+
+        Args:
+            category (str): process / variety / roast / country 其中之一
+            values (Iterable[str | None]): 一整欄的 raw 值
+
+        Returns:
+            list: 與 values 等長的正規化結果
+        """
+        if category not in self._cached:
+            raise ValueError(f"Unknown category: {category}")
+        fn = self._cached[category]
+        values = list(values)
+        uniq = {v: fn(v)[0] for v in dict.fromkeys(values)}
+        if category == "variety":
+            return [list(uniq[v]) for v in values]
+        return [uniq[v] for v in values]
+
+    def normalize_batch(self, records:Iterable[Mapping[str, str|None]]) -> list[dict]:
+        """一次正規化多筆資料，以欄為單位處理（見 normalize_column）。
+
+        Args:
+            records: 每筆是 {類別: raw 值} 的 dict，例如 {"process": "水洗", "roast": "中深焙"}
+
+        Returns:
+            list[dict]: 同樣的 key，值換成正規化後的結果
+        """
+        records = list(records)
+        out: list[dict] = [{} for _ in records]
+        for category in CATEGORIES:
+            idx = [i for i, r in enumerate(records) if category in r]
+            if not idx:
+                continue
+            normed = self.normalize_column(category, (records[i][category] for i in idx))
+            for i, v in zip(idx, normed):
+                out[i][category] = v
+        return out
+
+    def cache_info(self) -> dict[str, dict]:
+        """回傳每個類別的快取命中統計。"""
+        stats = {}
+        for category, fn in self._cached.items():
+            info = fn.cache_info()
+            total = info.hits + info.misses
+            stats[category] = {
+                "hits": info.hits,
+                "misses": info.misses,
+                "size": info.currsize,
+                "maxsize": info.maxsize,
+                "hit_rate": info.hits / total if total else 0.0,
+            }
+        return stats
+
+    def cache_clear(self) -> None:
+        for fn in self._cached.values():
+            fn.cache_clear()
+
+    def scan_text(self, text:str|None) -> dict[str, list[str]]:
+        """在一整段文字（標題、商品描述）裡找出所有類別的 alias，不需要「處理法：」這類標籤。
+
+        所有 alias 共用一個 Aho-Corasick 自動機，文字只掃一次。每個類別各自取
+        leftmost-longest 不重疊的命中（「中深焙」不會再拆出「深焙」），
+        同一段文字同時屬於多個類別時依 SCAN_PRIORITY 歸給一個類別。
+
+        Returns:
+            dict[str, list[str]]: 類別 -> 依出現順序、去重後的正規化 key；沒命中的類別不會出現
+        """
+        if not text:
+            return {}
+        if self._automaton is None:
+            self._automaton = AliasAutomaton(
+                (alias, (category, key))
+                for category in CATEGORIES
+                for alias, key in self._alias_index[category].items()
+                if len(alias) >= SCAN_MIN_ALIAS_LEN
+            )
+
+        rank = {category: i for i, category in enumerate(SCAN_PRIORITY)}
+        spans: dict[tuple[int, int], tuple[str, str]] = {}
+        for start, end, (category, key) in self._automaton.iter_matches(self._canon(text)):
+            held = spans.get((start, end))
+            if held is None or rank[category] < rank[held[0]]:
+                spans[(start, end)] = (category, key)
+
+        found: dict[str, list[str]] = {}
+        for category in CATEGORIES:
+            hits = [(s, e, key) for (s, e), (c, key) in spans.items() if c == category]
+            keys = [key for _, _, key in leftmost_longest(hits)]
+            if keys:
+                found[category] = list(dict.fromkeys(keys))
+        return found
+
+
+def build_alias_index(category:dict) -> dict[str, str]:
+    """alias -> 正規化 key；同一個 alias 出現多次時保留 YAML 裡較前面的（與逐一掃描的結果相同）"""
+    index: dict[str, str] = {}
+    for norm_key, spec in category.items():
+        for alias in spec["aliases"]:
+            index.setdefault(alias, norm_key)
+    return index
+
+
+def artifact_path_for(yaml_path:Path) -> Path:
+    return Path(yaml_path).with_suffix(ARTIFACT_SUFFIX)
+
+
+def validate_lexicon_data(data) -> None:
+    """檢查 YAML 結構，有問題就丟 ValueError。"""
+    if not isinstance(data, dict):
+        raise ValueError("lexicon 最上層必須是 mapping")
+    for name in CATEGORIES:
+        cat = data.get(name, {}) or {}
+        if not isinstance(cat, dict):
+            raise ValueError(f"{name}: 必須是 mapping")
+        owner: dict[str, str] = {}
+        for norm_key, spec in cat.items():
+            if not isinstance(spec, dict):
+                raise ValueError(f"{name}.{norm_key}: 必須是 mapping")
+            aliases = spec.get("aliases", []) or []
+            patterns = spec.get("regex", []) or []
+            if not isinstance(aliases, list) or not all(isinstance(a, str) for a in aliases):
+                raise ValueError(f"{name}.{norm_key}: aliases 必須是字串清單")
+            if not isinstance(patterns, list) or not all(isinstance(p, str) for p in patterns):
+                raise ValueError(f"{name}.{norm_key}: regex 必須是字串清單")
+            for p in patterns:
+                try:
+                    re.compile(p, re.I)
+                except re.error as e:
+                    raise ValueError(f"{name}.{norm_key}: regex {p!r} 無法編譯（{e}）") from e
+            for alias in aliases:
+                canon = CoffeeLexicon._canon(alias)
+                prev = owner.setdefault(canon, str(norm_key))
+                if prev != str(norm_key):
+                    raise ValueError(f"{name}: alias {alias!r} 同時屬於 {prev} 與 {norm_key}")
+
+
+def compile_lexicon(yaml_path:Path) -> Path:
+    """驗證 lexicon YAML，並在 YAML 旁邊寫出預先處理好的二進位 artifact（.lexc）。
+
+    artifact 內容：每個類別的 canonical aliases、regex 原始字串，以及 alias -> key 索引；
+    檔頭記著版本與 YAML 的 sha256，載入時用來確認是同一份 YAML 編出來的。
+
+    Args:
+        yaml_path (Path): lexicon YAML
+
+    Returns:
+        Path: artifact 路徑
+    """
+    yaml_path = Path(yaml_path)
+    yaml_bytes = yaml_path.read_bytes()
+    data = yaml.safe_load(yaml_bytes.decode("utf-8"))
+    validate_lexicon_data(data)
+
+    lex = CoffeeLexicon(yaml_path, use_artifact=False)
+    categories = {}
+    for name in CATEGORIES:
+        categories[name] = {
+            norm_key: {
+                "aliases": sorted(spec["aliases"]),
+                "regex": [rgx.pattern for rgx in spec["regex"]],
+            }
+            for norm_key, spec in getattr(lex, name).items()
+        }
+    payload = {
+        "version": ARTIFACT_VERSION,
+        "categories": categories,
+        "alias_index": lex._alias_index,
+    }
+
+    body = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+    header = _ARTIFACT_HEADER.pack(
+        ARTIFACT_MAGIC, ARTIFACT_VERSION, hashlib.sha256(yaml_bytes).digest(), hashlib.sha256(body).digest()
+    )
+
+    out_path = artifact_path_for(yaml_path)
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    tmp.write_bytes(header + body)
+    os.replace(tmp, out_path)
+    return out_path
+
+
+def load_artifact(yaml_path:Path) -> dict | None:
+    """YAML 旁邊的 artifact 檔頭檢查都通過時回傳內容，否則回傳 None（改讀 YAML）。
+
+    檢查 magic、版本、YAML 內容的 sha256（YAML 改過就不用），以及內容本身的 sha256
+    （檔案寫壞、被截斷就不用），全部通過才 unpickle。
+    artifact 是 pickle，unpickle 可以執行任意程式碼：只能用自己 compile_lexicon 產生的檔案，
+    不要放從別處拿到的 .lexc。
+    """
+    artifact = artifact_path_for(yaml_path)
+    try:
+        raw = artifact.read_bytes()
+        yaml_digest = hashlib.sha256(Path(yaml_path).read_bytes()).digest()
+    except OSError:
+        return None
+    if len(raw) < _ARTIFACT_HEADER.size:
+        return None
+    magic, version, built_from, body_digest = _ARTIFACT_HEADER.unpack_from(raw)
+    body = raw[_ARTIFACT_HEADER.size:]
+    if (
+        magic != ARTIFACT_MAGIC
+        or version != ARTIFACT_VERSION
+        or built_from != yaml_digest
+        or hashlib.sha256(body).digest() != body_digest
+    ):
+        return None
+    try:
+        payload = pickle.loads(body)
+    except (pickle.UnpicklingError, EOFError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+_LOADED: dict[tuple[Path, float|None], tuple[int, CoffeeLexicon]] = {}
+
+
+def load_lexicon(yaml_path:Path, fuzzy_threshold:float|None=None) -> CoffeeLexicon:
+    """同一個 YAML 在同一個 process 內只載入一次，讓 memo 可以跨商品共用。
+
+    YAML 有被修改（mtime 變了）就重新載入。
+    """
+    path = Path(yaml_path).resolve()
+    key = (path, fuzzy_threshold)
+    mtime = path.stat().st_mtime_ns
+    hit = _LOADED.get(key)
+    if hit and hit[0] == mtime:
+        return hit[1]
+    lex = CoffeeLexicon(path, fuzzy_threshold=fuzzy_threshold)
+    _LOADED[key] = (mtime, lex)
+    return lex
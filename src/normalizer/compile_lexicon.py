@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+from normalizer.coffee_lexicon import compile_lexicon
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="驗證 coffee_lexicon.yaml 並在同一個目錄輸出預先編譯的 .lexc artifact（載入時只會找這個位置）"
+    )
+    parser.add_argument(
+        "--lexicon",
+        type=Path,
+        default=None,
+        help="lexicon YAML 路徑（預設 data/normalize/coffee_lexicon.yaml）",
+    )
+    return parser
+
+
+def main() -> None:
+    args = build_arg_parser().parse_args()
+    project_root = Path(__file__).resolve().parents[2]
+    lex_yaml = args.lexicon or (project_root / "data" / "normalize" / "coffee_lexicon.yaml")
+
+    try:
+        out = compile_lexicon(lex_yaml)
+    except ValueError as e:
+        raise SystemExit(f"❌ lexicon 驗證失敗：{e}")
+    print(f"💾 Saved lexicon artifact to {out}")
+
+
+if __name__ == "__main__":
+    main()
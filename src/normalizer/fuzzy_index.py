@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from collections import Counter
+from difflib import SequenceMatcher
+
+
+# 太短的輸入不做模糊比對：中文兩三個字差一個字通常就是另一個東西（中焙 / 中深焙、波旁 / 黃波旁），
+# SequenceMatcher 卻會給到 0.8
+MIN_FUZZY_LEN = 4
+# 輸入與候選 alias 的長度比（短 / 長）至少要這麼多，多一個或少一個字的修飾語不算拼錯
+MIN_LENGTH_RATIO = 0.8
+
+
+class NgramIndex:
+    """字元 n-gram 倒排索引，用來找「拼錯字」的 alias。
+
+    查詢時只會碰到和輸入共享至少一個 n-gram 的 alias（posting list），
+    依 Dice 係數挑出前幾名候選，再用 SequenceMatcher 算最終相似度，
+    不需要對每個 alias 都做一次編輯距離。
+    短於 min_length 的輸入、與候選長度差太多的配對一律不算，見 MIN_FUZZY_LEN / MIN_LENGTH_RATIO。
+    """
+
+    def __init__(
+        self,
+        entries: dict[str, str],
+        n: int = 2,
+        max_candidates: int = 8,
+        min_length: int = MIN_FUZZY_LEN,
+        min_length_ratio: float = MIN_LENGTH_RATIO,
+    ):
+        """
+        Args:
+            entries (dict[str, str]): canonical alias -> 正規化後的 key
+            n (int): n-gram 長度
+            max_candidates (int): 進入精算的候選數上限
+            min_length (int): 輸入至少要幾個字才做模糊比對
+            min_length_ratio (float): 輸入與候選 alias 的長度比下限
+        """
+        self.n = n
+        self.max_candidates = max_candidates
+        self.min_length = min_length
+        self.min_length_ratio = min_length_ratio
+        self._aliases = list(entries)
+        self._values = [entries[a] for a in self._aliases]
+        self._sizes: list[int] = []
+        self._postings: dict[str, list[int]] = {}
+        for i, alias in enumerate(self._aliases):
+            grams = self.grams(alias)
+            self._sizes.append(len(grams))
+            for g in grams:
+                self._postings.setdefault(g, []).append(i)
+
+    def __len__(self) -> int:
+        return len(self._aliases)
+
+    def grams(self, text: str) -> set[str]:
+        # 前後補邊界符號，讓很短的字串也有 n-gram 可用
+        padded = f"\x02{text}\x03"
+        n = self.n
+        return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+    def lookup(self, text: str, threshold: float) -> tuple[str, float] | None:
+        """找最像的 alias。
+
+        Args:
+            text (str): 已 canonical 化的輸入
+            threshold (float): 0~1 的相似度門檻
+
+        Returns:
+            tuple[str, float] | None: (正規化 key, 相似度)，沒有達門檻就回傳 None
+        """
+        if len(text) < self.min_length:
+            return None
+        query = self.grams(text)
+        shared: Counter[int] = Counter()
+        for g in query:
+            for i in self._postings.get(g, ()):
+                shared[i] += 1
+        if not shared:
+            return None
+
+        q_len = len(query)
+        candidates = sorted(
+            shared,
+            key=lambda i: 2 * shared[i] / (q_len + self._sizes[i]),
+            reverse=True,
+        )[: self.max_candidates]
+
+        best_i, best_score = None, 0.0
+        for i in candidates:
+            alias = self._aliases[i]
+            if min(len(text), len(alias)) / max(len(text), len(alias)) < self.min_length_ratio:
+                continue
+            score = SequenceMatcher(None, text, alias).ratio()
+            if score > best_score:
+                best_i, best_score = i, score
+        if best_i is None or best_score < threshold:
+            return None
+        return self._values[best_i], best_score
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import json
+import logging
+import shutil
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+from parse_product import parse_product
+from product_record import ProductRecord
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARSE_TIMEOUT = 10.0
+# 原始 HTML 超過這個大小就不 parse（正常的商品頁只有幾百 KB）；
+# BeautifulSoup 建樹的時間和記憶體跟整頁大小成正比，要在建樹之前擋下
+MAX_HTML_BYTES = 8 * 1024 * 1024
+QUARANTINE_REPORT = "report.jsonl"
+
+_warned_off_main_thread = False
+
+
+class ParseTimeout(Exception):
+    """單頁 parse 用掉的 CPU 時間超過上限"""
+
+
+class PageTooLarge(Exception):
+    """原始 HTML 大於 MAX_HTML_BYTES，不交給 parser"""
+
+
+@contextmanager
+def cpu_time_limit(seconds: float | None) -> Iterator[None]:
+    """在 with 區塊內限制目前 thread 的 CPU 時間，超過就丟 ParseTimeout。
+
+    量的是 time.thread_time()（這個 thread 自己的 CPU 時間），被排程、等 I/O 或同一個
+    process 裡的下載 thread 用掉的 CPU 都不算。ITIMER_PROF 只是用來叫醒檢查：它累計的是
+    整個 process 的 CPU，一定比這個 thread 的先到，到了就看還剩多少，沒超過就再設一次；
+    正則引擎跑到一半也會被中斷。
+    只能在主 thread 使用（signal handler 只會在主 thread 執行）：在其他 thread 呼叫時不做限制，
+    並記一次 warning。不支援的平台（沒有 ITIMER_PROF）或 seconds 為空時也不做限制。
+    """
+    global _warned_off_main_thread
+    if not seconds or not hasattr(signal, "ITIMER_PROF"):
+        yield
+        return
+    if threading.current_thread() is not threading.main_thread():
+        if not _warned_off_main_thread:
+            _warned_off_main_thread = True
+            logger.warning(
+                "cpu_time_limit(%gs) 在 thread %s 裡呼叫，不在主 thread，parse 不受 CPU 時間限制",
+                seconds,
+                threading.current_thread().name,
+            )
+        yield
+        return
+    deadline = time.thread_time() + seconds
+
+    def _check(signum, frame):
+        remaining = deadline - time.thread_time()
+        if remaining <= 0:
+            raise ParseTimeout()
+        # 太小的值會被 setitimer 捨入成 0（等於關掉計時器）
+        signal.setitimer(signal.ITIMER_PROF, max(remaining, 0.01))
+
+    previous = signal.signal(signal.SIGPROF, _check)
+    signal.setitimer(signal.ITIMER_PROF, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, previous)
+
+
+def parse_page_with_budget(
+    html_path: Path,
+    lex_yaml: Path,
+    fuzzy_threshold: float | None = None,
+    timeout: float | None = DEFAULT_PARSE_TIMEOUT,
+) -> ProductRecord:
+    """在 CPU 時間上限內 parse 一頁（parse worker process 執行的就是這個函式）
+
+    檔案大於 MAX_HTML_BYTES 時直接丟 PageTooLarge，不讀進來也不建 soup。
+    """
+    size = Path(html_path).stat().st_size
+    if size > MAX_HTML_BYTES:
+        raise PageTooLarge(f"{size} bytes > {MAX_HTML_BYTES}")
+    with cpu_time_limit(timeout):
+        return parse_product(
+            source="bargain",
+            html_path=Path(html_path),
+            lex_yaml_path=lex_yaml,
+            fuzzy_threshold=fuzzy_threshold,
+            as_record=True,
+        )
+
+
+def start_parse_pool(workers: int) -> ProcessPoolExecutor:
+    """建立 parse worker pool，並立刻把 worker process 都 fork 出來。
+
+    要在任何下載 thread 啟動之前呼叫：fork 時如果有其他 thread 正拿著 lock（logging、
+    requests 的連線池…），子 process 會繼承到一個永遠不會被釋放的 lock。
+    """
+    pool = ProcessPoolExecutor(max_workers=workers)
+    # fork 模式下第一次 submit 會一次開齊所有 worker
+    pool.submit(int).result()
+    return pool
+
+
+class Quarantine:
+    """把 parse 超時或出錯的頁面複製到隔離目錄，並在 report.jsonl 記一筆。
+
+    原本的 HTML 不會被移走（增量爬取還會沿用它），修好 parser 之後可以直接拿
+    隔離目錄當 --html-dir 重跑。
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.report_path = self.directory / QUARANTINE_REPORT
+        self.count = 0
+
+    def add(self, html_path: Path, reason: str, **detail) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        html_path = Path(html_path)
+        target = self.directory / html_path.name
+        shutil.copy2(html_path, target)
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "path": str(html_path),
+            "quarantined": str(target),
+            "reason": reason,
+            "size": html_path.stat().st_size,
+            **detail,
+        }
+        with self.report_path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.count += 1
+        return target
@@ -1,20 +1,30 @@
 from pathlib import Path
 from parsers import bargain
+from product_record import ProductRecord
 
 
-def parse_product(source: str,html_path: Path, lex_yaml_path:Path) -> dict:
+def parse_product(
+    source: str,
+    html_path: Path,
+    lex_yaml_path: Path,
+    fuzzy_threshold: float | None = None,
+    as_record: bool = False,
+) -> dict | ProductRecord:
     """
     Parse a product from a given HTML file and source.
 
     Args:
         html_path (Path): The path to the HTML file.
         source (str): The source of the product.
+        fuzzy_threshold (float | None): Enable fuzzy lexicon matching with this similarity threshold.
+        as_record (bool): Return a ProductRecord instead of a dict.
 
     Returns:
-        dict: The parsed product.
+        dict | ProductRecord: The parsed product.
     """
 
     if source == "bargain":
-        return bargain.parse_product_bargain(html_path, lex_yaml_path)
+        record = bargain.parse_product_bargain_record(html_path, lex_yaml_path, fuzzy_threshold=fuzzy_threshold)
+        return record if as_record else record.to_dict()
     else:
         raise ValueError(f"Unknown source: {source}")
\ No newline at end of file
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator
+
+
+class ParseProfiler:
+    """在整個 corpus 上 profile parser。
+
+    - cProfile（決定性）：所有頁面的函式統計累加在同一份 Profile，輸出排序過的表格
+    - 取樣：背景 thread 每 sample_interval 秒記錄一次 parse 中的 call stack，
+      輸出 flamegraph.pl / speedscope 可讀的 collapsed-stack 格式
+    - 每頁的耗時與檔案大小，列出最慢的頁面
+
+    兩者分開跑：page() 只開 cProfile，取樣要在之後用 sample_pass() 把同一批頁面再 parse 一次。
+    cProfile 的 hook 會把函式呼叫多的程式碼拖慢好幾倍，取樣 thread 也會跟 parse 搶 GIL，
+    同時開的話火焰圖和表格都會失真。
+    """
+
+    def __init__(self, sample_interval: float = 0.001):
+        self.sample_interval = sample_interval
+        self.profile = cProfile.Profile()
+        self.stacks: Counter[str] = Counter()
+        self.pages: list[tuple[float, int, str]] = []
+        self.sampled_pages: list[tuple[float, int, str]] = []
+        self._target: int | None = None
+        self._active = threading.Event()
+        self._stop = threading.Event()
+        self._sampler: threading.Thread | None = None
+
+    # ===== sampling =====
+    def _sample_loop(self) -> None:
+        while not self._stop.is_set():
+            if self._active.wait(0.05) and self._target is not None:
+                frame = sys._current_frames().get(self._target)
+                if frame is not None:
+                    self.stacks[self._collapse(frame)] += 1
+            time.sleep(self.sample_interval)
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            # co_qualname 是 3.11 才有的
+            name = getattr(code, "co_qualname", code.co_name)
+            names.append(f"{os.path.basename(code.co_filename)}:{name}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def start(self) -> None:
+        self._target = threading.get_ident()
+        self._sampler = threading.Thread(target=self._sample_loop, name="parse-sampler", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+    @contextmanager
+    def page(self, html_path: Path) -> Iterator[None]:
+        """包住單一頁面的 parse，只有這段時間會被 cProfile 記錄"""
+        start = time.perf_counter()
+        self.profile.enable()
+        try:
+            yield
+        finally:
+            self.profile.disable()
+            elapsed = time.perf_counter() - start
+            self.pages.append((elapsed, Path(html_path).stat().st_size, str(html_path)))
+
+    def sample_pass(self, parse: Callable[[Path], object]) -> None:
+        """cProfile 關著，把 page() 記過的頁面再 parse 一次並取樣 call stack
+
+        Args:
+            parse (Callable[[Path], object]): parse 單一頁面的函式；丟出的例外會被忽略
+                （第一輪已經處理過這些頁面）
+        """
+        if self._sampler is None:
+            self.start()
+        for _, size, path in self.pages:
+            start = time.perf_counter()
+            self._active.set()
+            try:
+                parse(Path(path))
+            except Exception:
+                pass
+            finally:
+                self._active.clear()
+            self.sampled_pages.append((time.perf_counter() - start, size, path))
+
+    # ===== reports =====
+    def write_reports(self, out_dir: Path, top: int = 30) -> dict[str, Path]:
+        """寫出 profile 報表
+
+        Args:
+            out_dir (Path): 輸出目錄
+            top (int): 表格 / 最慢頁面各列出幾筆
+
+        Returns:
+            dict[str, Path]: 報表名稱 -> 路徑
+        """
+        self.stop()
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        table = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=table)
+        stats.strip_dirs()
+        for key in ("cumulative", "tottime"):
+            table.write(f"===== sorted by {key} =====\n")
+            stats.sort_stats(key).print_stats(top)
+        table_path = out_dir / "profile.txt"
+        table_path.write_text(table.getvalue(), encoding="utf-8")
+
+        collapsed_path = out_dir / "profile.collapsed"
+        with collapsed_path.open("w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        # 有取樣那一輪就用它的耗時，沒有 cProfile 的額外負擔，比較接近實際
+        pages = self.sampled_pages or self.pages
+        timed_by = "sampling pass" if self.sampled_pages else "cProfile pass (includes profiler overhead)"
+        total = sum(p[0] for p in pages)
+        slow_path = out_dir / "slowest_pages.txt"
+        with slow_path.open("w", encoding="utf-8") as f:
+            f.write(f"pages: {len(pages)}  total: {total:.3f}s  timed by: {timed_by}\n")
+            f.write(f"{'seconds':>10} {'bytes':>10}  path\n")
+            for elapsed, size, path in sorted(pages, reverse=True)[:top]:
+                f.write(f"{elapsed:10.4f} {size:10d}  {path}\n")
+
+        return {"table": table_path, "collapsed": collapsed_path, "slowest": slow_path}
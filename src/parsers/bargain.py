@@ -3,7 +3,9 @@ import re
 import json
 from urllib.parse import urlparse
 from pathlib import Path
-from normalizer.coffee_lexicon import CoffeeLexicon
+from normalizer.coffee_lexicon import CoffeeLexicon, load_lexicon
+from html_io import read_html
+from product_record import ProductRecord, VariationRecord
 
 def extract_title(soup: BeautifulSoup) -> str:
     """提取 HTML 文件的標題。
@@ -67,14 +69,24 @@ def infer_bean_type(title: str | None, origin_text: str | None, region_text: str
     return "單品（Single Origin）"
 
 
+_PRODUCT_JSON_MARKER = "app.value("
+_PRODUCT_JSON_RE = re.compile(r"app\.value\(\s*'product'\s*,\s*JSON\.parse\('(.+?)'\)\s*\);", re.DOTALL)
+
+
 def extract_product_json(html_text) -> dict:
     """
     從整個商品頁 HTML 檔案中，把 app.value('product', JSON.parse('...')) 這段抓出來
     然後回傳成 Python dict
     """
-    # 用正則把 JSON 內文抓出來
-    pattern = r"app\.value\(\s*'product'\s*,\s*JSON\.parse\('(.+?)'\)\s*\);"
-    m = re.search(pattern, html_text, flags=re.DOTALL)
+    # 先用 str.find 找 app.value( 的位置，只在這些位置嘗試比對，
+    # 不讓 DOTALL 的 non-greedy 正則從整頁每個字元開始試
+    m = None
+    start = html_text.find(_PRODUCT_JSON_MARKER)
+    while start >= 0:
+        m = _PRODUCT_JSON_RE.match(html_text, start)
+        if m:
+            break
+        start = html_text.find(_PRODUCT_JSON_MARKER, start + 1)
     if not m:
         raise ValueError("找不到 product JSON 塊，結構可能改了")
 
@@ -117,6 +129,7 @@ def extract_product_info(product_data: dict) -> dict:
     - 對應的原價 price_original
     - 對應的 variation 規格文字 (ex: "200克 / 熟豆（無研磨）")
     - 是否有貨 in_stock
+    - 所有規格的明細 variations（每個規格一個 dict，順序同頁面）
     """
     variations = product_data.get("variations", [])
     if not variations:
@@ -126,6 +139,7 @@ def extract_product_info(product_data: dict) -> dict:
             "variation_desc": None,
             "in_stock": None,
             "weight_g": None,
+            "variations": [],
         }
 
     offer_list = []
@@ -142,6 +156,9 @@ def extract_product_info(product_data: dict) -> dict:
 
         # 3. 找出產品規格
         fields = v.get("fields", [])
+        labels = [f.get("name") for f in fields if f.get("name")] or [
+            txt for txt in ((v.get("fields_translations") or {}).get("zh-hant") or []) if txt
+        ]
         # 3.1 嘗試從 fields 裡面抓出重量（公克數），例如 [{"name": "200克"}, {"name": "熟豆（無研磨）"}] → 200
         weight_g = extract_weight_from_fields(fields)
         
@@ -172,9 +189,12 @@ def extract_product_info(product_data: dict) -> dict:
 
         offer_list.append({
             "price_final": price_final,
+            "price_sale": price_sale.get("dollars") if price_sale else None,
             "price_original": price_original,
             "weight_g": weight_g,
+            "quantity": qty,
             "in_stock": in_stock,
+            "label": " / ".join(labels) or None,
         })
 
     # 取最低價的那組
@@ -185,6 +205,7 @@ def extract_product_info(product_data: dict) -> dict:
         "price_original": best["price_original"],
         "weight_g": best["weight_g"],
         "in_stock": best["in_stock"],
+        "variations": offer_list,
     }
 
 
@@ -221,6 +242,9 @@ def extract_desc_from_full_html(html_text) -> str | None:
     return text
 
 
+# 商品描述最多處理這麼多字（正常的描述只有幾千字）
+MAX_DESC_CHARS = 20_000
+
 _DESC_KEYWORDS = [
     # 產地 / 產區
     "咖啡烘焙度",
@@ -350,7 +374,69 @@ def parse_kv_from_desc(text: str) -> dict:
             pending_key = None
     return result
 
-def normalize_product_desciprtion(desc_raw:dict, lex:CoffeeLexicon) -> dict:
+def format_provenance(provenance: dict[str, str]) -> str | None:
+    """把 {欄位: 來源} 轉成輸出用的字串，例如 "variety=fuzzy,country=fuzzy"。"""
+    if not provenance:
+        return None
+    return ",".join(f"{k}={v}" for k, v in provenance.items())
+
+
+def parse_provenance(text: str | None) -> dict[str, str]:
+    """format_provenance 的反向：把 "variety=fuzzy,country=title" 轉回 dict。"""
+    if not text:
+        return {}
+    return dict(part.split("=", 1) for part in text.split(",") if "=" in part)
+
+
+# 全文補值時各來源可以補哪些欄位：商品描述裡常有「dark chocolate」「honey」「natural sweetness」
+# 這類風味描述，烘焙度與處理法只從標題補
+FULLTEXT_FIELDS = {
+    "title": ("process", "roast", "variety", "country"),
+    "description": ("variety", "country"),
+}
+
+
+def fill_from_fulltext(
+    result: dict,
+    lex: CoffeeLexicon,
+    provenance: dict[str, str],
+    title: str | None = None,
+    description: str | None = None,
+) -> None:
+    """沒有「處理法：」這類標籤而留白的欄位，改從標題 / 商品描述全文裡找 lexicon alias 補上。
+
+    先看標題，還有缺的才掃描述；補上的欄位在 provenance 記成 title / description。
+    """
+    for source, text in (("title", title), ("description", description)):
+        missing = [f for f in FULLTEXT_FIELDS[source] if not result.get(f)]
+        if not missing or not text:
+            continue
+        found = lex.scan_text(text)
+        for field in missing:
+            keys = found.get(field)
+            if not keys:
+                continue
+            if field == "variety":
+                result[field] = keys
+            elif field == "country":
+                result[field] = ",".join(keys)
+            else:
+                result[field] = keys[0]
+            provenance[field] = source
+
+
+def normalize_product_desciprtion(
+    desc_raw:dict,
+    lex:CoffeeLexicon,
+    title:str|None=None,
+    description:str|None=None,
+) -> dict:
+    """把 *_raw 欄位正規化；有給 title / description 時，留白的欄位再從全文補（見 fill_from_fulltext）。
+
+    回傳的 provenance 記錄哪些欄位不是精準對到的（例如模糊比對、全文補值），沒有則為 None。
+    """
+    provenance: dict[str, str] = {}
+
     def _collect_countries(text: str | None) -> list[str]:
         """把可能含多個產國的文字逐一正規化並去重"""
         if not text:
@@ -363,6 +449,8 @@ def normalize_product_desciprtion(desc_raw:dict, lex:CoffeeLexicon) -> dict:
             if not part:
                 continue
             norm = lex.normalize_country(part)
+            if norm and lex.match_method("country", part) == "fuzzy":
+                provenance["country"] = "fuzzy"
             if not norm:
                 t = lex._canon(part)
                 for code, spec in lex.country.items():
@@ -380,12 +468,20 @@ def normalize_product_desciprtion(desc_raw:dict, lex:CoffeeLexicon) -> dict:
 
     norm_country = ",".join(countries) if countries else None
 
-    return {
+    result = {
         "process" : lex.normalize_process(desc_raw.get("process_raw")),
         "roast" : lex.normalize_roast(desc_raw.get("roast_raw")),
         "variety" : lex.normalize_variety(desc_raw.get("variety_raw")),
         "country": norm_country,
     }
+    for field in ("process", "roast", "variety"):
+        if result[field] and lex.match_method(field, desc_raw.get(f"{field}_raw")) == "fuzzy":
+            provenance[field] = "fuzzy"
+    fill_from_fulltext(result, lex, provenance, title, description)
+    # 固定欄位順序，輸出比較好讀
+    ordered = {k: provenance[k] for k in ("process", "roast", "variety", "country") if k in provenance}
+    result["provenance"] = format_provenance(ordered)
+    return result
 
 
 def _clean_origin_value(text: str | None) -> str | None:
@@ -415,8 +511,11 @@ def parse_product_description(html_text) -> dict:
         - origin_raw: 產地。
         - region_raw: 產區。
         - farm_raw: 農場。
+        - _description: 商品描述全文（給全文補值用，不是輸出欄位）。
     """
     description = extract_desc_from_full_html(html_text)
+    # 找不到描述區塊時會退回整頁文字；過長的部分不會有規格，直接截掉，避免描述正則跑在超大文字上
+    description = description[:MAX_DESC_CHARS]
 
     kv = parse_kv_from_desc(description)
 
@@ -452,6 +551,7 @@ def parse_product_description(html_text) -> dict:
             "Producer",
             "producer",
         ),
+        "_description": description,
     }
 
     return result
@@ -463,16 +563,27 @@ def parse_product_description(html_text) -> dict:
 
 
 
-def parse_product_bargain(html_path: Path, lex_yaml_path: Path) -> dict:
+def parse_product_bargain(html_path: Path, lex_yaml_path: Path, fuzzy_threshold: float | None = None) -> dict:
     """
     對單一商品 HTML 檔進行完整解析，回傳 dict。
     包含：
     - title
     - price
     - description
+
+    fuzzy_threshold 有給時，lexicon 對不到的值會再做模糊比對，並記在 norm_provenance。
+    """
+    return parse_product_bargain_record(html_path, lex_yaml_path, fuzzy_threshold).to_dict()
+
+
+def parse_product_bargain_record(
+    html_path: Path, lex_yaml_path: Path, fuzzy_threshold: float | None = None
+) -> ProductRecord:
+    """
+    與 parse_product_bargain 相同，但回傳 ProductRecord（pipeline 內部使用）。
     """
     # 1. 讀取 HTML
-    html_text = html_path.read_text(encoding="utf-8")
+    html_text = read_html(html_path)
     # 2. 解析 HTML
     soup = BeautifulSoup(html_text, "html.parser")
 
@@ -489,22 +600,40 @@ def parse_product_bargain(html_path: Path, lex_yaml_path: Path) -> dict:
     #6. 抽出 product_description_raw
     desc_raw = parse_product_description(html_text)
     origin_raw_full = desc_raw.pop("_origin_raw_full", None)
+    description = desc_raw.pop("_description", None)
     # 3.1 解析 bean type
     bean_type = infer_bean_type(title, origin_raw_full, desc_raw.get("region_raw"))
 
     #6.1 做正規化
 
-    lex = CoffeeLexicon(lex_yaml_path)
-    desc_norm = normalize_product_desciprtion(desc_raw, lex)
+    lex = load_lexicon(lex_yaml_path, fuzzy_threshold=fuzzy_threshold)
+    desc_norm = normalize_product_desciprtion(desc_raw, lex, title=title, description=description)
+
+    variations = tuple(
+        VariationRecord(
+            external_id=external_id,
+            variation_index=i,
+            label=offer["label"],
+            price=offer["price_final"],
+            price_sale=offer["price_sale"],
+            price_original=offer["price_original"],
+            weight_g=offer["weight_g"],
+            price_per_100g=round(offer["price_final"] / offer["weight_g"] * 100, 2) if offer["weight_g"] else None,
+            quantity=offer["quantity"],
+            in_stock=offer["in_stock"],
+        )
+        for i, offer in enumerate(product_info["variations"])
+    )
 
-    return {
-        "external_id": external_id,
-        "title": title,
-        "bean_type": bean_type,
-        "price": product_info['price_raw'],
-        "price_original": product_info['price_original'],
-        "weight_g": product_info['weight_g'],
-        "in_stock": product_info['in_stock'],
+    return ProductRecord(
+        external_id=external_id,
+        title=title,
+        bean_type=bean_type,
+        price=product_info['price_raw'],
+        price_original=product_info['price_original'],
+        weight_g=product_info['weight_g'],
+        in_stock=product_info['in_stock'],
         **desc_raw,
-        **{f"norm_{k}":v for k, v in desc_norm.items()}
-    }
+        **{f"norm_{k}":v for k, v in desc_norm.items()},
+        variations=variations,
+    )
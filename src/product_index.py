@@ -0,0 +1,410 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import os
+import pickle
+import time
+from array import array
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+
+INDEX_VERSION = 2
+INDEX_FILE = "product_index.pkl"
+
+# 欄位 -> 多值欄位的分隔符（None 表示單一值）
+TERM_FIELDS = {
+    "norm_country": ",",
+    "norm_process": None,
+    "norm_roast": None,
+    "norm_variety": ",",
+    "bean_type": None,
+}
+NUMERIC_FIELDS = ("price", "price_per_100g")
+
+
+def _iter_csv_records(f) -> Iterator[tuple[int, bytes]]:
+    """以 binary 逐筆讀 CSV，回傳 (byte offset, 原始 bytes)；引號內換行的欄位會併成同一筆"""
+    offset = f.tell()
+    buf = b""
+    start = offset
+    for line in f:
+        if not buf:
+            start = offset
+        buf += line
+        offset += len(line)
+        if buf.count(b'"') % 2 == 0:
+            yield start, buf
+            buf = b""
+    if buf:
+        yield start, buf
+
+
+def _parse_row(header: list[str], raw: bytes) -> dict:
+    values = next(csv.reader(io.StringIO(raw.decode("utf-8"))), [])
+    return dict(zip(header, values))
+
+
+def _term_labels(term: str) -> set[str]:
+    """一個值可以被查到的寫法（小寫）：完整的值，以及 "中文（English）" 的中文、英文部分"""
+    labels = {term.lower()}
+    if "（" in term and term.endswith("）"):
+        zh, en = term[:-1].split("（", 1)
+        labels.update((zh.strip().lower(), en.strip().lower()))
+    return labels
+
+
+def _to_array(typecode: str, values: np.ndarray) -> array:
+    out = array(typecode)
+    out.frombytes(values.tobytes())
+    return out
+
+
+def _to_float(value: str | None) -> float:
+    try:
+        return float(value) if value not in (None, "") else np.nan
+    except ValueError:
+        return np.nan
+
+
+def _terms(value: str | None, sep: str | None) -> list[str]:
+    if not value:
+        return []
+    parts = value.split(sep) if sep else [value]
+    return [p.strip() for p in parts if p.strip()]
+
+
+class ProductIndex:
+    """商品輸出 CSV 的持久化倒排索引。
+
+    - 類別欄位（產國 / 處理法 / 焙度 / 品種 / bean_type）：值 -> doc id posting list
+    - 價格、每 100g 價格：排序後的欄位，用二分搜尋做範圍查詢
+    - 每個 doc 只記 (來源檔, byte offset, 長度)，查到之後才 seek 回去讀那一列
+
+    新的 crawl 輸出用 update() 加入；同一個 external_id 以最後加入的為準。
+    來源檔被覆寫時，它的舊 doc 直接移除並重新編號（不留 tombstone），
+    所以索引大小只跟目前各來源檔的內容有關，不會隨執行次數變大。
+    """
+
+    def __init__(self, index_dir: Path):
+        self.index_dir = Path(index_dir)
+        self.sources: list[dict] = []
+        self.docs = array("q")          # 每個 doc 三個值：source id, offset, length
+        self.in_stock = bytearray()
+        self.deleted = bytearray()      # 被同一個 external_id 較新的 doc 取代
+        # external_id -> 所有來源裡這個 id 的 doc（依加入順序），最後一個有效
+        self.by_external_id: dict[str, list[int]] = {}
+        self.postings: dict[str, dict[str, array]] = {f: {} for f in TERM_FIELDS}
+        self.numeric: dict[str, array] = {f: array("d") for f in NUMERIC_FIELDS}
+        self._sorted: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+
+    # ===== 持久化 =====
+    @property
+    def path(self) -> Path:
+        return self.index_dir / INDEX_FILE
+
+    @classmethod
+    def load(cls, index_dir: Path) -> "ProductIndex":
+        idx = cls(index_dir)
+        if not idx.path.exists():
+            return idx
+        with idx.path.open("rb") as f:
+            state = pickle.load(f)
+        if state.get("version") != INDEX_VERSION:
+            raise ValueError(f"索引版本不符（{state.get('version')}），請刪除 {idx.path} 後重建")
+        for key in ("sources", "docs", "in_stock", "deleted", "by_external_id", "postings", "numeric", "_sorted"):
+            setattr(idx, key, state[key])
+        return idx
+
+    def save(self) -> None:
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self._sort_numeric()
+        state = {
+            "version": INDEX_VERSION,
+            "sources": self.sources,
+            "docs": self.docs,
+            "in_stock": self.in_stock,
+            "deleted": self.deleted,
+            "by_external_id": self.by_external_id,
+            "postings": self.postings,
+            "numeric": self.numeric,
+            "_sorted": self._sorted,
+        }
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+
+    def _sort_numeric(self) -> None:
+        for field, col in self.numeric.items():
+            values = np.frombuffer(col, dtype=np.float64) if len(col) else np.empty(0)
+            order = np.argsort(values, kind="stable")
+            self._sorted[field] = (values[order].copy(), order.astype(np.int64))
+
+    # ===== 建索引 =====
+    def update(self, csv_path: Path) -> int:
+        """把一份 crawl 輸出加進索引；檔案沒變就略過。回傳新加入的筆數"""
+        csv_path = Path(csv_path).resolve()
+        st = csv_path.stat()
+        for sid, src in enumerate(self.sources):
+            if src["path"] == str(csv_path):
+                if src["size"] == st.st_size and src["mtime_ns"] == st.st_mtime_ns:
+                    return 0
+                # 檔案被覆寫：舊的 doc 全部作廢，重新索引
+                self._drop_source(sid)
+                src.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+                break
+        else:
+            sid = len(self.sources)
+            self.sources.append({"path": str(csv_path), "size": st.st_size, "mtime_ns": st.st_mtime_ns, "header": None})
+
+        added = 0
+        with csv_path.open("rb") as f:
+            header_line = f.readline()
+            header = next(csv.reader([header_line.decode("utf-8-sig")]))
+            self.sources[sid]["header"] = header
+            for offset, raw in _iter_csv_records(f):
+                if not raw.strip():
+                    continue
+                self._add_doc(sid, offset, raw, _parse_row(header, raw))
+                added += 1
+        # 新加入的 doc 不在排序好的數值欄位裡，查詢時重新排序
+        self._sorted.clear()
+        return added
+
+    def stale_sources(self) -> list[str]:
+        """索引建立之後被覆寫或刪除的來源檔（byte offset 已經對不上）"""
+        stale = []
+        for src in self.sources:
+            if src["size"] < 0:
+                continue  # 已經 remove 過
+            try:
+                st = os.stat(src["path"])
+            except FileNotFoundError:
+                stale.append(src["path"])
+                continue
+            if src["size"] != st.st_size or src["mtime_ns"] != st.st_mtime_ns:
+                stale.append(src["path"])
+        return stale
+
+    def remove(self, csv_path: Path) -> None:
+        """來源檔已經不在了：它的 doc 全部作廢（sid 保留，之後同路徑的檔案會重新索引）"""
+        for sid, src in enumerate(self.sources):
+            if src["path"] == str(csv_path):
+                self._drop_source(sid)
+                src.update(size=-1, mtime_ns=-1)
+
+    def _drop_source(self, sid: int) -> None:
+        """移除一個來源檔的所有 doc，其餘 doc 重新編號，再重新決定每個 external_id 以哪一筆為準。
+
+        被這個來源取代過的其他來源的 doc 會因此恢復有效。
+        """
+        triples = np.frombuffer(self.docs, dtype=np.int64).reshape(-1, 3)
+        keep = triples[:, 0] != sid
+        if keep.all():
+            return
+        remap = np.cumsum(keep) - 1
+
+        self.docs = _to_array("q", triples[keep])
+        self.in_stock = bytearray(np.frombuffer(self.in_stock, dtype=np.uint8)[keep].tobytes())
+        for field, col in self.numeric.items():
+            self.numeric[field] = _to_array("d", np.frombuffer(col, dtype=np.float64)[keep])
+        for terms in self.postings.values():
+            for term, plist in list(terms.items()):
+                ids = np.frombuffer(plist, dtype=np.uint32)
+                ids = remap[ids[keep[ids]]]
+                if len(ids):
+                    terms[term] = _to_array("I", ids.astype(np.uint32))
+                else:
+                    del terms[term]
+
+        self.deleted = bytearray(int(keep.sum()))
+        for eid, ids in list(self.by_external_id.items()):
+            ids = [int(remap[doc]) for doc in ids if keep[doc]]
+            if not ids:
+                del self.by_external_id[eid]
+                continue
+            self.by_external_id[eid] = ids
+            for doc in ids[:-1]:
+                self.deleted[doc] = 1
+        self._sorted.clear()
+
+    def _add_doc(self, sid: int, offset: int, raw: bytes, row: dict) -> None:
+        doc = len(self.deleted)
+        self.docs.extend((sid, offset, len(raw)))
+        self.deleted.append(0)
+
+        eid = row.get("external_id")
+        if eid:
+            ids = self.by_external_id.setdefault(eid, [])
+            if ids:
+                self.deleted[ids[-1]] = 1
+            ids.append(doc)
+
+        for field, sep in TERM_FIELDS.items():
+            for term in _terms(row.get(field), sep):
+                self.postings[field].setdefault(term, array("I")).append(doc)
+
+        price = _to_float(row.get("price"))
+        weight = _to_float(row.get("weight_g"))
+        self.numeric["price"].append(price)
+        self.numeric["price_per_100g"].append(price / weight * 100 if weight and weight > 0 else np.nan)
+        self.in_stock.append(1 if row.get("in_stock") == "True" else 0)
+
+    # ===== 查詢 =====
+    def vocabulary(self, field: str) -> list[str]:
+        return sorted(self.postings[field])
+
+    def _term_docs(self, field: str, queries: list[str]) -> np.ndarray:
+        """同一欄位內 OR：查詢字串對到的所有值的 posting 聯集。
+
+        不分大小寫、整個字完全相同才算，可以用完整的值、中文或英文名稱
+        （"中深焙（Medium-dark）"、"中深焙"、"medium-dark"），"深焙" 不會對到 "中深焙"。
+        """
+        wanted = {q.strip().lower() for q in queries}
+        hits = [
+            np.frombuffer(plist, dtype=np.uint32)
+            for term, plist in self.postings[field].items()
+            if wanted & _term_labels(term)
+        ]
+        if not hits:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(hits)).astype(np.int64)
+
+    def _range_docs(self, field: str, lo: float | None, hi: float | None) -> np.ndarray:
+        values, order = self._sorted[field]
+        left = 0 if lo is None else np.searchsorted(values, lo, side="left")
+        # NaN 排在最後，沒有上限時也要排除
+        right = np.searchsorted(values, np.inf if hi is None else hi, side="right")
+        return np.sort(order[left:right])
+
+    def search(
+        self,
+        terms: dict[str, list[str]] | None = None,
+        ranges: dict[str, tuple[float | None, float | None]] | None = None,
+        in_stock: bool | None = None,
+    ) -> np.ndarray:
+        """欄位之間 AND、欄位內 OR，回傳排序過的 doc id"""
+        n = len(self.deleted)
+        result = None
+        for field, queries in (terms or {}).items():
+            if queries:
+                docs = self._term_docs(field, queries)
+                result = docs if result is None else np.intersect1d(result, docs, assume_unique=True)
+        for field, (lo, hi) in (ranges or {}).items():
+            if lo is not None or hi is not None:
+                if field not in self._sorted:
+                    self._sort_numeric()
+                docs = self._range_docs(field, lo, hi)
+                result = docs if result is None else np.intersect1d(result, docs, assume_unique=True)
+        if result is None:
+            result = np.arange(n, dtype=np.int64)
+
+        mask = np.frombuffer(self.deleted, dtype=np.uint8)[result] == 0
+        if in_stock is not None:
+            stock = np.frombuffer(self.in_stock, dtype=np.uint8)[result] == 1
+            mask &= stock if in_stock else ~stock
+        return result[mask]
+
+    def fetch(self, docs) -> Iterator[dict]:
+        """依 doc id 回到原始檔案讀出那幾列；來源檔在索引之後被改過就丟 ValueError"""
+        handles = {}
+        try:
+            for doc in docs:
+                sid, offset, length = self.docs[doc * 3: doc * 3 + 3]
+                src = self.sources[sid]
+                f = handles.get(sid)
+                if f is None:
+                    f = open(src["path"], "rb")
+                    handles[sid] = f
+                    st = os.fstat(f.fileno())
+                    if src["size"] != st.st_size or src["mtime_ns"] != st.st_mtime_ns:
+                        raise ValueError(f"{src['path']} 在索引之後被改過，請先重新 update")
+                f.seek(offset)
+                yield _parse_row(src["header"], f.read(length))
+        finally:
+            for f in handles.values():
+                f.close()
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="crawl 輸出的商品倒排索引：建立 / 更新 / 查詢")
+    parser.add_argument("--index-dir", type=Path, default=None, help="索引目錄（預設 data/index）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("update", help="把 CSV 加進索引（沒變的檔案會略過）")
+    build.add_argument("csv", type=Path, nargs="+")
+
+    query = sub.add_parser("query", help="查詢，例：--country 巴拿馬 --variety geisha --process 水洗 --in-stock")
+    query.add_argument("--country", action="append", default=[])
+    query.add_argument("--process", action="append", default=[])
+    query.add_argument("--roast", action="append", default=[])
+    query.add_argument("--variety", action="append", default=[])
+    query.add_argument("--bean-type", action="append", default=[])
+    query.add_argument("--min-price", type=float, default=None)
+    query.add_argument("--max-price", type=float, default=None)
+    query.add_argument("--min-price-per-100g", type=float, default=None)
+    query.add_argument("--max-price-per-100g", type=float, default=None)
+    query.add_argument("--in-stock", action="store_true", help="只列有庫存的")
+    query.add_argument("--limit", type=int, default=50)
+    query.add_argument("--json", action="store_true", help="以 JSON lines 輸出完整資料")
+    return parser
+
+
+def main() -> None:
+    args = build_arg_parser().parse_args()
+    project_root = Path(__file__).resolve().parents[1]
+    index_dir = args.index_dir or (project_root / "data" / "index")
+    idx = ProductIndex.load(index_dir)
+
+    if args.command == "update":
+        for path in args.csv:
+            n = idx.update(path)
+            print(f"🗂️  {path}: +{n} 筆" if n else f"⏭️  {path}: 沒有變動")
+        idx.save()
+        print(f"💾 Saved index to {idx.path}")
+        return
+
+    stale = idx.stale_sources()
+    if stale:
+        # run_bargain_once 會覆寫輸出檔，舊的 offset 不能再用；存在的檔案直接重新索引
+        for path in stale:
+            if Path(path).exists():
+                print(f"🔄 {path} 已變更，重新索引：+{idx.update(path)} 筆")
+            else:
+                idx.remove(path)
+                print(f"⚠️ {path} 已不存在，從索引移除")
+        idx.save()
+
+    t0 = time.perf_counter()
+    docs = idx.search(
+        terms={
+            "norm_country": args.country,
+            "norm_process": args.process,
+            "norm_roast": args.roast,
+            "norm_variety": args.variety,
+            "bean_type": args.bean_type,
+        },
+        ranges={
+            "price": (args.min_price, args.max_price),
+            "price_per_100g": (args.min_price_per_100g, args.max_price_per_100g),
+        },
+        in_stock=True if args.in_stock else None,
+    )
+    elapsed = (time.perf_counter() - t0) * 1000
+
+    for row in idx.fetch(docs[: args.limit]):
+        if args.json:
+            print(json.dumps(row, ensure_ascii=False))
+        else:
+            print(f"{row.get('price', ''):>8}  {row.get('weight_g', ''):>5}g  {row.get('external_id', '')}  {row.get('title', '')}")
+    print(f"🔎 {len(docs)} 筆符合（{elapsed:.2f} ms）")
+
+
+if __name__ == "__main__":
+    main()
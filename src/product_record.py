@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import sys
+from dataclasses import dataclass, field, fields
+from typing import ClassVar, Iterable
+
+
+def _intern(value):
+    # 類別型的值（bean_type、norm_*）在整個 catalog 裡重複很多次，共用同一個字串物件
+    return sys.intern(value) if type(value) is str else value
+
+
+@dataclass(slots=True)
+class VariationRecord:
+    """商品的一個規格（例如 200克 / 熟豆（無研磨）），以 external_id 對回 ProductRecord。"""
+
+    external_id: str | None = None
+    variation_index: int | None = None
+    label: str | None = None
+    price: float | None = None
+    price_sale: float | None = None
+    price_original: float | None = None
+    weight_g: int | None = None
+    price_per_100g: float | None = None
+    quantity: int | None = None
+    in_stock: bool | None = None
+
+    FIELDS: ClassVar[tuple[str, ...]]
+
+    def __post_init__(self):
+        self.label = _intern(self.label)
+
+    def as_row(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.FIELDS)
+
+
+@dataclass(slots=True)
+class ProductRecord:
+    """一筆解析後的商品，欄位固定，順序即輸出欄位順序。
+
+    比起每筆一個 dict，slots 沒有每筆的 __dict__ / key hash table，
+    pickle 到其他 process 也只需要傳欄位值。
+    """
+
+    external_id: str | None = None
+    title: str | None = None
+    bean_type: str | None = None
+    price: float | None = None
+    price_original: float | None = None
+    weight_g: int | None = None
+    in_stock: bool | None = None
+    process_raw: str | None = None
+    roast_raw: str | None = None
+    variety_raw: str | None = None
+    origin_raw: str | None = None
+    region_raw: str | None = None
+    farm_raw: str | None = None
+    norm_process: str | None = None
+    norm_roast: str | None = None
+    norm_variety: tuple[str, ...] = ()
+    norm_country: str | None = None
+    norm_provenance: str | None = None
+    # 各規格明細，另外寫成 variations 輸出，不是商品表的欄位（不在 FIELDS 裡）
+    variations: tuple[VariationRecord, ...] = field(default=(), repr=False, metadata={"output": False})
+
+    FIELDS: ClassVar[tuple[str, ...]]
+    CATEGORICAL: ClassVar[tuple[str, ...]] = (
+        "bean_type", "norm_process", "norm_roast", "norm_country", "norm_provenance",
+    )
+
+    def __post_init__(self):
+        for name in self.CATEGORICAL:
+            setattr(self, name, _intern(getattr(self, name)))
+        self.norm_variety = tuple(_intern(v) for v in (self.norm_variety or ()))
+        self.variations = tuple(self.variations or ())
+
+    def __reduce__(self):
+        # 只傳欄位值；在接收端重新建構時也會重新 intern
+        return (ProductRecord, (*(getattr(self, name) for name in self.FIELDS), self.variations))
+
+    def to_dict(self) -> dict:
+        """轉回 parse_product 一直以來回傳的 dict 形式（norm_variety 為 list）"""
+        d = {name: getattr(self, name) for name in self.FIELDS}
+        d["norm_variety"] = list(self.norm_variety)
+        return d
+
+    def as_row(self) -> tuple:
+        """依 FIELDS 順序回傳值，給 csv.writer 直接寫；norm_variety 攤平成 "a, b" """
+        return tuple(
+            ", ".join(self.norm_variety) if name == "norm_variety" else getattr(self, name)
+            for name in self.FIELDS
+        )
+
+    @classmethod
+    def to_columns(cls, records: Iterable["ProductRecord"]) -> dict[str, list]:
+        """轉成欄式資料（欄名 -> list），可直接丟給 pandas.DataFrame 或其他欄式 writer"""
+        cols: dict[str, list] = {name: [] for name in cls.FIELDS}
+        appenders = [(name, cols[name].append) for name in cls.FIELDS]
+        for rec in records:
+            for name, append in appenders:
+                append(getattr(rec, name))
+        return cols
+
+
+VariationRecord.FIELDS = tuple(f.name for f in fields(VariationRecord))
+ProductRecord.FIELDS = tuple(f.name for f in fields(ProductRecord) if f.metadata.get("output", True))
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from normalizer.coffee_lexicon import CoffeeLexicon, load_lexicon
+from parsers.bargain import format_provenance, normalize_product_desciprtion, parse_provenance
+from writers import write_csv, write_jsonl
+
+
+RAW_FIELDS = ("process_raw", "roast_raw", "variety_raw", "origin_raw", "region_raw")
+NORM_FIELDS = ("process", "roast", "variety", "country")
+DEFAULT_BATCH_SIZE = 5000
+
+
+def _iter_rows(path: Path) -> Iterator[dict]:
+    """依副檔名串流讀出既有的輸出（.jsonl 或 CSV），一次一筆"""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.suffix == ".jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def _raw_key(row: dict) -> tuple:
+    # CSV 的空欄位是 ""，與 None 視為同一個值
+    return tuple(row.get(name) or None for name in RAW_FIELDS)
+
+
+def _same(old, new) -> bool:
+    if isinstance(new, list):
+        return old == new or old == ", ".join(new)
+    return (old or None) == new
+
+
+def renormalize_rows(
+    rows: Iterable[dict],
+    lex: CoffeeLexicon,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    stats: dict | None = None,
+) -> Iterator[dict]:
+    """只重算 norm_* 欄位，其他欄位（包含 cluster_id 這類後加的欄位）原樣保留。
+
+    每批先把 raw 欄位去重，同一組 raw 值只正規化一次；只有 raw 欄位沒對到的列
+    才再加上標題做全文補值。商品描述沒有存在輸出裡，之前從描述補上的值若這次
+    沒有其他來源，就保留原本的值。
+
+    Args:
+        rows (Iterable[dict]): 既有輸出的每一列
+        lex (CoffeeLexicon): 新的 lexicon
+        batch_size (int): 每批處理幾列
+        stats (dict, optional): 傳入的話會累加 rows / unique / changed
+
+    Yields:
+        dict: 更新 norm_* 之後的列
+    """
+    stats = stats if stats is not None else {}
+    for key in ("rows", "unique", "changed"):
+        stats.setdefault(key, 0)
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        results: dict[tuple, dict] = {}
+        for row in batch:
+            key = _raw_key(row)
+            if key not in results:
+                results[key] = normalize_product_desciprtion(dict(zip(RAW_FIELDS, key)), lex)
+        with_title: dict[tuple, dict] = {}
+        for row in batch:
+            key = _raw_key(row)
+            norm = results[key]
+            if row.get("title") and not all(norm[f] for f in NORM_FIELDS):
+                title_key = (key, row["title"])
+                if title_key not in with_title:
+                    with_title[title_key] = normalize_product_desciprtion(
+                        dict(zip(RAW_FIELDS, key)), lex, title=row["title"]
+                    )
+                norm = with_title[title_key]
+            yield _apply(row, norm, stats)
+        stats["rows"] += len(batch)
+        stats["unique"] += len(results) + len(with_title)
+
+
+def _apply(row: dict, norm: dict, stats: dict) -> dict:
+    provenance = parse_provenance(norm["provenance"])
+    old_provenance = parse_provenance(row.get("norm_provenance"))
+    new_values = {}
+    for field in NORM_FIELDS:
+        value = norm[field]
+        if not value and old_provenance.get(field) == "description":
+            value = row.get(f"norm_{field}")
+            provenance[field] = "description"
+        new_values[f"norm_{field}"] = value
+    ordered = {k: provenance[k] for k in NORM_FIELDS if k in provenance}
+    new_values["norm_provenance"] = format_provenance(ordered)
+
+    if any(not _same(row.get(name), value) for name, value in new_values.items()):
+        stats["changed"] += 1
+    row.update(new_values)
+    return row
+
+
+def renormalize_file(
+    input_path: Path,
+    lex_yaml: Path,
+    output_path: Path | None = None,
+    fuzzy_threshold: float | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> dict:
+    """用目前的 lexicon 重算既有輸出（CSV 或 JSONL）的 norm_* 欄位，不重新 parse HTML。
+
+    Args:
+        input_path (Path): run_bargain_once 的輸出
+        lex_yaml (Path): lexicon YAML
+        output_path (Path, optional): 寫到哪裡（預設覆寫 input_path；寫完才取代）
+        fuzzy_threshold (float | None): 模糊比對門檻
+        batch_size (int): 每批處理幾列
+
+    Returns:
+        dict: rows / unique / changed / seconds
+    """
+    input_path = Path(input_path)
+    output_path = Path(output_path) if output_path else input_path
+    lex = load_lexicon(lex_yaml, fuzzy_threshold=fuzzy_threshold)
+
+    stats: dict = {}
+    t0 = time.perf_counter()
+    rows = renormalize_rows(_iter_rows(input_path), lex, batch_size, stats)
+    writer = write_jsonl if input_path.suffix == ".jsonl" else write_csv
+    writer(rows, output_path)
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    return stats
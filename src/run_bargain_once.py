@@ -2,25 +2,32 @@ from __future__ import annotations
 
 import argparse
 import json
-import re
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+from itertools import islice
 from pathlib import Path
-from typing import Iterable, List
+from typing import Iterable, Iterator
 
-import pandas as pd
-
-from fetch_manifest import fetch_all_pages
-from parse_product import parse_product
+from adaptive_limiter import DEFAULT_MAX_LIMIT
+from crawl_state import CrawlState
+from dedup import add_cluster_ids_csv, add_cluster_ids_jsonl
+from fetch_manifest import iter_fetch_urls, iter_product_pages, iter_product_urls_from_sitemap
+from html_io import read_title
+from parse_guard import DEFAULT_PARSE_TIMEOUT, ParseTimeout, Quarantine, parse_page_with_budget, start_parse_pool
+from parse_profiler import ParseProfiler
+from renormalize import renormalize_file
+from product_record import ProductRecord
+from work_queue import WorkQueue, default_worker_id
+from writers import append_csv, tee_variations_csv, write_csv, write_jsonl
 
 
 DEFAULT_SITEMAP = "https://www.bargain-cafe.com/sitemap.xml"
 DEFAULT_BRAND = "bargain"
 SKIP_KEYWORDS_DEFAULT = ("組合", "濾掛", "濾紙", "濾杯", "+", "|")
-
-TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
-OG_TITLE_RE = re.compile(
-    r'<meta[^>]+property=["\']og:title["\'][^>]+content=["\'](.*?)["\']',
-    re.IGNORECASE | re.DOTALL,
-)
+OUTPUT_WRITERS = {"csv": write_csv, "jsonl": write_jsonl}
 
 
 def build_arg_parser() -> argparse.ArgumentParser:
@@ -65,31 +72,138 @@ def build_arg_parser() -> argparse.ArgumentParser:
         default=",".join(SKIP_KEYWORDS_DEFAULT),
         help="若商品標題含此清單中的任一關鍵字就略過，使用逗號分隔（預設：組合,濾掛）",
     )
+    parser.add_argument(
+        "--fetch-workers",
+        type=int,
+        default=DEFAULT_MAX_LIMIT,
+        help=(
+            "下載商品頁的 thread 數，也是每個 host 併發數的硬上限；實際併發由 adaptive limiter "
+            f"依回應狀況在這之下調整（預設 {DEFAULT_MAX_LIMIT}，與 limiter 的上限相同）"
+        ),
+    )
+    parser.add_argument(
+        "--log-level",
+        default="WARNING",
+        help="logging 等級，設成 INFO 可看到 limiter 的調整紀錄（預設 WARNING）",
+    )
+    parser.add_argument(
+        "--fuzzy-threshold",
+        type=float,
+        default=None,
+        help="lexicon 對不到時改用模糊比對，相似度門檻 0~1（例如 0.8；預設不開）",
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        nargs="?",
+        const=Path("profile"),
+        default=None,
+        help="搭配 --use-existing，profile 每頁的 parse 並把報表寫到此目錄（預設 ./profile）；"
+        "cProfile 與 call stack 取樣分兩輪 parse，彼此不干擾",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=0,
+        help="用幾個 process 平行 parse（預設 0：在主 process 逐頁 parse）",
+    )
+    parser.add_argument(
+        "--parse-timeout",
+        type=float,
+        default=DEFAULT_PARSE_TIMEOUT,
+        help=f"每頁 parse 的 CPU 時間上限（秒），超過就略過並隔離該頁；0 表示不限制（預設 {DEFAULT_PARSE_TIMEOUT:g}）",
+    )
+    parser.add_argument(
+        "--quarantine-dir",
+        type=Path,
+        default=None,
+        help="parse 超時或出錯的頁面複製到這裡，並記在 report.jsonl（預設 data/quarantine）",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="輸出後用 MinHash/LSH 找近似重複商品，加上 cluster_id 欄位",
+    )
+    parser.add_argument(
+        "--state",
+        type=Path,
+        default=None,
+        help="增量爬取紀錄（SQLite 檔）：只重抓新商品與 sitemap lastmod 有更新的頁面，其餘沿用已存的 HTML",
+    )
+    parser.add_argument(
+        "--stale-sample",
+        type=int,
+        default=0,
+        help="搭配 --state：每次額外重抓幾個最久沒抓、但 lastmod 沒變的頁面（預設 0）",
+    )
+    parser.add_argument(
+        "--queue",
+        type=Path,
+        default=None,
+        help="共用工作佇列（SQLite 檔）。搭配 --enqueue 把 sitemap 的商品放進佇列；否則以 worker 身分領工作",
+    )
+    parser.add_argument(
+        "--enqueue",
+        action="store_true",
+        help="搭配 --queue：只抓 sitemap 並把商品網址放進佇列",
+    )
+    parser.add_argument(
+        "--worker-id",
+        default=None,
+        help="worker 名稱（預設 hostname-pid），也用在預設輸出檔名",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=20,
+        help="worker 每次從佇列領幾個商品（預設 20）",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        type=float,
+        default=600,
+        help="領到的工作多久內沒完成就排回佇列（預設 600 秒）",
+    )
     parser.add_argument(
         "--output",
         type=Path,
         default=None,
-        help="輸出 CSV 檔案路徑（預設寫在專案根目錄 products.csv）",
+        help="輸出檔案路徑（預設寫在專案根目錄 products.csv / products.jsonl）",
+    )
+    parser.add_argument(
+        "--renormalize",
+        type=Path,
+        default=None,
+        metavar="OUTPUT",
+        help="不抓也不 parse HTML，只用目前的 lexicon 重算既有輸出（CSV / JSONL）的 norm_* 欄位；"
+        "預設覆寫該檔，可用 --output 另存",
+    )
+    parser.add_argument(
+        "--format",
+        choices=sorted(OUTPUT_WRITERS),
+        default="csv",
+        help="輸出格式；jsonl 會另外產生 .idx 索引，可用 jsonl_index.JsonlReader 依 external_id 直接讀取（預設 csv）",
+    )
+    parser.add_argument(
+        "--variations-output",
+        type=Path,
+        default=None,
+        help="另外輸出每個規格（容量 / 研磨）一列的 CSV，以 external_id 對回商品（預設不輸出）",
     )
     return parser
 
 
-def iter_existing_html(html_dir: Path) -> Iterable[Path]:
+def iter_existing_html(html_dir: Path) -> Iterator[Path]:
+    # 只排序檔名（維持輸出順序穩定），檔案內容要用到才讀
     html_files = sorted(html_dir.glob("*.html"))
     if not html_files:
         raise SystemExit(f"⚠️ 在 {html_dir} 找不到任何 HTML，請先移除 --use-existing 再跑一次")
-    return html_files
+    yield from html_files
 
 
 def extract_title_from_html(html_path: Path) -> str | None:
-    text = html_path.read_text(encoding="utf-8", errors="ignore")
-    m = TITLE_RE.search(text)
-    if m:
-        return m.group(1).strip()
-    m = OG_TITLE_RE.search(text)
-    if m:
-        return m.group(1).strip()
-    return None
+    # 只掃檔案開頭的 bytes，不解碼整頁（見 html_io.read_title）
+    return read_title(html_path)
 
 
 def should_skip_html(html_path: Path, skip_keywords: tuple[str, ...]) -> bool:
@@ -99,9 +213,212 @@ def should_skip_html(html_path: Path, skip_keywords: tuple[str, ...]) -> bool:
     return any(keyword and keyword in title for keyword in skip_keywords)
 
 
+def _parse_serial(
+    paths: Iterable[Path],
+    lex_yaml: Path,
+    fuzzy_threshold: float | None,
+    parse_timeout: float | None,
+    profiler: ParseProfiler | None,
+) -> Iterator[tuple[Path, ProductRecord | None, Exception | None]]:
+    for path in paths:
+        try:
+            with profiler.page(path) if profiler else nullcontext():
+                product = parse_page_with_budget(path, lex_yaml, fuzzy_threshold, parse_timeout)
+        except Exception as e:
+            yield path, None, e
+            continue
+        yield path, product, None
+
+
+def _parse_in_pool(
+    paths: Iterable[Path],
+    pool: ProcessPoolExecutor,
+    window: int,
+    lex_yaml: Path,
+    fuzzy_threshold: float | None,
+    parse_timeout: float | None,
+) -> Iterator[tuple[Path, ProductRecord | None, Exception | None]]:
+    """把頁面交給 worker process parse，最多預先排 window 頁，依輸入順序回傳"""
+    pending = deque()
+
+    def _collect():
+        path, future = pending.popleft()
+        try:
+            return path, future.result(), None
+        except BrokenProcessPool:
+            # worker process 整個掛掉不是這一頁的問題，後面的頁面也 parse 不了
+            raise
+        except Exception as e:
+            return path, None, e
+
+    try:
+        for path in paths:
+            pending.append((path, pool.submit(parse_page_with_budget, path, lex_yaml, fuzzy_threshold, parse_timeout)))
+            if len(pending) >= window:
+                yield _collect()
+        while pending:
+            yield _collect()
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def iter_parsed_products(
+    html_paths: Iterable[Path],
+    skip_keywords: tuple[str, ...],
+    lex_yaml: Path,
+    fuzzy_threshold: float | None = None,
+    profiler: ParseProfiler | None = None,
+    parse_timeout: float | None = None,
+    quarantine: Quarantine | None = None,
+    parse_workers: int = 0,
+    parse_pool: ProcessPoolExecutor | None = None,
+    failed: list[tuple[Path, str]] | None = None,
+) -> Iterator[ProductRecord]:
+    """skip → parse 的串流階段。
+
+    parse_workers 為 0 時在目前的 process 一次 parse 一頁；否則交給 parse_workers 個
+    worker process（可傳入常駐的 parse_pool），輸出順序不變。每頁 parse 有 CPU 時間上限，
+    超過上限或 parse 出錯的頁面會被略過並放進 quarantine，不會卡住整批；
+    有傳入 failed 的話也會把 (路徑, 原因) 加進去，讓呼叫端知道哪些頁面沒有結果。
+    """
+
+    def _kept() -> Iterator[Path]:
+        for html_path in html_paths:
+            path = Path(html_path)
+            if should_skip_html(path, skip_keywords):
+                print(f"⏭️  Skip {path.name}（標題含排除關鍵字）")
+                continue
+            yield path
+
+    own_pool = parse_workers > 0 and parse_pool is None
+    if own_pool:
+        parse_pool = start_parse_pool(parse_workers)
+    try:
+        if parse_workers > 0:
+            results = _parse_in_pool(
+                _kept(), parse_pool, parse_workers * 2, lex_yaml, fuzzy_threshold, parse_timeout
+            )
+        else:
+            results = _parse_serial(_kept(), lex_yaml, fuzzy_threshold, parse_timeout, profiler)
+
+        for path, product, err in results:
+            if err is not None:
+                if isinstance(err, ParseTimeout):
+                    print(f"⏱️  Timeout {path.name}（parse 超過 {parse_timeout:g} 秒 CPU），略過")
+                    detail = {"reason": "timeout", "cpu_budget_s": parse_timeout}
+                else:
+                    print(f"❌ Parse failed: {path.name}（{type(err).__name__}: {err}），略過")
+                    detail = {"reason": "error", "error": f"{type(err).__name__}: {err}"}
+                if failed is not None:
+                    failed.append((path, detail.get("error", "parse timeout")))
+                if quarantine:
+                    target = quarantine.add(path, **detail)
+                    print(f"🚧 已隔離到 {target}")
+                continue
+            print(f"📦 Parsed {path}")
+            print(json.dumps(product.to_dict(), ensure_ascii=False, indent=2))
+            yield product
+    finally:
+        if own_pool:
+            parse_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def run_pipeline(
+    html_paths: Iterable[Path],
+    output_path: Path,
+    skip_keywords: tuple[str, ...],
+    lex_yaml: Path,
+    fuzzy_threshold: float | None = None,
+    profiler: ParseProfiler | None = None,
+    variations_output: Path | None = None,
+    output_format: str = "csv",
+    parse_timeout: float | None = None,
+    quarantine: Quarantine | None = None,
+    parse_workers: int = 0,
+    parse_pool: ProcessPoolExecutor | None = None,
+) -> int:
+    """skip → parse → 寫檔，回傳寫入的商品數（單次執行與常駐模式共用）"""
+    products = iter_parsed_products(
+        html_paths,
+        skip_keywords,
+        lex_yaml,
+        fuzzy_threshold,
+        profiler=profiler,
+        parse_timeout=parse_timeout,
+        quarantine=quarantine,
+        parse_workers=parse_workers,
+        parse_pool=parse_pool,
+    )
+    if variations_output:
+        products = tee_variations_csv(products, variations_output)
+    return OUTPUT_WRITERS[output_format](products, output_path)
+
+
+def run_queue_worker(
+    queue: WorkQueue,
+    worker_id: str,
+    skip_keywords: tuple[str, ...],
+    lex_yaml: Path,
+    output_path: Path,
+    batch_size: int = 20,
+    fetch_workers: int = DEFAULT_MAX_LIMIT,
+    fuzzy_threshold: float | None = None,
+    parse_timeout: float | None = None,
+    quarantine: Quarantine | None = None,
+) -> int:
+    """一直從佇列領工作直到佇列清空：下載 → parse → 附加到輸出 → ack。
+
+    一批的資料寫進磁碟（fsync）之後才 ack，所以 worker 中途掛掉時，
+    沒 ack 的工作會在 lease 過期後被其他 worker 接手。
+    """
+    total = 0
+    while True:
+        urls = queue.claim(worker_id, batch_size)
+        if not urls:
+            break
+        records: list[ProductRecord] = []
+        done: list[str] = []
+        for url, path, err in iter_fetch_urls(urls, fetch_workers):
+            if path is None:
+                queue.fail(worker_id, url, str(err))
+                continue
+            failed: list[tuple[Path, str]] = []
+            records.extend(
+                iter_parsed_products(
+                    [path], skip_keywords, lex_yaml, fuzzy_threshold,
+                    parse_timeout=parse_timeout, quarantine=quarantine, failed=failed,
+                )
+            )
+            if failed:
+                # parse 超時或出錯的頁面已經隔離，交回佇列（試滿次數就標成 failed），不算完成
+                queue.fail(worker_id, url, failed[0][1])
+                continue
+            done.append(url)
+        total += append_csv(records, output_path)
+        queue.ack(worker_id, done)
+        print(f"📮 {worker_id}: +{len(records)} 筆，佇列 {queue.stats()}")
+    return total
+
+
 def main() -> None:
     parser = build_arg_parser()
     args = parser.parse_args()
+    if args.renormalize and (args.use_existing or args.queue):
+        parser.error("--renormalize 不能搭配 --use-existing / --queue 使用")
+    if args.profile and not args.use_existing:
+        parser.error("--profile 只能搭配 --use-existing 使用")
+    if args.profile and args.parse_workers:
+        parser.error("--profile 不能搭配 --parse-workers 使用")
+    if args.queue and args.use_existing:
+        parser.error("--queue 不能搭配 --use-existing 使用")
+    if args.enqueue and not args.queue:
+        parser.error("--enqueue 需要搭配 --queue")
+    if args.variations_output and args.queue:
+        parser.error("--variations-output 不能搭配 --queue 使用")
+    if args.format != "csv" and args.queue:
+        parser.error("--queue 只支援 --format csv")
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(message)s")
 
     skip_keywords = tuple(
         kw.strip() for kw in (args.skip_keywords or "").split(",") if kw.strip()
@@ -110,45 +427,110 @@ def main() -> None:
     project_root = Path(__file__).resolve().parents[1]
     lex_yaml = args.lexicon or (project_root / "data" / "normalize" / "coffee_lexicon.yaml")
     html_dir = args.html_dir or (project_root / "data" / "raw_html")
+    quarantine = Quarantine(args.quarantine_dir or (project_root / "data" / "quarantine"))
+    parse_timeout = args.parse_timeout or None
+
+    if args.renormalize:
+        stats = renormalize_file(
+            args.renormalize, lex_yaml, args.output, fuzzy_threshold=args.fuzzy_threshold
+        )
+        print(
+            f"🔁 Renormalized {args.output or args.renormalize}：{stats['rows']} 筆，"
+            f"{stats['changed']} 筆有變動（{stats['unique']} 組不同的 raw 值，{stats['seconds']} s）"
+        )
+        return
+
+    if args.queue:
+        queue = WorkQueue(args.queue, lease_seconds=args.lease_seconds)
+        if args.enqueue:
+            urls = iter_product_urls_from_sitemap(args.sitemap_url)
+            if args.limit:
+                urls = islice(urls, args.limit)
+            added = queue.enqueue(urls)
+            print(f"📮 {args.brand_name}: 新增 {added} 個商品到佇列，佇列 {queue.stats()}")
+            return
+        worker_id = args.worker_id or default_worker_id()
+        output_path = args.output or (project_root / f"products.{worker_id}.csv")
+        count = run_queue_worker(
+            queue,
+            worker_id,
+            skip_keywords,
+            lex_yaml,
+            output_path,
+            batch_size=args.batch_size,
+            fetch_workers=args.fetch_workers,
+            fuzzy_threshold=args.fuzzy_threshold,
+            parse_timeout=parse_timeout,
+            quarantine=quarantine,
+        )
+        print(f"💾 {worker_id}: 共 {count} 筆寫入 {output_path}")
+        return
+
+    # parse worker 要在下載 thread 啟動之前 fork 出來
+    parse_pool = start_parse_pool(args.parse_workers) if args.parse_workers > 0 else None
 
+    # 整條 pipeline 都是 generator：下游每拿一筆，上游才多做一筆
+    state = None
     if args.use_existing:
         html_paths = iter_existing_html(html_dir)
     else:
-        html_paths = fetch_all_pages(
+        state = CrawlState(args.state) if args.state else None
+        html_paths = iter_product_pages(
             sitemap_url=args.sitemap_url,
             brand_name=args.brand_name,
-            save_html=True,
+            workers=args.fetch_workers,
+            state=state,
+            stale_sample=args.stale_sample,
         )
 
     if args.limit:
-        html_paths = list(html_paths)[: args.limit]
+        # --limit 到了就不再往上游要資料，後面的頁面不會被下載
+        html_paths = islice(html_paths, args.limit)
 
-    if not html_paths:
-        raise SystemExit("⚠️ 沒有可用的 HTML 檔案，請確認 sitemap 或目錄。")
+    profiler = ParseProfiler() if args.profile else None
+    output_path = args.output or (project_root / f"products.{args.format}")
+    try:
+        count = run_pipeline(
+            html_paths,
+            output_path,
+            skip_keywords,
+            lex_yaml,
+            args.fuzzy_threshold,
+            profiler=profiler,
+            variations_output=args.variations_output,
+            output_format=args.format,
+            parse_timeout=parse_timeout,
+            quarantine=quarantine,
+            parse_workers=args.parse_workers,
+            parse_pool=parse_pool,
+        )
+    finally:
+        if parse_pool:
+            parse_pool.shutdown(wait=True, cancel_futures=True)
+        if state:
+            state.close()
 
-    rows: List[dict] = []
-    for html_path in html_paths:
-        path = Path(html_path)
-        if should_skip_html(path, skip_keywords):
-            print(f"⏭️  Skip {path.name}（標題含排除關鍵字）")
-            continue
+    if profiler:
+        # 取樣另外跑一輪，不跟 cProfile 同時開
+        print(f"⏱️  取樣 {len(profiler.pages)} 頁 call stack…")
+        profiler.sample_pass(lambda path: parse_page_with_budget(path, lex_yaml, args.fuzzy_threshold, parse_timeout))
+        reports = profiler.write_reports(args.profile)
+        for name, path in reports.items():
+            print(f"⏱️  Profile {name}: {path}")
 
-        product = parse_product(source="bargain", html_path=path, lex_yaml_path=lex_yaml)
-        print(f"📦 Parsed {html_path}")
-        print(json.dumps(product, ensure_ascii=False, indent=2))
-        rows.append(product)
+    if quarantine.count:
+        print(f"🚧 {quarantine.count} 頁 parse 超時或出錯，報告：{quarantine.report_path}")
 
-    if not rows:
+    if not count:
         raise SystemExit("⚠️ 沒有任何商品被解析，請調整條件後再試。")
+    print(f"💾 Saved {args.format.upper()} to {output_path}（{count} 筆）")
+    if args.variations_output:
+        print(f"💾 Saved variations to {args.variations_output}")
 
-    output_path = args.output or (project_root / "products.csv")
-    df = pd.DataFrame(rows)
-    if "norm_variety" in df.columns:
-        df["norm_variety"] = df["norm_variety"].apply(
-            lambda v: ", ".join(v) if isinstance(v, list) else (v or "")
-        )
-    df.to_csv(output_path, index=False)
-    print(f"💾 Saved CSV to {output_path}")
+    if args.dedup:
+        add_ids = add_cluster_ids_jsonl if args.format == "jsonl" else add_cluster_ids_csv
+        clusters = add_ids(output_path)
+        print(f"🧬 {count} 筆商品分成 {clusters} 個 cluster")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import os
+import socket
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    url           TEXT PRIMARY KEY,
+    state         TEXT NOT NULL DEFAULT 'pending',   -- pending / leased / done / failed
+    lease_owner   TEXT,
+    lease_expires REAL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    last_error    TEXT,
+    updated_at    REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks(state, lease_expires);
+"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """以 SQLite 檔案實作的工作佇列，讓多個 process / 機器分工爬同一份 sitemap。
+
+    - enqueue：sitemap 階段把商品網址放進來（重複的忽略）
+    - claim：worker 一次領一批，並取得有期限的 lease
+    - ack / fail：完成或失敗回報；lease 過期還沒 ack 的會在下次 claim 時重新排回 pending
+    """
+
+    def __init__(self, db_path: Path, lease_seconds: float = 600, max_attempts: int = 3):
+        self.db_path = Path(db_path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # isolation_level=None：自己控制交易，claim 時用 BEGIN IMMEDIATE 搶寫入鎖
+        self._conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def enqueue(self, urls: Iterable[str]) -> int:
+        """加入網址，回傳實際新增的數量"""
+        # 先把網址全部拿到（可能是邊下載 sitemap 邊產生的 generator），再開寫入交易，
+        # 不要在抓網路的時候佔著整個佇列的寫入鎖
+        urls = list(urls)
+        now = time.time()
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO tasks (url, updated_at) VALUES (?, ?)",
+                ((url, now) for url in urls),
+            )
+            return self._conn.total_changes - before
+
+    def claim(self, worker_id: str, batch_size: int = 20) -> list[str]:
+        """領一批工作；過期的 lease 先排回 pending"""
+        now = time.time()
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            # 已經試滿次數還一直過期的（例如每次都讓 worker 掛掉的頁面）直接標成 failed
+            self._conn.execute(
+                "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "lease_owner = NULL, lease_expires = NULL, last_error = COALESCE(last_error, 'lease expired') "
+                "WHERE state = 'leased' AND lease_expires < ?",
+                (self.max_attempts, now),
+            )
+            urls = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT url FROM tasks WHERE state = 'pending' ORDER BY rowid LIMIT ?",
+                    (batch_size,),
+                )
+            ]
+            self._conn.executemany(
+                "UPDATE tasks SET state = 'leased', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE url = ?",
+                ((worker_id, now + self.lease_seconds, now, url) for url in urls),
+            )
+        return urls
+
+    def ack(self, worker_id: str, urls: Iterable[str]) -> int:
+        """標記完成；lease 已經被別人接手的不算。回傳成功 ack 的數量"""
+        now = time.time()
+        with self._conn:
+            cur = self._conn.executemany(
+                "UPDATE tasks SET state = 'done', lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE url = ? AND state = 'leased' AND lease_owner = ?",
+                ((now, url, worker_id) for url in urls),
+            )
+            return cur.rowcount
+
+    def fail(self, worker_id: str, url: str, error: str) -> None:
+        """回報失敗：嘗試次數未滿就排回 pending，否則標成 failed；lease 已經被別人接手的不算"""
+        now = time.time()
+        with self._conn:
+            self._conn.execute(
+                "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "lease_owner = NULL, lease_expires = NULL, last_error = ?, updated_at = ? "
+                "WHERE url = ? AND state = 'leased' AND lease_owner = ?",
+                (self.max_attempts, error, now, url, worker_id),
+            )
+
+    def stats(self) -> dict[str, int]:
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        for state, n in self._conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state"):
+            counts[state] = n
+        return counts
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import csv
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from jsonl_index import index_path_for, write_index
+from product_record import ProductRecord, VariationRecord
+
+
+def _format_value(value):
+    # list（例如 norm_variety）攤平成 "a, b"；其他值交給 csv 模組轉成 str()，None 寫成空字串。
+    # 與 pandas.to_csv 不同：整欄有缺值時整數不會變成 "454.0"，浮點數也不做格式化
+    if isinstance(value, list):
+        return ", ".join(value)
+    return value
+
+
+def write_csv(rows: Iterable[dict | ProductRecord], output_path: Path) -> int:
+    """一筆一筆寫入 CSV，不在記憶體裡累積整份資料。
+
+    ProductRecord 以 ProductRecord.FIELDS 為欄位、直接寫 as_row()；
+    dict 則以第一筆資料的 key 為準。值原樣交給 csv 模組：454 寫成 "454"、700.0 寫成
+    "700.0"、True 寫成 "True"、None 寫成空字串（不會照 pandas.to_csv 的規則轉型）。先寫到暫存檔，成功後才取代原本的輸出，
+    中途失敗不會留下寫一半的檔案；沒有任何資料時不會產生檔案。
+
+    Args:
+        rows (Iterable[dict]): 商品資料
+        output_path (Path): 輸出 CSV 路徑
+
+    Returns:
+        int: 寫入的筆數
+    """
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    count = 0
+    try:
+        with tmp_path.open("w", encoding="utf-8", newline="") as f:
+            writer = None
+            for row in rows:
+                if isinstance(row, ProductRecord):
+                    if writer is None:
+                        writer = csv.writer(f, lineterminator="\n")
+                        writer.writerow(ProductRecord.FIELDS)
+                    writer.writerow(row.as_row())
+                else:
+                    if writer is None:
+                        writer = csv.DictWriter(f, fieldnames=list(row), lineterminator="\n")
+                        writer.writeheader()
+                    writer.writerow({k: _format_value(v) for k, v in row.items()})
+                count += 1
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    if count:
+        os.replace(tmp_path, output_path)
+    else:
+        tmp_path.unlink(missing_ok=True)
+    return count
+
+
+def write_jsonl(rows: Iterable[dict | ProductRecord], output_path: Path) -> int:
+    """一行一筆 JSON 串流寫出，同時產生 external_id -> (offset, 長度) 的 sidecar 索引。
+
+    索引寫在 output_path + ".idx"（格式與讀取見 jsonl_index），同一個 external_id
+    出現多次時索引指向最後一筆。與 write_csv 一樣先寫暫存檔，沒有任何資料時不會產生檔案。
+
+    Args:
+        rows (Iterable[dict]): 商品資料
+        output_path (Path): 輸出 JSONL 路徑
+
+    Returns:
+        int: 寫入的筆數
+    """
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    offsets: dict[str, tuple[int, int]] = {}
+    count = 0
+    offset = 0
+    try:
+        with tmp_path.open("wb") as f:
+            for row in rows:
+                d = row.to_dict() if isinstance(row, ProductRecord) else row
+                line = json.dumps(d, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                f.write(line + b"\n")
+                if d.get("external_id"):
+                    offsets[d["external_id"]] = (offset, len(line))
+                offset += len(line) + 1
+                count += 1
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    if not count:
+        tmp_path.unlink(missing_ok=True)
+        return 0
+    write_index(offsets, index_path_for(output_path), data_size=offset)
+    os.replace(tmp_path, output_path)
+    return count
+
+
+def append_csv(rows: Iterable[ProductRecord], output_path: Path) -> int:
+    """把一批 ProductRecord 附加到 CSV 後面，寫完 fsync 才回傳。
+
+    給佇列 worker 用：一批寫進磁碟之後才 ack，worker 中途掛掉也不會遺失已 ack 的資料。
+    檔案不存在或是空的時候會先寫 header。
+
+    Returns:
+        int: 寫入的筆數
+    """
+    output_path = Path(output_path)
+    count = 0
+    with output_path.open("a", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        if f.tell() == 0:
+            writer.writerow(ProductRecord.FIELDS)
+        for row in rows:
+            writer.writerow(row.as_row())
+            count += 1
+        f.flush()
+        os.fsync(f.fileno())
+    return count
+
+
+def tee_variations_csv(records: Iterable[ProductRecord], output_path: Path) -> Iterator[ProductRecord]:
+    """把每筆商品的規格明細串流寫到另一個 CSV，商品本身原樣往下游傳。
+
+    接在 parse 與 write_csv 之間，同一次 parse 就能同時產生商品表與規格表，
+    規格表以 external_id 對回商品。與 write_csv 一樣先寫暫存檔，全部跑完才取代原本的輸出；
+    一筆商品都沒有時也跟 write_csv / write_jsonl 一樣保留舊檔，兩份輸出才會是同一次執行的結果。
+
+    Args:
+        records (Iterable[ProductRecord]): 商品資料
+        output_path (Path): 規格表 CSV 路徑
+
+    Yields:
+        ProductRecord: 原本的商品
+    """
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    count = 0
+    try:
+        with tmp_path.open("w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(VariationRecord.FIELDS)
+            for record in records:
+                writer.writerows(v.as_row() for v in record.variations)
+                count += 1
+                yield record
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    if count:
+        os.replace(tmp_path, output_path)
+    else:
+        tmp_path.unlink(missing_ok=True)
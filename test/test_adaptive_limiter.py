@@ -0,0 +1,66 @@
+from adaptive_limiter import AdaptiveLimiter
+
+
+def test_additive_increase_on_healthy_responses():
+    lim = AdaptiveLimiter(initial=2, max_limit=4)
+    for _ in range(20):
+        lim.record("a.com", 0.1, 200)
+    assert lim.limit("a.com") == 4
+
+
+def test_multiplicative_decrease_on_throttle_per_host():
+    lim = AdaptiveLimiter(initial=8)
+    lim.record("a.com", 0.1, 429)
+    assert lim.limit("a.com") == 4
+    # 另一個 host 不受影響
+    assert lim.limit("b.com") == 8
+
+
+def test_slow_responses_shrink_limit():
+    lim = AdaptiveLimiter(initial=4, latency_tolerance=2.0)
+    lim.record("a.com", 0.1, 200)
+    before = lim.limit("a.com")
+    for _ in range(10):
+        lim.record("a.com", 1.0, 200)
+    assert lim.limit("a.com") < before
+
+
+def test_slot_counts_exception_as_timeout():
+    lim = AdaptiveLimiter(initial=4)
+    try:
+        with lim.slot("https://a.com/products/x"):
+            raise TimeoutError
+    except TimeoutError:
+        pass
+    assert lim.limit("a.com") == 2
+    assert lim.state("a.com").in_flight == 0
+
+
+def test_min_latency_is_windowed():
+    lim = AdaptiveLimiter(initial=4, latency_window=5)
+    lim.record("a.com", 0.01, 200)
+    for _ in range(5):
+        lim.record("a.com", 0.5, 200)
+    # 0.01 已經滑出視窗，基準跟著變成目前的延遲，不會一直判定為變慢
+    assert lim.state("a.com").min_latency == 0.5
+
+
+def test_slot_does_not_penalise_host_for_local_errors():
+    lim = AdaptiveLimiter(initial=4)
+    try:
+        with lim.slot("https://a.com/products/x") as slot:
+            slot.status = 200
+            raise PermissionError("disk")
+    except PermissionError:
+        pass
+    assert lim.limit("a.com") == 4
+    assert lim.state("a.com").ewma_latency is None
+    assert lim.state("a.com").in_flight == 0
+
+
+def test_server_errors_back_off():
+    lim = AdaptiveLimiter(initial=8)
+    lim.record("a.com", 0.1, 502)
+    assert lim.limit("a.com") == 4
+    lim.record("b.com", 0.1, 404)
+    assert lim.limit("b.com") == 8
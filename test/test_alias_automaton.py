@@ -0,0 +1,46 @@
+from pathlib import Path
+
+from normalizer.alias_automaton import AliasAutomaton, leftmost_longest
+from normalizer.coffee_lexicon import CoffeeLexicon
+from parsers.bargain import normalize_product_desciprtion
+
+
+def test_automaton_leftmost_longest_and_word_boundaries():
+    ac = AliasAutomaton([("中深", "a"), ("中深焙", "b"), ("深焙", "c"), ("yb", "d"), ("比亞", "e"), ("索比亞", "f")])
+    assert [(s, e, p) for s, e, p in leftmost_longest(ac.iter_matches("x中深焙y"))] == [(1, 4, "b")]
+    # 英數 alias 要落在字的邊界上
+    assert [p for _, _, p in ac.iter_matches("ybx yb")] == ["d"]
+    # 重疊的命中都會回報，由 leftmost_longest 挑
+    assert sorted(p for _, _, p in ac.iter_matches("衣索比亞")) == ["e", "f"]
+
+
+def test_fulltext_fills_missing_fields_with_provenance():
+    lex = CoffeeLexicon(Path("data/normalize/coffee_lexicon.yaml"))
+    assert lex.scan_text("哥倫比亞 卡斯提優 淺中焙") == {
+        "variety": ["卡斯提優（Castillo）"],
+        "roast": ["淺中焙（Light-medium）"],
+        "country": ["哥倫比亞（Colombia）"],
+    }
+
+    norm = normalize_product_desciprtion(
+        {"process_raw": "日曬"},
+        lex,
+        title="一磅 秋日 獨家配方 水洗 中深焙 咖啡豆",
+        description="風味：dark chocolate。產地：巴西、哥倫比亞",
+    )
+    assert norm["process"] == "日曬（Natural）"
+    assert norm["roast"] == "中深焙（Medium-dark）"
+    assert norm["country"] == "巴西（Brazil）,哥倫比亞（Colombia）"
+    assert norm["provenance"] == "roast=title,country=description"
+
+
+def test_description_does_not_fill_process_from_tasting_notes():
+    lex = CoffeeLexicon(Path("data/normalize/coffee_lexicon.yaml"))
+    norm = normalize_product_desciprtion(
+        {},
+        lex,
+        title="綜合豆 一磅",
+        description="酒香、蜂蜜 honey，natural sweetness",
+    )
+    assert norm["process"] is None
+    assert "process" not in (norm["provenance"] or "")
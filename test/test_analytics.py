@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+from analytics import add_price_metrics, build_report, category_percentiles, cheapest_in_stock, load_products
+
+HEADER = "external_id,title,price,price_original,weight_g,in_stock,norm_country,norm_variety\n"
+
+
+def _write(path, rows):
+    path.write_text(HEADER + "".join(rows), encoding="utf-8")
+    return path
+
+
+def test_price_metrics_and_multi_value_percentiles(tmp_path):
+    old = _write(tmp_path / "old.csv", ["a,A,400,400,200,True,巴拿馬,藝伎\n"])
+    new = _write(
+        tmp_path / "new.csv",
+        [
+            "a,A,300,400,200,True,巴拿馬,藝伎\n",
+            "b,B,450,500,454,False,衣索比亞,\"藝伎, 古優原生種\"\n",
+            "c,C,100,,0,True,,\n",
+        ],
+    )
+    df = add_price_metrics(load_products([old, new]))
+
+    assert df["run"].tolist() == [0, 1, 1, 1]
+    assert df["price_per_100g"].iloc[1] == pytest.approx(150)
+    assert pd.isna(df["price_per_100g"].iloc[3])
+    assert df["discount_pct"].iloc[1] == pytest.approx(0.25)
+
+    table = category_percentiles(df, "norm_variety")
+    assert table.loc["藝伎", "count"] == 3
+    assert table.loc["古優原生種", "count"] == 1
+
+
+def test_multi_country_blend_counts_for_each_country(tmp_path):
+    run = _write(
+        tmp_path / "run.csv",
+        ["a,A,300,300,100,True,\"巴西,哥倫比亞\",\n", "b,B,500,500,100,True,巴西,\n"],
+    )
+    table = category_percentiles(add_price_metrics(load_products([run])), "norm_country")
+    assert table.loc["巴西", "count"] == 2
+    assert table.loc["哥倫比亞", "count"] == 1
+
+
+def test_cheapest_in_stock_uses_latest_run(tmp_path):
+    old = _write(tmp_path / "old.csv", ["a,A,100,100,200,True,巴拿馬,藝伎\n"])
+    new = _write(
+        tmp_path / "new.csv",
+        ["a,A,900,900,200,False,巴拿馬,藝伎\n", "b,B,500,500,200,True,巴拿馬,藝伎\n"],
+    )
+    df = add_price_metrics(load_products([old, new]))
+    cheapest = cheapest_in_stock(df, "norm_country", top=3)
+    assert cheapest["external_id"].tolist() == ["b"]
+
+    report = build_report(load_products([old, new]))
+    assert {"cheapest_by_variety", "price_per_100g_by_country"} <= set(report)
+
+
+def test_build_report_counts_each_product_once_and_keeps_input(tmp_path):
+    old = _write(tmp_path / "old.csv", ["a,A,100,100,200,True,巴拿馬,藝伎\n"])
+    new = _write(
+        tmp_path / "new.csv",
+        ["a,A,900,900,200,True,巴拿馬,藝伎\n", "b,B,500,500,200,True,巴拿馬,藝伎\n"],
+    )
+    df = load_products([old, new])
+    columns = list(df.columns)
+    report = build_report(df)
+
+    # 傳進去的 df 不會被加上欄位
+    assert list(df.columns) == columns
+    table = report["price_per_100g_by_variety"]
+    # a 只算最新那一次（450/100g），舊的 50/100g 不會拉低分布
+    assert table.loc["藝伎", "count"] == 2
+    assert table.loc["藝伎", "p10"] > 250
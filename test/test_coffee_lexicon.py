@@ -1,8 +1,13 @@
 from typing import Any
 
 
+import os
+import pickle
 from pathlib import Path
-from normalizer.coffee_lexicon import CoffeeLexicon
+
+import pytest
+
+from normalizer.coffee_lexicon import CoffeeLexicon, compile_lexicon
 
 
 def lex():
@@ -28,3 +33,91 @@ def test_country():
     l = lex()
     assert l.normalize_country("Colombia") == "哥倫比亞（Colombia）"
     assert l.normalize_country("哥斯大黎加") == "哥斯大黎加（Costa Rica）"
+
+def test_cache_and_batch():
+    l = lex()
+    got = l.normalize_column("roast", ["中深焙", "淺中焙", "中深焙", None])
+    assert got == ["中深焙（Medium-dark）", "淺中焙（Light-medium）", "中深焙（Medium-dark）", None]
+
+    batch = l.normalize_batch([
+        {"process": "水洗", "variety": "藝伎"},
+        {"process": "水洗", "country": "衣索比亞"},
+    ])
+    assert batch[0] == {"process": "水洗（Washed）", "variety": ["藝伎（Geisha）"]}
+    assert batch[1] == {"process": "水洗（Washed）", "country": "衣索比亞（Ethiopia）"}
+
+    l.normalize_process("水洗")
+    stats = l.cache_info()
+    assert stats["process"]["misses"] == 1
+    assert stats["process"]["hits"] == 1
+    assert stats["roast"]["size"] == 3
+
+def test_compiled_artifact(tmp_path):
+    yaml_path = tmp_path / "coffee_lexicon.yaml"
+    yaml_path.write_bytes(Path("data/normalize/coffee_lexicon.yaml").read_bytes())
+    compile_lexicon(yaml_path)
+
+    l = CoffeeLexicon(yaml_path)
+    assert l.loaded_from == "artifact"
+    assert l.normalize_process("厭氧水洗") == "厭氧（Anaerobic）"
+    assert l.normalize_variety("黃波旁 Yellow Bourbon") == ["黃波旁（Yellow Bourbon）"]
+
+    # 只是 touch、內容沒變 -> 還是同一份 artifact
+    st = yaml_path.stat()
+    os.utime(yaml_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert CoffeeLexicon(yaml_path).loaded_from == "artifact"
+
+    # YAML 內容改過 -> 退回讀 YAML
+    with yaml_path.open("a", encoding="utf-8") as f:
+        f.write("\n# edited\n")
+    assert CoffeeLexicon(yaml_path).loaded_from == "yaml"
+
+
+def test_corrupt_artifact_is_not_unpickled(tmp_path):
+    yaml_path = tmp_path / "coffee_lexicon.yaml"
+    yaml_path.write_bytes(Path("data/normalize/coffee_lexicon.yaml").read_bytes())
+    artifact = compile_lexicon(yaml_path)
+
+    raw = bytearray(artifact.read_bytes())
+    raw[-5] ^= 0xFF
+    artifact.write_bytes(bytes(raw))
+    assert CoffeeLexicon(yaml_path).loaded_from == "yaml"
+
+    # 舊格式（沒有檔頭的 pickle）也不會被讀
+    artifact.write_bytes(pickle.dumps({"version": 1}))
+    assert CoffeeLexicon(yaml_path).loaded_from == "yaml"
+
+
+def test_compile_rejects_conflicting_alias(tmp_path):
+    yaml_path = tmp_path / "bad.yaml"
+    yaml_path.write_text(
+        "roast:\n  淺焙:\n    aliases: [light]\n  深焙:\n    aliases: [Light]\n",
+        encoding="utf-8",
+    )
+    with pytest.raises(ValueError):
+        compile_lexicon(yaml_path)
+
+def test_fuzzy_match():
+    strict = lex()
+    assert strict.normalize_variety("Geshia") == []
+
+    l = CoffeeLexicon(Path("data/normalize/coffee_lexicon.yaml"), fuzzy_threshold=0.8)
+    assert l.normalize_variety("Geshia") == ["藝伎（Geisha）"]
+    assert l.match_method("variety", "Geshia") == "fuzzy"
+    assert l.normalize_roast("淺中焙") == "淺中焙（Light-medium）"
+    assert l.match_method("roast", "淺中焙") == "alias"
+    assert l.normalize_country("完全不相干") is None
+
+
+def test_fuzzy_rejects_short_values_that_differ_by_one_char():
+    from normalizer.fuzzy_index import NgramIndex
+
+    roast = NgramIndex({"中深焙": "中深焙（Medium-dark）", "淺焙": "淺焙（Light）"})
+    assert roast.lookup("中焙", 0.8) is None
+    assert roast.lookup("極淺焙", 0.8) is None
+    variety = NgramIndex({"黃波旁": "黃波旁（Yellow Bourbon）", "紅波旁": "紅波旁（Red Bourbon）"})
+    assert variety.lookup("波旁", 0.8) is None
+    assert variety.lookup("粉紅波旁", 0.8) is None
+    assert NgramIndex({"波旁": "波旁（Bourbon）"}).lookup("黃波旁", 0.8) is None
+    # 真正的拼錯字仍然對得到
+    assert NgramIndex({"bourbon": "波旁（Bourbon）"}).lookup("bourbn", 0.8) == ("波旁（Bourbon）", 12 / 13)
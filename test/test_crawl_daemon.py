@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+import crawl_daemon
+from crawl_daemon import CrawlDaemon, load_config
+
+LEXICON = "data/normalize/coffee_lexicon.yaml"
+
+
+def _config(tmp_path, body):
+    path = tmp_path / "daemon.yaml"
+    path.write_text(body, encoding="utf-8")
+    return path
+
+
+def _daemon(tmp_path, monkeypatch, lexicon):
+    path = _config(
+        tmp_path,
+        f"lexicon: {lexicon}\nstatus_file: status.json\n"
+        "sites:\n  - name: a\n    sitemap_url: http://x/sitemap.xml\n",
+    )
+    monkeypatch.setattr(crawl_daemon, "iter_product_pages", lambda **kwargs: iter(()))
+    return CrawlDaemon(load_config(path, root=tmp_path))
+
+
+def test_load_config_resolves_paths_and_validates(tmp_path):
+    path = _config(tmp_path, "sites:\n  - name: a\n    sitemap_url: http://x/sitemap.xml\n    interval_minutes: 5\n")
+    config = load_config(path, root=tmp_path)
+    site = config.sites[0]
+    assert site.output == tmp_path / "products.a.csv"
+    assert site.interval_s == 300
+
+    with pytest.raises(ValueError):
+        load_config(_config(tmp_path, "sites: []\n"), root=tmp_path)
+
+
+def test_run_once_writes_status(tmp_path, monkeypatch):
+    root = Path(__file__).resolve().parents[1]
+    daemon = _daemon(tmp_path, monkeypatch, root / LEXICON)
+    daemon.run_forever(once=True)
+
+    status = json.loads((tmp_path / "status.json").read_text(encoding="utf-8"))
+    last = status["sites"]["a"]["last_run"]
+    assert status["sites"]["a"]["runs"] == 1
+    assert last["error"] is None and last["pages"] == 0 and last["products"] == 0
+
+
+def test_status_endpoint_serves_json(tmp_path, monkeypatch):
+    root = Path(__file__).resolve().parents[1]
+    daemon = _daemon(tmp_path, monkeypatch, root / LEXICON)
+    daemon.run_site(daemon.config.sites[0])
+    server = daemon.serve_status(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/status"
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            assert resp.status == 200
+            assert resp.headers["Content-Type"].startswith("application/json")
+            status = json.loads(resp.read().decode("utf-8"))
+    finally:
+        server.shutdown()
+        server.server_close()
+        daemon.pool.shutdown()
+    assert status["pid"] == os.getpid()
+    assert status["sites"]["a"]["runs"] == 1
+
+
+def test_lexicon_reloaded_after_yaml_changes(tmp_path, monkeypatch):
+    root = Path(__file__).resolve().parents[1]
+    lexicon = tmp_path / "coffee_lexicon.yaml"
+    shutil.copy(root / LEXICON, lexicon)
+    daemon = _daemon(tmp_path, monkeypatch, lexicon)
+    site = daemon.config.sites[0]
+    try:
+        first = daemon.run_site(site)
+        lex = daemon._lexicon
+        assert daemon.run_site(site)["lexicon_reloaded"] is False
+        assert daemon._lexicon is lex
+
+        # 模擬編輯 YAML：mtime 往後推
+        st = lexicon.stat()
+        os.utime(lexicon, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))
+        second = daemon.run_site(site)
+    finally:
+        daemon.pool.shutdown()
+    assert first["lexicon_reloaded"] is False
+    assert second["lexicon_reloaded"] is True and second["error"] is None
+    assert daemon._lexicon is not lex
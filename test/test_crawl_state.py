@@ -0,0 +1,25 @@
+from crawl_state import CrawlState, lastmod_advanced
+
+
+def test_lastmod_advanced():
+    assert lastmod_advanced("2026-10-02", "2026-10-01")
+    assert not lastmod_advanced("2026-10-01T00:00:00+00:00", "2026-10-01")
+    assert lastmod_advanced("2026-10-01", None)
+    assert not lastmod_advanced(None, "2026-10-01")
+
+
+def test_plan_only_fetches_new_changed_and_stale_sample(tmp_path):
+    with CrawlState(tmp_path / "state.db") as state:
+        pages = {}
+        for i, url in enumerate(["a", "b", "c", "d"]):
+            pages[url] = tmp_path / f"{url}.html"
+            pages[url].write_text("x", encoding="utf-8")
+            state.mark_fetched(url, "2026-10-01", pages[url], fetched_at=100 + i)
+
+        entries = [("a", "2026-10-01"), ("b", "2026-10-05"), ("c", "2026-10-01"), ("d", "2026-10-01"), ("e", None)]
+        plan = state.plan(entries, stale_sample=1)
+
+    assert [u for u, _ in plan.to_fetch] == ["b", "e", "a"]
+    assert (plan.new, plan.changed, plan.stale) == (1, 1, 1)
+    assert [u for u, _ in plan.reuse] == ["c", "d"]
+    assert plan.avoided == 2
@@ -0,0 +1,58 @@
+import json
+
+import numpy as np
+
+from dedup import MinHashLSH, add_cluster_ids_csv, add_cluster_ids_jsonl, assign_clusters, clean_title
+
+
+def test_clean_title_drops_size_and_boilerplate():
+    assert clean_title("一磅 衣索比亞 蜜釀花影 中深焙 咖啡 咖啡豆 100%阿拉比卡") == "衣索比亞蜜釀花影中深焙"
+    assert clean_title("【強豆回歸】衣索比亞 蜜釀花影 中深焙 400g") == "衣索比亞蜜釀花影中深焙"
+
+
+def test_same_bean_different_size_clusters_together():
+    rows = [
+        {"title": "一磅 衣索比亞 蜜釀花影 (牛奶) 水洗 中深焙 咖啡 咖啡豆 100%阿拉比卡", "norm_country": "衣索比亞（Ethiopia）"},
+        {"title": "衣索比亞 萌萌藝伎 水洗 淺焙 200克 咖啡 咖啡豆 精品咖啡"},
+        {"title": "衣索比亞 蜜釀花影 (牛奶) 水洗 中深焙 400g 咖啡豆", "norm_country": "衣索比亞（Ethiopia）"},
+        {"title": "衣索比亞 花魁藝伎 水洗 淺焙 200克 咖啡 咖啡豆 精品咖啡"},
+    ]
+    ids = assign_clusters(rows)
+    assert ids[0] == ids[2]
+    assert len({ids[0], ids[1], ids[3]}) == 3
+
+
+def test_cluster_merges_pairs_beyond_first_bucket_member():
+    # 同一個 bucket 裡 A~B、B~C，但 A 跟 C 不夠像；C 仍要透過 B 併進來
+    lsh = MinHashLSH(num_perm=4, bands=2, threshold=0.75)
+    sigs = np.array([[1, 2, 3, 4], [1, 2, 3, 9], [1, 2, 8, 9], [5, 6, 7, 8]], dtype=np.uint32)
+    assert lsh.cluster(sigs) == [0, 0, 0, 3]
+
+
+def test_cluster_ids_do_not_depend_on_row_order():
+    rows = [
+        {"external_id": "b", "title": "一磅 巴拿馬 藝伎 水洗"},
+        {"external_id": "x", "title": "哥倫比亞 粉紅波旁 日曬"},
+        {"external_id": "a", "title": "巴拿馬 藝伎 水洗 200克"},
+    ]
+    ids = dict(zip("bxa", assign_clusters(rows)))
+    reordered = dict(zip("axb", assign_clusters(rows[::-1])))
+    assert ids == reordered
+    assert ids["a"] == ids["b"] != ids["x"]
+
+
+def test_add_cluster_ids_csv(tmp_path):
+    path = tmp_path / "products.csv"
+    path.write_text("external_id,title\na,巴拿馬 藝伎 水洗\nb,一磅 巴拿馬 藝伎 水洗\n", encoding="utf-8")
+    assert add_cluster_ids_csv(path) == 1
+    assert path.read_text(encoding="utf-8").splitlines()[0] == "external_id,title,cluster_id"
+
+
+def test_add_cluster_ids_jsonl(tmp_path):
+    path = tmp_path / "products.jsonl"
+    rows = [{"external_id": "a", "title": "巴拿馬 藝伎 水洗"}, {"external_id": "b", "title": "一磅 巴拿馬 藝伎 水洗"}]
+    path.write_text("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows), encoding="utf-8")
+    assert add_cluster_ids_jsonl(path) == 1
+    out = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert out[0]["cluster_id"] == out[1]["cluster_id"]
+    assert path.with_name(path.name + ".idx").exists()
@@ -0,0 +1,38 @@
+import fetch_page
+from adaptive_limiter import AdaptiveLimiter
+
+
+class FakeResponse:
+    status_code = 200
+    ok = True
+    headers = {"Content-Type": "text/html; charset=utf-8"}
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.in_flight_during_body = None
+
+    @property
+    def content(self):
+        # 讀 body 時名額還佔著
+        self.in_flight_during_body = self.limiter.state("shop.example").in_flight
+        return "<html>ok</html>".encode("utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def test_slot_is_held_until_body_is_read(monkeypatch):
+    limiter = AdaptiveLimiter()
+    resp = FakeResponse(limiter)
+
+    class FakeSession:
+        def get(self, url, **kwargs):
+            return resp
+
+    monkeypatch.setattr(fetch_page, "get_session", lambda: FakeSession())
+    assert fetch_page.fetch_page("https://shop.example/products/a", limiter=limiter) == "<html>ok</html>"
+    assert resp.in_flight_during_body == 1
+    assert limiter.state("shop.example").in_flight == 0
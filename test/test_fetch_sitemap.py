@@ -25,3 +25,49 @@ def test_parse_and_filter_sitemap():
     assert re.match(r"https://www\.bargain-cafe\.com/products/.+", product_urls[0])
 
 
+
+def test_iter_sitemap_urls_streams_in_document_order():
+    from fetch_sitemap import iter_sitemap_urls, iter_product_urls
+
+    urls = iter_sitemap_urls(SAMPLE_SITEMAP_XML)
+    assert list(iter_product_urls(urls)) == ["https://www.bargain-cafe.com/products/sample-coffee"]
+
+
+def test_iter_sitemap_entries_keeps_lastmod():
+    from fetch_sitemap import iter_sitemap_entries
+
+    xml = """<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>https://www.bargain-cafe.com/products/a</loc><lastmod>2026-10-01T08:00:00+08:00</lastmod></url>
+  <url><loc>https://www.bargain-cafe.com/products/b</loc></url>
+</urlset>
+"""
+    assert list(iter_sitemap_entries(xml)) == [
+        ("https://www.bargain-cafe.com/products/a", "2026-10-01T08:00:00+08:00"),
+        ("https://www.bargain-cafe.com/products/b", None),
+    ]
+
+
+def test_iter_sitemap_entries_yields_before_the_stream_ends():
+    from fetch_sitemap import iter_sitemap_entries
+
+    head = (
+        b'<?xml version="1.0" encoding="UTF-8"?>\n'
+        b'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        b"<url><loc>https://www.bargain-cafe.com/products/a</loc></url>\n"
+    )
+
+    class Stream:
+        """第一次 read 回傳開頭，之後就出錯：能拿到第一筆代表是邊讀邊解析"""
+
+        def __init__(self):
+            self.calls = 0
+
+        def read(self, size=-1):
+            self.calls += 1
+            if self.calls == 1:
+                return head
+            raise ConnectionError("stream cut")
+
+    entries = iter_sitemap_entries(Stream())
+    assert next(entries) == ("https://www.bargain-cafe.com/products/a", None)
@@ -0,0 +1,39 @@
+from html_io import TITLE_HEAD_BYTES, decode_html, header_charset, read_html, read_title, sniff_charset
+
+
+def test_sniff_and_decode_declared_charset(tmp_path):
+    html = '<html><head><meta charset="big5"><title>咖啡</title></head></html>'
+    data = html.encode("big5")
+    assert sniff_charset(data) == "big5"
+    assert "咖啡" in decode_html(data)
+
+    path = tmp_path / "page.html"
+    path.write_bytes(data)
+    assert "咖啡" in read_html(path)
+
+
+def test_header_charset_wins_and_default_is_utf8():
+    assert header_charset("text/html; charset=UTF-8") == "utf-8"
+    assert header_charset("text/html") is None
+    assert decode_html("咖啡".encode("utf-8")) == "咖啡"
+
+
+def test_read_title_scans_bytes(tmp_path):
+    page = tmp_path / "page.html"
+    page.write_bytes('<html><head><meta charset="big5"><title> 咖啡豆 </title></head></html>'.encode("big5"))
+    assert read_title(page) == "咖啡豆"
+
+    # <title> 不在檔案開頭時要掃整份檔案，而且 <title> 優先於 og:title
+    late = tmp_path / "late.html"
+    late.write_bytes(
+        b'<meta property="og:title" content="OG">' + b" " * (TITLE_HEAD_BYTES * 2) + b"<title>Late</title>"
+    )
+    assert read_title(late) == "Late"
+
+    og = tmp_path / "og.html"
+    og.write_bytes(b'<meta property="og:title" content="Only OG">')
+    assert read_title(og) == "Only OG"
+
+    empty = tmp_path / "empty.html"
+    empty.write_bytes(b"")
+    assert read_title(empty) is None
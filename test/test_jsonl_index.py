@@ -0,0 +1,32 @@
+import pytest
+
+from jsonl_index import JsonlReader, index_path_for
+from product_record import ProductRecord
+from writers import write_jsonl
+
+
+def test_write_jsonl_and_random_access(tmp_path):
+    out = tmp_path / "products.jsonl"
+    rows = [ProductRecord(external_id=f"p{i}", title=f"咖啡 {i}", norm_variety=["藝伎（Geisha）"]) for i in range(500)]
+    rows.append(ProductRecord(external_id="p7", title="新的 p7"))
+    assert write_jsonl(rows, out) == 501
+    assert index_path_for(out).exists()
+
+    with JsonlReader(out) as reader:
+        assert len(reader) == 500
+        assert reader.get("p42")["title"] == "咖啡 42"
+        assert reader.get("p42")["norm_variety"] == ["藝伎（Geisha）"]
+        assert reader.get("p7")["title"] == "新的 p7"
+        assert reader.get("missing") is None
+        assert "p0" in reader
+        got = reader.get_many(["p3", "missing", "p1"])
+        assert set(got) == {"p3", "p1"}
+
+
+def test_reader_rejects_stale_index(tmp_path):
+    out = tmp_path / "products.jsonl"
+    write_jsonl([{"external_id": "a", "price": 1}], out)
+    with out.open("ab") as f:
+        f.write(b'{"external_id":"b"}\n')
+    with pytest.raises(ValueError):
+        JsonlReader(out)
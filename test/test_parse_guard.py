@@ -0,0 +1,95 @@
+import json
+import logging
+import re
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import parse_guard
+from parse_guard import PageTooLarge, ParseTimeout, Quarantine, cpu_time_limit, parse_page_with_budget
+from parsers.bargain import extract_product_json
+from run_bargain_once import iter_parsed_products
+
+
+def test_cpu_time_limit_interrupts_runaway_regex():
+    with pytest.raises(ParseTimeout):
+        with cpu_time_limit(0.2):
+            re.match(r"(a+)+$", "a" * 40 + "b")
+    # 離開之後計時器已關掉
+    with cpu_time_limit(None):
+        assert sum(range(1000)) == 499500
+
+
+def test_cpu_time_limit_ignores_other_threads():
+    stop = time.perf_counter() + 0.6
+
+    def spin():
+        while time.perf_counter() < stop:
+            pass
+
+    t = threading.Thread(target=spin)
+    t.start()
+    # 主 thread 幾乎沒用 CPU，背景 thread 用掉的不算在這一頁的預算裡
+    with cpu_time_limit(0.2):
+        t.join()
+    assert not t.is_alive()
+
+
+def test_cpu_time_limit_warns_off_main_thread(monkeypatch, caplog):
+    monkeypatch.setattr(parse_guard, "_warned_off_main_thread", False)
+
+    def run():
+        for _ in range(2):
+            with cpu_time_limit(0.2):
+                pass
+
+    with caplog.at_level(logging.WARNING, logger="parse_guard"):
+        t = threading.Thread(target=run, name="parse-thread")
+        t.start()
+        t.join()
+    # 只記一次，不會每頁都洗版
+    warnings = [r for r in caplog.records if "parse-thread" in r.getMessage()]
+    assert len(warnings) == 1
+
+
+def test_oversized_page_rejected_before_parsing(tmp_path, monkeypatch):
+    monkeypatch.setattr(parse_guard, "MAX_HTML_BYTES", 100)
+    monkeypatch.setattr(parse_guard, "parse_product", lambda **kw: pytest.fail("不應該 parse"))
+    page = tmp_path / "huge.html"
+    page.write_text("<html>" + "x" * 200 + "</html>", encoding="utf-8")
+    with pytest.raises(PageTooLarge):
+        parse_page_with_budget(page, Path("data/normalize/coffee_lexicon.yaml"))
+
+
+def test_quarantine_copies_page_and_reports(tmp_path):
+    page = tmp_path / "bad.html"
+    page.write_text("<html></html>", encoding="utf-8")
+    q = Quarantine(tmp_path / "quarantine")
+    target = q.add(page, "timeout", cpu_budget_s=1.0)
+
+    assert target.read_text(encoding="utf-8") == "<html></html>"
+    assert page.exists()
+    entry = json.loads(q.report_path.read_text(encoding="utf-8"))
+    assert entry["reason"] == "timeout" and entry["cpu_budget_s"] == 1.0
+
+
+def test_extract_product_json_skips_other_app_values():
+    html = "app.value('shop', 1);" + "x" * 1000 + """app.value('product', JSON.parse('{\\"id\\": 1}'));"""
+    assert extract_product_json(html) == {"id": 1}
+    with pytest.raises(ValueError):
+        extract_product_json("app.value('shop', 1);")
+
+
+def test_parse_error_is_quarantined_not_raised(tmp_path):
+    page = tmp_path / "broken.html"
+    page.write_text("<html><title>壞掉的頁面</title></html>", encoding="utf-8")
+    q = Quarantine(tmp_path / "quarantine")
+
+    products = iter_parsed_products(
+        [page], (), Path("data/normalize/coffee_lexicon.yaml"), parse_timeout=5, quarantine=q
+    )
+    assert list(products) == []
+    entry = json.loads(q.report_path.read_text(encoding="utf-8"))
+    assert entry["reason"] == "error" and entry["error"].startswith("ValueError")
@@ -0,0 +1,48 @@
+import sys
+from collections import Counter
+
+from parse_profiler import ParseProfiler
+
+
+def _busy():
+    return sum(i * i for i in range(20000))
+
+
+def test_profiler_writes_reports(tmp_path):
+    page = tmp_path / "a.html"
+    page.write_text("<html></html>", encoding="utf-8")
+
+    prof = ParseProfiler()
+    for _ in range(3):
+        with prof.page(page):
+            _busy()
+    reports = prof.write_reports(tmp_path / "out")
+
+    assert "_busy" in reports["table"].read_text(encoding="utf-8")
+    assert "a.html" in reports["slowest"].read_text(encoding="utf-8")
+    assert reports["collapsed"].exists()
+    # 沒跑取樣那一輪，cProfile 開著的時候不會順便取樣
+    assert prof.stacks == Counter()
+
+
+def test_sample_pass_runs_without_cprofile(tmp_path):
+    page = tmp_path / "a.html"
+    page.write_text("<html></html>", encoding="utf-8")
+
+    prof = ParseProfiler()
+    with prof.page(page):
+        _busy()
+    seen = []
+
+    def parse(path):
+        # 取樣那一輪 cProfile 不能開著
+        seen.append(sys.getprofile())
+        for _ in range(50):
+            _busy()
+
+    prof.sample_pass(parse)
+    reports = prof.write_reports(tmp_path / "out")
+
+    assert seen == [None]
+    assert "_busy" in reports["collapsed"].read_text(encoding="utf-8")
+    assert "timed by: sampling pass" in reports["slowest"].read_text(encoding="utf-8")
@@ -0,0 +1,125 @@
+import pytest
+
+from product_index import ProductIndex
+
+HEADER = "external_id,title,bean_type,price,weight_g,in_stock,norm_process,norm_variety,norm_country\n"
+
+
+def test_index_query_and_incremental_update(tmp_path):
+    run1 = tmp_path / "run1.csv"
+    run1.write_text(
+        HEADER
+        + "pa-geisha,巴拿馬 藝伎,單品（Single Origin）,800.0,100,True,水洗（Washed）,\"藝伎（Geisha）, SL28\",巴拿馬（Panama）\n"
+        + "et-natural,衣索比亞 日曬,單品（Single Origin）,450.0,454,True,日曬（Natural）,古優原生種（Heirloom）,衣索比亞（Ethiopia）\n"
+        + "pa-cheap,巴拿馬 藝伎 小包,單品（Single Origin）,300.0,100,False,水洗（Washed）,藝伎（Geisha）,巴拿馬（Panama）\n",
+        encoding="utf-8",
+    )
+    idx = ProductIndex(tmp_path / "index")
+    assert idx.update(run1) == 3
+    idx.save()
+
+    idx = ProductIndex.load(tmp_path / "index")
+    docs = idx.search(
+        terms={"norm_country": ["panama"], "norm_variety": ["geisha"], "norm_process": ["水洗"]},
+        ranges={"price_per_100g": (None, 1000)},
+        in_stock=True,
+    )
+    assert [r["external_id"] for r in idx.fetch(docs)] == ["pa-geisha"]
+
+    # 新一輪 crawl：同一個 external_id 以新的為準
+    run2 = tmp_path / "run2.csv"
+    run2.write_text(
+        HEADER + "pa-geisha,巴拿馬 藝伎,單品（Single Origin）,1200.0,100,True,水洗（Washed）,藝伎（Geisha）,巴拿馬（Panama）\n",
+        encoding="utf-8",
+    )
+    assert idx.update(run2) == 1
+    assert idx.update(run2) == 0
+    docs = idx.search(terms={"norm_variety": ["geisha"]}, in_stock=True)
+    assert [r["price"] for r in idx.fetch(docs)] == ["1200.0"]
+
+
+def test_terms_match_whole_labels_only(tmp_path):
+    run = tmp_path / "run.csv"
+    run.write_text(
+        "external_id,price,weight_g,in_stock,norm_roast,norm_variety\n"
+        "mid,400,200,True,中深焙（Medium-dark）,黃波旁（Yellow Bourbon）\n"
+        "dark,400,200,True,深焙（Dark）,波旁（Bourbon）\n",
+        encoding="utf-8",
+    )
+    idx = ProductIndex(tmp_path / "index")
+    idx.update(run)
+
+    def ids(**terms):
+        return [r["external_id"] for r in idx.fetch(idx.search(terms=terms))]
+
+    assert ids(norm_roast=["深焙"]) == ["dark"]
+    assert ids(norm_roast=["MEDIUM-DARK"]) == ["mid"]
+    assert ids(norm_roast=["中深焙（Medium-dark）"]) == ["mid"]
+    assert ids(norm_variety=["波旁"]) == ["dark"]
+    assert ids(norm_variety=["bour"]) == []
+
+
+def test_range_query_sees_docs_added_after_search(tmp_path):
+    idx = ProductIndex(tmp_path / "index")
+    run1 = tmp_path / "run1.csv"
+    run1.write_text("external_id,price,weight_g\na,300,100\n", encoding="utf-8")
+    idx.update(run1)
+    assert len(idx.search(ranges={"price": (None, 1000)})) == 1
+
+    run2 = tmp_path / "run2.csv"
+    run2.write_text("external_id,price,weight_g\nb,500,100\n", encoding="utf-8")
+    idx.update(run2)
+    assert len(idx.search(ranges={"price": (None, 1000)})) == 2
+
+
+def test_fetch_refuses_rewritten_source(tmp_path):
+    run = tmp_path / "run.csv"
+    run.write_text("external_id,price,weight_g\na,300,100\n", encoding="utf-8")
+    idx = ProductIndex(tmp_path / "index")
+    idx.update(run)
+    docs = idx.search()
+
+    run.write_text("external_id,price,weight_g\nlonger-id,1300,250\n", encoding="utf-8")
+    assert idx.stale_sources() == [str(run.resolve())]
+    with pytest.raises(ValueError):
+        list(idx.fetch(docs))
+
+    idx.update(run)
+    assert idx.stale_sources() == []
+    assert [r["external_id"] for r in idx.fetch(idx.search())] == ["longer-id"]
+
+
+def test_rewriting_a_source_many_times_does_not_grow_the_index(tmp_path):
+    run = tmp_path / "products.csv"
+    idx = ProductIndex(tmp_path / "index")
+    for i in range(20):
+        run.write_text(
+            "external_id,price,weight_g,norm_country\n"
+            f"a,{300 + i},100,巴拿馬（Panama）\n"
+            f"b,{500 + i},100,肯亞（Kenya）\n",
+            encoding="utf-8",
+        )
+        idx.update(run)
+    assert len(idx.deleted) == 2
+    assert len(idx.docs) == 6
+    assert [len(p) for p in idx.postings["norm_country"].values()] == [1, 1]
+    docs = idx.search(terms={"norm_country": ["panama"]}, ranges={"price": (None, 1000)})
+    assert [r["price"] for r in idx.fetch(docs)] == ["319"]
+
+
+def test_rewritten_source_no_longer_hides_older_row(tmp_path):
+    old = tmp_path / "shop_a.csv"
+    old.write_text("external_id,price,weight_g\nx,300,100\ny,400,100\n", encoding="utf-8")
+    new = tmp_path / "shop_b.csv"
+    new.write_text("external_id,price,weight_g\nx,350,100\n", encoding="utf-8")
+    idx = ProductIndex(tmp_path / "index")
+    idx.update(old)
+    idx.update(new)
+    assert sorted((r["external_id"], r["price"]) for r in idx.fetch(idx.search())) == [("x", "350"), ("y", "400")]
+
+    # shop_b 重寫後不再有 x：shop_a 那一筆 x 要重新出現，而不是整個消失
+    new.write_text("external_id,price,weight_g\nz,900,100\n", encoding="utf-8")
+    idx.update(new)
+    assert sorted((r["external_id"], r["price"]) for r in idx.fetch(idx.search())) == [
+        ("x", "300"), ("y", "400"), ("z", "900"),
+    ]
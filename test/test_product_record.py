@@ -0,0 +1,37 @@
+import pickle
+
+from product_record import ProductRecord, VariationRecord
+
+
+def _record():
+    return ProductRecord(
+        external_id="panama-geisha",
+        title="巴拿馬 藝伎 水洗",
+        bean_type="單品（Single Origin）",
+        price=700.0,
+        norm_variety=["藝伎（Geisha）", "SL28"],
+        norm_country="巴拿馬（Panama）",
+        variations=[VariationRecord(external_id="panama-geisha", variation_index=0, label="100克", price=700.0)],
+    )
+
+
+def test_record_conversions():
+    rec = _record()
+    d = rec.to_dict()
+    assert list(d) == list(ProductRecord.FIELDS)
+    assert "variations" not in ProductRecord.FIELDS
+    assert d["norm_variety"] == ["藝伎（Geisha）", "SL28"]
+
+    row = rec.as_row()
+    assert row[ProductRecord.FIELDS.index("norm_variety")] == "藝伎（Geisha）, SL28"
+
+    cols = ProductRecord.to_columns([rec, rec])
+    assert cols["price"] == [700.0, 700.0]
+
+
+def test_record_is_slotted_interned_and_picklable():
+    a, b = _record(), _record()
+    assert not hasattr(a, "__dict__")
+    assert a.norm_country is b.norm_country
+    assert pickle.loads(pickle.dumps(a)) == a
+    assert pickle.loads(pickle.dumps(a)).variations == a.variations
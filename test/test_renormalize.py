@@ -0,0 +1,40 @@
+import csv
+from pathlib import Path
+
+from jsonl_index import JsonlReader
+from renormalize import renormalize_file
+from writers import write_jsonl
+
+LEXICON = Path("data/normalize/coffee_lexicon.yaml")
+HEADER = "external_id,title,process_raw,roast_raw,variety_raw,origin_raw,region_raw,norm_process,norm_roast,norm_variety,norm_country,norm_provenance,cluster_id\n"
+
+
+def test_renormalize_csv_rewrites_only_norm_columns(tmp_path):
+    path = tmp_path / "products.csv"
+    path.write_text(
+        HEADER
+        + "a,巴拿馬 藝伎,水洗,淺焙,藝伎,巴拿馬,,舊值,,,,,7\n"
+        + "b,一磅 獨家配方 水洗 中深焙,,,,,,,,,巴西（Brazil）,country=description,8\n"
+        + "c,巴拿馬 藝伎,水洗,淺焙,藝伎,巴拿馬,,,,,,,9\n",
+        encoding="utf-8",
+    )
+    stats = renormalize_file(path, LEXICON, batch_size=2)
+    assert stats["rows"] == 3
+
+    with path.open(encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]["norm_process"] == "水洗（Washed）"
+    assert rows[0]["norm_variety"] == "藝伎（Geisha）"
+    assert rows[0]["cluster_id"] == "7"
+    # 標題補值；描述補上的產國沒有別的來源，保留原值
+    assert rows[1]["norm_roast"] == "中深焙（Medium-dark）"
+    assert rows[1]["norm_country"] == "巴西（Brazil）"
+    assert rows[1]["norm_provenance"] == "process=title,roast=title,country=description"
+
+
+def test_renormalize_jsonl_keeps_index_usable(tmp_path):
+    path = tmp_path / "products.jsonl"
+    write_jsonl([{"external_id": "a", "title": "x", "variety_raw": "Geisha", "norm_variety": []}], path)
+    renormalize_file(path, LEXICON)
+    with JsonlReader(path) as reader:
+        assert reader.get("a")["norm_variety"] == ["藝伎（Geisha）"]
@@ -0,0 +1,87 @@
+from pathlib import Path
+
+from work_queue import WorkQueue
+
+
+def test_claim_ack_and_no_double_claim(tmp_path):
+    q = WorkQueue(tmp_path / "q.db")
+    assert q.enqueue(["u1", "u2", "u3"]) == 3
+    assert q.enqueue(["u1"]) == 0
+
+    a = q.claim("w1", batch_size=2)
+    b = q.claim("w2", batch_size=2)
+    assert a == ["u1", "u2"]
+    assert b == ["u3"]
+    assert q.ack("w1", a) == 2
+    assert q.stats() == {"pending": 0, "leased": 1, "done": 2, "failed": 0}
+
+
+def test_expired_lease_is_requeued_and_stale_ack_ignored(tmp_path):
+    q = WorkQueue(tmp_path / "q.db", lease_seconds=-1)
+    q.enqueue(["u1"])
+    assert q.claim("w1") == ["u1"]
+    # w1 的 lease 已過期，w2 接手
+    assert q.claim("w2") == ["u1"]
+    assert q.ack("w1", ["u1"]) == 0
+    assert q.ack("w2", ["u1"]) == 1
+
+
+def test_fail_retries_then_gives_up(tmp_path):
+    q = WorkQueue(tmp_path / "q.db", max_attempts=2)
+    q.enqueue(["u1"])
+    for _ in range(2):
+        assert q.claim("w1") == ["u1"]
+        q.fail("w1", "u1", "boom")
+    assert q.claim("w1") == []
+    assert q.stats()["failed"] == 1
+
+
+def test_worker_fails_only_the_page_that_cannot_be_parsed(tmp_path, monkeypatch):
+    import run_bargain_once
+    from parse_guard import Quarantine
+
+    pages = {
+        "bad": "<html><title>壞掉的頁面</title></html>",
+        "drip": "<html><title>濾掛 10 入</title></html>",
+    }
+    for name, html in pages.items():
+        (tmp_path / f"{name}.html").write_text(html, encoding="utf-8")
+
+    def fake_fetch(urls, workers):
+        for url in urls:
+            yield url, tmp_path / f"{url}.html", None
+
+    monkeypatch.setattr(run_bargain_once, "iter_fetch_urls", fake_fetch)
+    q = WorkQueue(tmp_path / "q.db", max_attempts=1)
+    q.enqueue(["bad", "drip"])
+
+    quarantine = Quarantine(tmp_path / "quarantine")
+    run_bargain_once.run_queue_worker(
+        q, "w1", ("濾掛",), Path("data/normalize/coffee_lexicon.yaml"), tmp_path / "out.csv",
+        parse_timeout=5, quarantine=quarantine,
+    )
+    # 略過的頁面算完成；parse 失敗的頁面被隔離，也交回佇列而不是被 ack
+    assert q.stats() == {"pending": 0, "leased": 0, "done": 1, "failed": 1}
+    assert quarantine.count == 1
+
+
+def test_enqueue_consumes_generator_before_locking(tmp_path):
+    q = WorkQueue(tmp_path / "q.db")
+    other = WorkQueue(tmp_path / "q.db")
+
+    def urls():
+        # 產生網址的期間（例如在下載 sitemap），其他 worker 仍然可以領工作
+        assert other.claim("w2") == []
+        yield "u1"
+
+    assert q.enqueue(urls()) == 1
+
+
+def test_fail_after_lease_moved_is_ignored(tmp_path):
+    q = WorkQueue(tmp_path / "q.db", lease_seconds=-1)
+    q.enqueue(["u1"])
+    q.claim("w1")
+    assert q.claim("w2") == ["u1"]
+    q.ack("w2", ["u1"])
+    q.fail("w1", "u1", "late")
+    assert q.stats()["done"] == 1
@@ -0,0 +1,70 @@
+import csv
+
+from product_record import ProductRecord, VariationRecord
+from writers import tee_variations_csv, write_csv
+
+
+def test_write_csv_streams_rows(tmp_path):
+    out = tmp_path / "products.csv"
+
+    def rows():
+        yield {"external_id": "a", "norm_variety": ["藝伎（Geisha）", "SL28"], "price": 700.0}
+        yield {"external_id": "b", "norm_variety": [], "price": None}
+
+    assert write_csv(rows(), out) == 2
+    with out.open(encoding="utf-8") as f:
+        got = list(csv.DictReader(f))
+    assert got[0]["norm_variety"] == "藝伎（Geisha）, SL28"
+    assert got[1]["price"] == ""
+
+
+def test_write_csv_value_formatting(tmp_path):
+    out = tmp_path / "products.csv"
+    rows = [
+        ProductRecord(external_id="a", price=700.0, weight_g=454, in_stock=True),
+        ProductRecord(external_id="b", price=1250.5, weight_g=None, in_stock=False),
+    ]
+    assert write_csv(rows, out) == 2
+    lines = out.read_text(encoding="utf-8").splitlines()
+    values = [dict(zip(lines[0].split(","), line.split(","))) for line in lines[1:]]
+    # 整數欄有缺值也不會變成 454.0（pandas.to_csv 會）
+    assert [(v["price"], v["weight_g"], v["in_stock"]) for v in values] == [
+        ("700.0", "454", "True"),
+        ("1250.5", "", "False"),
+    ]
+
+
+def test_write_csv_no_rows_keeps_old_file(tmp_path):
+    out = tmp_path / "products.csv"
+    out.write_text("old", encoding="utf-8")
+    assert write_csv(iter(()), out) == 0
+    assert out.read_text(encoding="utf-8") == "old"
+
+
+def test_tee_variations_csv_writes_in_same_pass(tmp_path):
+    out, var_out = tmp_path / "products.csv", tmp_path / "variations.csv"
+    records = [
+        ProductRecord(
+            external_id="a",
+            variations=(
+                VariationRecord(external_id="a", variation_index=0, label="100克", price=300, weight_g=100),
+                VariationRecord(external_id="a", variation_index=1, label="200克", price=500, weight_g=200),
+            ),
+        ),
+        ProductRecord(external_id="b"),
+    ]
+    assert write_csv(tee_variations_csv(records, var_out), out) == 2
+    with var_out.open(encoding="utf-8") as f:
+        got = list(csv.DictReader(f))
+    assert [(r["external_id"], r["label"], r["price"]) for r in got] == [("a", "100克", "300"), ("a", "200克", "500")]
+
+
+def test_tee_variations_csv_empty_run_keeps_both_old_files(tmp_path):
+    out, var_out = tmp_path / "products.csv", tmp_path / "variations.csv"
+    out.write_text("old products", encoding="utf-8")
+    var_out.write_text("old variations", encoding="utf-8")
+
+    assert write_csv(tee_variations_csv(iter(()), var_out), out) == 0
+    assert out.read_text(encoding="utf-8") == "old products"
+    assert var_out.read_text(encoding="utf-8") == "old variations"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["products.csv", "variations.csv"]